@@ -0,0 +1,130 @@
+"""
+Замер скорости добавления товаров(HTTP_API, маршрут add_product).
+
+Для каждого размера пересоздаёт таблицы и добавляет товары,
+информацию о которых отдаёт заглушка магазина, вызывая обработчик
+маршрута add_product с ограниченной конкурентностью. Выводит:
+товаров в секунду, p50/p99 длительности добавления товара
+и число ошибок.
+
+Параметры подключения к базе берутся из DB_USER/DB_PASS/DB_HOST/DB_NAME.
+Удаляются и создаются заново ВСЕ таблицы сервисов(products,
+price_history, price_events, alert_rules, price_rollups): правила
+оповещений пользователей и журнал событий тоже пропадают.
+Никогда не указывайте рабочую базу, только отдельную базу
+для замеров; удаление подтверждается флагом --reset.
+
+Запуск:
+
+    python BENCHMARK/bench_add_product.py --reset --sizes 1000,10000
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+
+from common import (add_service_path, start_stub, percentile, print_result,
+                    save_results)
+
+os.environ.setdefault("RATE_LIMIT_RPS", "1000000")
+os.environ.setdefault("RATE_LIMIT_BURST", "1000000")
+add_service_path("HTTP_API")
+
+from backend.client import close_client  # noqa: E402
+from database.FDataBase import (AsyncSessionLocal, create_tables,  # noqa
+                                delete_tables)
+from models.model import UrlCheck  # noqa: E402
+from routers.router import add_product  # noqa: E402
+
+
+async def run_once(size: int, stub_url: str, concurrency: int) -> dict:
+    """Добавляет size товаров, возвращает замеры."""
+    await delete_tables()
+    await create_tables()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+
+    async def add(product_id: int) -> None:
+        url = UrlCheck(
+            url_info=f"{stub_url}/bff/product-details?productId={product_id}",
+            url_price=(f"{stub_url}/bff/products/prices?"
+                       f"productIds={product_id}&addBonusRubles=true&"
+                       f"isPromoApplied=true"))
+        async with semaphore:
+            started = time.perf_counter()
+            async with AsyncSessionLocal() as session:
+                result = await add_product(url=url, session=session)
+            latencies.append(time.perf_counter() - started)
+        if result["status_code"] != 200:
+            error = str(result.get("error") or result.get("message"))
+            errors[error] = errors.get(error, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(add(product_id)
+                           for product_id in range(1, size + 1)))
+    elapsed = time.perf_counter() - started
+    return {
+        "products": size,
+        "seconds": round(elapsed, 2),
+        "products_per_sec": round(
+            (size - sum(errors.values())) / elapsed, 1),
+        "add_p50_ms": round(1000 * percentile(latencies, 0.5), 1),
+        "add_p99_ms": round(1000 * percentile(latencies, 0.99), 1),
+        "errors": errors,
+    }
+
+
+async def run(sizes: list[int], stub_url: str,
+              concurrency: int) -> list[dict]:
+    results = []
+    try:
+        for size in sizes:
+            results.append(await run_once(size, stub_url, concurrency))
+            print_result(results[-1])
+    finally:
+        await close_client()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", default="1000,10000")
+    parser.add_argument("--reset", action="store_true",
+                        help="Подтверждение удаления всех таблиц сервисов.")
+    parser.add_argument("--concurrency", type=int, default=50,
+                        help="Число одновременных запросов add_product.")
+    parser.add_argument("--stub-url", default=None,
+                        help="Адрес уже запущенной заглушки магазина.")
+    parser.add_argument("--stub-port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--errors", default="")
+    parser.add_argument("--output", default=None,
+                        help="Файл для сохранения результатов в JSON.")
+    args = parser.parse_args()
+    if not args.reset:
+        sys.exit("Замер удаляет все таблицы сервисов в базе DB_NAME, "
+                 "запустите с флагом --reset на отдельной базе.")
+    logging.getLogger().setLevel(logging.WARNING)
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    stub = None
+    stub_url = args.stub_url
+    if stub_url is None:
+        stub = start_stub(args.stub_port, max(sizes), args.latency_ms,
+                          args.jitter_ms, args.errors)
+        stub_url = f"http://127.0.0.1:{args.stub_port}"
+    try:
+        results = asyncio.run(run(sizes, stub_url, args.concurrency))
+    finally:
+        if stub is not None:
+            stub.terminate()
+    if args.output:
+        save_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
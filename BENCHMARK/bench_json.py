@@ -0,0 +1,105 @@
+"""
+Проверка и замер разбора ответов API МВИДЕО.
+
+Для каждого ответа из BENCHMARK/payloads сравнивает прежний путь
+разбора(тело в str, затем json.loads) с текущим(backend.fastjson.loads
+из байтов) и результат функций поиска данных о товаре, затем замеряет
+оба пути. Ответы prices_*.json проверяются функциями CHECK_PRICE_API
+(get_price_item, get_prices_items), details_*.json - функцией
+get_info_item из HTTP_API. Сохранённые настоящие ответы магазина
+можно положить в тот же каталог с теми же префиксами.
+
+Запуск:
+
+    python BENCHMARK/bench_json.py --service CHECK_PRICE_API
+    python BENCHMARK/bench_json.py --service HTTP_API
+"""
+import os
+import sys
+import glob
+import json
+import time
+import asyncio
+import argparse
+
+from common import ROOT, add_service_path, print_result, save_results
+
+
+PREFIXES = {"CHECK_PRICE_API": "prices_", "HTTP_API": "details_"}
+
+
+def old_loads(body: bytes):
+    """Прежний путь: response.text(), затем json.loads."""
+    return json.loads(body.decode("utf-8"))
+
+
+async def extract(service: str, data) -> list:
+    """Возвращает результаты функций поиска данных для ответа."""
+    if service == "CHECK_PRICE_API":
+        from backend.backend import get_price_item, get_prices_items
+        message = {"message": data, "status_code": 200}
+        return [await get_price_item(data_price=message),
+                await get_prices_items(data_price=message)]
+    from backend.backend import get_info_item
+    try:
+        return [await get_info_item(data_info=data)]
+    except (KeyError, TypeError) as ex:
+        return [repr(ex)]
+
+
+def timed(loads, body: bytes, iterations: int) -> float:
+    """Возвращает среднее время разбора ответа(мкс)."""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        loads(body)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def run(service: str, payloads: str, iterations: int) -> list[dict]:
+    from backend.fastjson import JSON_BACKEND, loads
+
+    paths = sorted(glob.glob(os.path.join(
+        payloads, f"{PREFIXES[service]}*.json")))
+    if not paths:
+        sys.exit(f"Нет ответов {PREFIXES[service]}*.json в {payloads}")
+    results = []
+    for path in paths:
+        with open(path, "rb") as file:
+            body = file.read()
+        old, new = old_loads(body), loads(body)
+        if old != new:
+            sys.exit(f"{path}: результат разбора отличается")
+        if await extract(service, old) != await extract(service, new):
+            sys.exit(f"{path}: результат поиска данных отличается")
+        old_us = timed(old_loads, body, iterations)
+        new_us = timed(loads, body, iterations)
+        results.append({
+            "payload": os.path.basename(path),
+            "bytes": len(body),
+            "backend": JSON_BACKEND,
+            "old_us": round(old_us, 1),
+            "new_us": round(new_us, 1),
+            "speedup": round(old_us / new_us, 2),
+        })
+        print_result(results[-1])
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--service", choices=sorted(PREFIXES),
+                        default="CHECK_PRICE_API")
+    parser.add_argument("--payloads",
+                        default=os.path.join(ROOT, "BENCHMARK", "payloads"))
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--output", default=None,
+                        help="Файл для сохранения результатов в JSON.")
+    args = parser.parse_args()
+    add_service_path(args.service)
+    results = asyncio.run(run(args.service, args.payloads, args.iterations))
+    if args.output:
+        save_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Замер пропускной способности мониторинга цен(CHECK_PRICE_API).
+
+Для каждого размера каталога пересоздаёт таблицы, добавляет товары,
+цены которых отдаёт заглушка магазина, запускает monitoring_price
+и ждёт, пока все товары будут проверены один раз. Выводит:
+товаров в секунду, p50/p99 задержки запроса цен, число запросов
+к магазину, скорость записи в базу и число ошибок.
+
+Параметры подключения к базе берутся из DB_USER/DB_PASS/DB_HOST/DB_NAME.
+Удаляются и создаются заново ВСЕ таблицы сервисов(products,
+price_history, price_events, alert_rules, price_rollups): правила
+оповещений пользователей и журнал событий тоже пропадают.
+Никогда не указывайте рабочую базу, только отдельную базу
+для замеров; удаление подтверждается флагом --reset.
+Остальные параметры мониторинга(MONITOR_CONCURRENCY, PRICE_BATCH_SIZE,
+WRITE_BATCH_SIZE ...) задаются переменными окружения как обычно.
+
+Запуск:
+
+    python BENCHMARK/bench_monitor.py --reset --sizes 1000,10000,100000
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+from datetime import datetime
+
+from common import (add_service_path, start_stub, quantile, print_result,
+                    save_results)
+
+# Один проход по каталогу: следующая проверка не должна наступить
+# во время замера, сервер метрик не нужен. Ограничитель частоты
+# запросов защищает магазин, а не заглушку, поэтому по умолчанию
+# он не должен влиять на результат.
+os.environ.setdefault("MONITOR_INTERVAL", "86400")
+os.environ.setdefault("METRICS_PORT", "0")
+os.environ.setdefault("RATE_LIMIT_RPS", "1000000")
+os.environ.setdefault("RATE_LIMIT_BURST", "1000000")
+add_service_path("CHECK_PRICE_API")
+
+from sqlalchemy import insert  # noqa: E402
+
+from backend.client import close_client  # noqa: E402
+from backend.metrics import (REGISTRY, DB_ROWS_WRITTEN,  # noqa: E402
+                             DB_WRITE_SECONDS, ERRORS, FETCH_SECONDS,
+                             PRODUCTS_DUE, PRODUCTS_PROCESSED)
+from database.FDataBase import Base, Product, engine  # noqa: E402
+from database.writer import PriceTickWriter  # noqa: E402
+from config import WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL  # noqa: E402
+import main as monitor  # noqa: E402
+
+
+async def reset_catalog(size: int, stub_url: str) -> None:
+    """Пересоздаёт таблицы и добавляет size товаров."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        now = datetime.now()
+        for start in range(1, size + 1, 5000):
+            await conn.execute(insert(Product), [
+                {"name": f"Товар {i}", "description": "", "rating": 4.5,
+                 "url_info": f"{stub_url}/bff/product-details?productId={i}",
+                 "url_price": (f"{stub_url}/bff/products/prices?"
+                               f"productIds={i}&addBonusRubles=true&"
+                               f"isPromoApplied=true"),
+                 "next_check_at": now}
+                for i in range(start, min(size, start + 4999) + 1)])
+
+
+def counter_total(metric) -> float:
+    return sum(metric._values.values())
+
+
+async def run_once(size: int, stub_url: str) -> dict:
+    """Проверяет каталог из size товаров один раз, возвращает замеры."""
+    await reset_catalog(size, stub_url)
+    REGISTRY.clear()
+    writer = PriceTickWriter(batch_size=WRITE_BATCH_SIZE,
+                             flush_interval=WRITE_FLUSH_INTERVAL)
+    await writer.start()
+    started = time.perf_counter()
+    task = asyncio.create_task(monitor.monitoring_price(writer=writer))
+    while counter_total(PRODUCTS_DUE) < size and not task.done():
+        await asyncio.sleep(0.05)
+    await writer.close()
+    elapsed = time.perf_counter() - started
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    fetch = FETCH_SECONDS._values.get(("200",))
+    db = DB_WRITE_SECONDS._values.get((), {"sum": 0.0, "count": 0})
+    rows = counter_total(DB_ROWS_WRITTEN)
+    return {
+        "products": size,
+        "seconds": round(elapsed, 2),
+        "products_per_sec": round(counter_total(PRODUCTS_PROCESSED) /
+                                  elapsed, 1),
+        "requests": sum(state["count"] for state in
+                        FETCH_SECONDS._values.values()),
+        "fetch_p50_ms": round(1000 * quantile(
+            FETCH_SECONDS.buckets, fetch["buckets"], 0.5), 1) if fetch else 0,
+        "fetch_p99_ms": round(1000 * quantile(
+            FETCH_SECONDS.buckets, fetch["buckets"], 0.99), 1)
+        if fetch else 0,
+        "db_rows": int(rows),
+        "db_rows_per_sec": round(rows / db["sum"], 1) if db["sum"] else 0,
+        "db_flushes": db["count"],
+        "errors": {key[0]: int(value)
+                   for key, value in ERRORS._values.items()},
+    }
+
+
+async def run(sizes: list[int], stub_url: str) -> list[dict]:
+    results = []
+    try:
+        for size in sizes:
+            results.append(await run_once(size, stub_url))
+            print_result(results[-1])
+    finally:
+        await close_client()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--reset", action="store_true",
+                        help="Подтверждение удаления всех таблиц сервисов.")
+    parser.add_argument("--stub-url", default=None,
+                        help="Адрес уже запущенной заглушки магазина.")
+    parser.add_argument("--stub-port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--errors", default="")
+    parser.add_argument("--output", default=None,
+                        help="Файл для сохранения результатов в JSON.")
+    args = parser.parse_args()
+    if not args.reset:
+        sys.exit("Замер удаляет все таблицы сервисов в базе DB_NAME, "
+                 "запустите с флагом --reset на отдельной базе.")
+    logging.getLogger().setLevel(logging.WARNING)
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    stub = None
+    stub_url = args.stub_url
+    if stub_url is None:
+        stub = start_stub(args.stub_port, max(sizes), args.latency_ms,
+                          args.jitter_ms, args.errors)
+        stub_url = f"http://127.0.0.1:{args.stub_port}"
+    try:
+        results = asyncio.run(run(sizes, stub_url))
+    finally:
+        if stub is not None:
+            stub.terminate()
+    if args.output:
+        save_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Общие функции замеров производительности.
+
+Func:
+
+    add_service_path: Делает модули сервиса(CHECK_PRICE_API или HTTP_API)
+        импортируемыми из скрипта замера.
+
+    start_stub: Запускает заглушку магазина(stub_server.py)
+        в отдельном процессе.
+
+    quantile: Считает квантиль по корзинам гистограммы.
+
+    percentile: Считает перцентиль по списку значений.
+
+    print_result: Печатает результат одного замера.
+
+    save_results: Сохраняет результаты замеров в JSON файл.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import subprocess
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def add_service_path(service: str) -> None:
+    """Добавляет каталог сервиса в sys.path."""
+    sys.path.insert(0, os.path.join(ROOT, service))
+
+
+def start_stub(port: int, catalog_size: int, latency_ms: float,
+               jitter_ms: float, errors: str) -> subprocess.Popen:
+    """
+    Функция запуска заглушки магазина.
+
+    Returns:
+
+        Возвращает процесс заглушки, после того как она начала
+        принимать соединения.
+    """
+    process = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, "BENCHMARK", "stub_server.py"),
+        "--port", str(port), "--catalog-size", str(catalog_size),
+        "--latency-ms", str(latency_ms), "--jitter-ms", str(jitter_ms),
+        "--errors", errors])
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Заглушка магазина не запустилась")
+
+
+def quantile(bounds: tuple, cumulative: list[int], q: float) -> float:
+    """
+    Функция расчёта квантиля по гистограмме.
+
+    Args:
+
+        bounds: Верхние границы корзин(последняя - бесконечность).
+        cumulative: Накопленные количества значений по корзинам.
+        q: Квантиль от 0 до 1.
+
+    Returns:
+
+        Возвращает оценку квантиля с линейной интерполяцией внутри
+        корзины, как histogram_quantile в Prometheus.
+    """
+    total = cumulative[-1] if cumulative else 0
+    if not total:
+        return 0.0
+    rank = q * total
+    lower, below = 0.0, 0
+    for bound, count in zip(bounds, cumulative):
+        if count >= rank:
+            if bound == float("inf"):
+                return lower
+            inside = count - below
+            return lower + (bound - lower) * ((rank - below) / inside
+                                              if inside else 1)
+        lower, below = bound, count
+    return lower
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Функция расчёта перцентиля q(0..1) по списку значений."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def print_result(result: dict) -> None:
+    """Печатает результат одного замера."""
+    print(" | ".join(f"{key}: {value}" for key, value in result.items()),
+          flush=True)
+
+
+def save_results(results: list[dict], path: str) -> None:
+    """Сохраняет результаты замеров в JSON файл."""
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,214 @@
+"""
+Локальная замена API МВИДЕО для замеров производительности.
+
+Отдаёт ответы той же структуры, что и магазин:
+
+    GET /bff/product-details?productId=<id>
+        Общая информация о товаре(название, описание, рейтинг
+        и объёмные блоки характеристик, как в настоящем ответе).
+
+    GET /bff/products/prices?productIds=<id>[,<id>...]
+        Цены одного или нескольких товаров(materialPrices).
+
+Товары с id от 1 до --catalog-size существуют, остальные отдают 404.
+Задержка ответа и доля ошибок 401/403/429/500 настраиваются.
+С --change-period цена меняется по времени: у доли --volatile-share
+товаров раз в --change-period секунд, у остальных никогда(для проверки
+адаптивной частоты проверки CADENCE_MODE="adaptive").
+
+Запуск:
+
+    python BENCHMARK/stub_server.py --port 8089 --catalog-size 100000 \\
+        --latency-ms 40 --jitter-ms 20 --errors 429=0.01,500=0.005
+"""
+import time
+import random
+import asyncio
+import argparse
+
+from aiohttp import web
+
+
+def parse_errors(value: str) -> dict[int, float]:
+    """Разбирает строку вида "429=0.01,500=0.005" в {код: доля}."""
+    errors = {}
+    for part in filter(None, value.split(",")):
+        status, rate = part.split("=")
+        errors[int(status)] = float(rate)
+    return errors
+
+
+class StubShop:
+    """
+    Состояние заглушки магазина.
+
+    Args:
+
+        catalog_size: Число существующих товаров.
+        latency_ms: Средняя задержка ответа(мс).
+        jitter_ms: Случайное отклонение задержки(мс).
+        errors: Доли ответов с ошибками {код: доля}.
+        change_rate: Вероятность изменения цены товара при запросе.
+        seed: Зерно генератора случайных чисел.
+        change_period: Период изменения цены часто меняющихся товаров
+            (сек), 0 - цена меняется с вероятностью change_rate.
+        volatile_share: Доля часто меняющихся товаров.
+    """
+
+    def __init__(self, catalog_size: int, latency_ms: float,
+                 jitter_ms: float, errors: dict[int, float],
+                 change_rate: float, seed: int,
+                 change_period: float = 0,
+                 volatile_share: float = 1) -> None:
+        self.catalog_size = catalog_size
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.errors = errors
+        self.change_rate = change_rate
+        self.change_period = change_period
+        self.volatile_share = volatile_share
+        self.random = random.Random(seed)
+        self.prices: dict[int, int] = {}
+        self.requests = 0
+
+    async def delay(self) -> None:
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(
+            -self.jitter, self.jitter)))
+
+    def error_status(self):
+        roll = self.random.random()
+        for status, rate in self.errors.items():
+            if roll < rate:
+                return status
+            roll -= rate
+        return None
+
+    def price(self, product_id: int) -> int:
+        if self.change_period:
+            rnd = random.Random(product_id)
+            epoch = 0
+            if rnd.random() < self.volatile_share:
+                epoch = int(time.time() // self.change_period)
+            return random.Random(
+                f"{product_id}:{epoch}").randrange(999, 199999, 10)
+        if (product_id not in self.prices or
+                self.random.random() < self.change_rate):
+            self.prices[product_id] = self.random.randrange(999, 199999, 10)
+        return self.prices[product_id]
+
+    def exists(self, product_id: int) -> bool:
+        return 1 <= product_id <= self.catalog_size
+
+    def details(self, product_id: int) -> dict:
+        rnd = random.Random(product_id)
+        return {
+            "success": True,
+            "messages": [],
+            "body": {
+                "productId": str(product_id),
+                "name": f"Смартфон Тестовый {product_id} 128 ГБ",
+                "description": " ".join(
+                    ["Подробное описание товара для замеров."] * 40),
+                "rating": {"star": round(rnd.uniform(1, 5), 2),
+                           "count": rnd.randrange(0, 5000)},
+                "brandName": "Test",
+                "categoryName": "Смартфоны",
+                "images": [f"/img/{product_id}/{i}.jpg" for i in range(12)],
+                "propertiesPortion": [
+                    {"name": f"Характеристика {i}",
+                     "value": f"Значение {rnd.randrange(1000)}",
+                     "units": "шт."} for i in range(60)],
+                "properties": {"all": [
+                    {"groupName": f"Группа {g}", "properties": [
+                        {"name": f"Свойство {g}.{i}",
+                         "value": str(rnd.random())} for i in range(15)]}
+                    for g in range(8)]},
+            },
+        }
+
+    def prices_payload(self, product_ids: list[int]) -> dict:
+        material_prices = []
+        for product_id in product_ids:
+            sale = self.price(product_id)
+            material_prices.append({
+                "productId": str(product_id),
+                "price": {"basePrice": sale + 1000, "salePrice": sale,
+                          "basePromoPrice": sale, "priceTypeLabel": ""},
+                "bonusRubles": {"total": sale // 100, "type": "common"},
+                "isPromoApplied": True,
+                "promos": [{"id": "promo", "discount": 1000}],
+            })
+        return {"success": True, "messages": [],
+                "body": {"materialPrices": material_prices}}
+
+
+def make_app(shop: StubShop) -> web.Application:
+    """Создаёт приложение заглушки магазина."""
+
+    async def product_details(request: web.Request) -> web.Response:
+        shop.requests += 1
+        await shop.delay()
+        status = shop.error_status()
+        if status:
+            return web.json_response({"success": False}, status=status)
+        try:
+            product_id = int(request.query.get("productId", ""))
+        except ValueError:
+            return web.json_response({"success": False}, status=400)
+        if not shop.exists(product_id):
+            return web.json_response({"success": False}, status=404)
+        return web.json_response(shop.details(product_id))
+
+    async def prices(request: web.Request) -> web.Response:
+        shop.requests += 1
+        await shop.delay()
+        status = shop.error_status()
+        if status:
+            return web.json_response({"success": False}, status=status)
+        try:
+            product_ids = [int(value) for value in
+                           request.query.get("productIds", "").split(",")]
+        except ValueError:
+            return web.json_response({"success": False}, status=400)
+        product_ids = [pid for pid in product_ids if shop.exists(pid)]
+        if not product_ids:
+            return web.json_response({"success": False}, status=404)
+        return web.json_response(shop.prices_payload(product_ids))
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response({"requests": shop.requests})
+
+    app = web.Application()
+    app.router.add_get("/bff/product-details", product_details)
+    app.router.add_get("/bff/products/prices", prices)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--catalog-size", type=int, default=100000)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--errors", type=parse_errors, default={},
+                        help='Доли ошибок, например "429=0.01,500=0.005"')
+    parser.add_argument("--change-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--change-period", type=float, default=0,
+                        help="Менять цену по времени раз в N секунд.")
+    parser.add_argument("--volatile-share", type=float, default=1,
+                        help="Доля товаров, цена которых меняется.")
+    args = parser.parse_args()
+    shop = StubShop(catalog_size=args.catalog_size,
+                    latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                    errors=args.errors, change_rate=args.change_rate,
+                    seed=args.seed, change_period=args.change_period,
+                    volatile_share=args.volatile_share)
+    web.run_app(make_app(shop), host=args.host, port=args.port,
+                access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,31 @@
 Func:
 
     get_html: Получает на вход url (данные полученые от API магазина),
-        возвращает спарсенные данные(dict).
+        возвращает спарсенные данные(dict). JSON разбирается прямо
+        из байтов ответа(backend.fastjson).
 
     get_price_item: Получает на вход спарсенные данные(dict),
         возвращает цену товара(float).
+
+    get_prices_items: Получает на вход спарсенные данные(dict) ответа
+        на запрос цен нескольких товаров, возвращает цены по id товаров
+        в магазине.
 """
-import json
+import time
+import asyncio
+from typing import Optional
+from urllib.parse import urlsplit
+
 import aiohttp
 
+from backend.client import get_client
+from backend.fastjson import loads
+from backend.metrics import (FETCH_IN_FLIGHT, FETCH_SECONDS, PARSE_SECONDS,
+                             observe_error)
+from backend.ratelimit import (CircuitOpenError, backoff_delay,
+                               get_limiter, is_retryable)
+from config import RETRY_ATTEMPTS
+
 
 async def get_html(url: str) -> dict:
     """
@@ -24,26 +41,72 @@ async def get_html(url: str) -> dict:
     Returns:
 
         Возвращает словарь с данными сайта(МВИДЕО).
+
+    Notes:
+
+        Использует общий HTTP клиент сервиса с пулом соединений,
+        заголовки и cookie уже настроены в клиенте. Запросы проходят
+        через ограничитель частоты хоста, при ответах 401/403/429/5xx
+        и сетевых ошибках повторяются с экспоненциальной задержкой.
     """
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 "
-            "Mobile Safari/537.36"),
-        "Cookie": ("MVID_CITY_ID=CityCZ_975; "
-                   "MVID_REGION_ID=1; MVID_REGION_SHOP=S002; "
-                   "MVID_TIMEZONE_OFFSET=3;")
-    }
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers) as response:
-            if response.status in [401, 403]:
-                return {
-                    'error': f"Проблема авторизации, код: {response.status}"}
-            elif response.status == 200:
-                text = await response.text()
-                return {"message": json.loads(text), "status_code": 200}
-            else:
-                return {'error': "Неверный формат ссылки!"}
+    limiter = get_limiter()
+    host = limiter.host(urlsplit(url).hostname or "")
+    session = get_client().session
+    for attempt in range(RETRY_ATTEMPTS):
+        last_attempt = attempt == RETRY_ATTEMPTS - 1
+        try:
+            await host.acquire(fail_fast=limiter.fail_fast)
+        except CircuitOpenError as ex:
+            observe_error("throttled")
+            return {'error': str(ex)}
+        started = time.perf_counter()
+        status = 0
+        try:
+            with FETCH_IN_FLIGHT.track_inprogress():
+                async with session.get(url) as response:
+                    status = response.status
+                    if status == 200:
+                        body = await response.read()
+                    retry_after = _retry_after(response.headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+            host.record_failure(type(ex).__name__)
+            if last_attempt:
+                observe_error("network")
+                raise
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+        finally:
+            FETCH_SECONDS.observe(time.perf_counter() - started,
+                                  status=status)
+        if status == 200:
+            host.record_success()
+            try:
+                with PARSE_SECONDS.time(stage="decode"):
+                    data = loads(body)
+            except ValueError:
+                observe_error("format")
+                return {'error': "Ответ магазина не является JSON!"}
+            return {"message": data, "status_code": 200}
+        if not is_retryable(status):
+            host.record_success()
+            observe_error("format")
+            return {'error': "Неверный формат ссылки!"}
+        host.record_failure(str(status))
+        if not last_attempt:
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
+    if status in [401, 403]:
+        observe_error("auth")
+        return {'error': f"Проблема авторизации, код: {status}"}
+    observe_error("throttled")
+    return {'error': f"Магазин ограничил запросы, код: {status}"}
+
+
+def _retry_after(headers) -> Optional[float]:
+    """Возвращает задержку из заголовка Retry-After в секундах."""
+    try:
+        return float(headers.get("Retry-After", ""))
+    except ValueError:
+        return None
 
 
 async def get_price_item(data_price: dict) -> dict:
@@ -68,14 +131,57 @@ async def get_price_item(data_price: dict) -> dict:
     elif 'message' not in data_price:
         return {'error': "Отсутствует необходимый ключ 'message'.",
                 "status_code": 422}
-    elif "salePrice" not in (data_price['message']
-                                       ["body"]["materialPrices"]
-                                       [0]["price"]):
+    try:
+        price = data_price['message']["body"]["materialPrices"][0]["price"]
+    except (KeyError, IndexError, TypeError):
+        price = None
+    if not isinstance(price, dict) or "salePrice" not in price:
+        return {'error': "Отсутствует необходимые ключи данных о товаре.",
+                "status_code": 422}
+    return {"price": price["salePrice"], "status_code": 200}
+
+
+async def get_prices_items(data_price: dict) -> dict:
+    """
+    Функция поиска цен нескольких продуктов.
+
+    Args:
+
+        data_price: Словарь с данными о ценах(страница с API).
+
+    Returns:
+
+        Возвращает словарь {"prices": {id товара в магазине: цена}}.
+        Товары без ключа salePrice и записи ответа неверного формата
+        в ответ не попадают.
+    """
+    if not isinstance(data_price, dict):
+        return {'error': "Переданные данные, не являются словарем!",
+                "status_code": 422}
+    elif 'message' not in data_price:
+        return {'error': "Отсутствует необходимый ключ 'message'.",
+                "status_code": 422}
+    body = data_price['message']
+    if isinstance(body, dict):
+        body = body.get("body")
+    material_prices = (body.get("materialPrices")
+                       if isinstance(body, dict) else None)
+    if not isinstance(material_prices, list):
         return {'error': "Отсутствует необходимые ключи данных о товаре.",
                 "status_code": 422}
-    else:
-        return {"price": (data_price['message']
-                                    ["body"]
-                                    ["materialPrices"]
-                                    [0]["price"]["salePrice"]),
-                "status_code": 200}
+    prices = {}
+    malformed = 0
+    for item in material_prices:
+        if not isinstance(item, dict):
+            malformed += 1
+            continue
+        price = item.get("price") or {}
+        if not isinstance(price, dict):
+            malformed += 1
+            continue
+        if "salePrice" in price and item.get("productId") is not None:
+            prices[str(item["productId"])] = price["salePrice"]
+    if malformed:
+        # Цены остальных товаров ответа сохраняются.
+        observe_error("format", malformed)
+    return {"prices": prices, "status_code": 200}
@@ -0,0 +1,86 @@
+"""
+Модуль объединения запросов цен в пачки.
+
+Func:
+
+    split_price_url: Получает на вход URL на API с ценой товара,
+        возвращает ключ группы(адрес и параметры без productIds)
+        и id товара в магазине.
+
+    group_price_urls: Получает на вход список товаров и размер пачки,
+        группирует товары с одинаковыми параметрами запроса цены
+        и возвращает пачки с общим URL на несколько productIds.
+"""
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+
+PRODUCT_IDS_PARAM = "productIds"
+
+
+def split_price_url(url: str) -> tuple[Optional[tuple], Optional[str]]:
+    """
+    Функция разбора URL на API с ценой товара.
+
+    Args:
+
+        url: URL на API с ценой товара.
+
+    Returns:
+
+        Возвращает ключ группы и id товара в магазине, либо (None, None),
+        если в URL нет ровно одного значения productIds.
+    """
+    parts = urlsplit(url)
+    params = parse_qsl(parts.query, keep_blank_values=True)
+    codes = [value for key, value in params if key == PRODUCT_IDS_PARAM]
+    if len(codes) != 1 or not codes[0] or "," in codes[0]:
+        return None, None
+    other = tuple(sorted((key, value) for key, value in params
+                         if key != PRODUCT_IDS_PARAM))
+    return (parts.scheme, parts.netloc, parts.path, other), codes[0]
+
+
+def _build_url(key: tuple, codes: list[str]) -> str:
+    """Собирает URL на API с ценами для нескольких товаров."""
+    scheme, netloc, path, other = key
+    query = urlencode([(PRODUCT_IDS_PARAM, ",".join(codes)), *other],
+                      safe=",")
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def group_price_urls(products: list[dict], batch_size: int) -> list[dict]:
+    """
+    Функция группировки товаров в пачки запросов цен.
+
+    Args:
+
+        products: Список словарей товаров с ключами id и url_price.
+        batch_size: Максимальное число productIds в одном запросе.
+
+    Returns:
+
+        Возвращает список пачек: {"url": общий URL,
+        "products": {id товара в магазине: [товары]}}. Товары,
+        URL которых нельзя объединить, попадают в отдельные пачки
+        с исходным URL и ключом None.
+    """
+    groups: dict[tuple, dict[str, list[dict]]] = {}
+    batches = []
+    for product in products:
+        key, code = split_price_url(str(product["url_price"]))
+        if key is None:
+            batches.append({"url": str(product["url_price"]),
+                            "products": {None: [product]}})
+            continue
+        groups.setdefault(key, {}).setdefault(code, []).append(product)
+
+    size = max(1, batch_size)
+    for key, by_code in groups.items():
+        codes = list(by_code)
+        for start in range(0, len(codes), size):
+            chunk = codes[start:start + size]
+            batches.append({"url": _build_url(key, chunk),
+                            "products": {code: by_code[code]
+                                         for code in chunk}})
+    return batches
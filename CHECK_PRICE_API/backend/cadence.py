@@ -0,0 +1,222 @@
+"""
+Модуль адаптивной частоты проверки цен.
+
+Classes:
+
+    AdaptiveCadence: Оценивает частоту изменения цены каждого товара
+        и распределяет между товарами бюджет проверок в час: товары
+        с часто меняющейся ценой проверяются чаще, стабильные - реже,
+        в пределах [min_interval, max_interval].
+
+Notes:
+
+    Если цена товара меняется в среднем rate раз в секунду, а проверяется
+    она frequency раз в секунду, изменение замечается в среднем через
+    1 / (2 * frequency), то есть товар накапливает rate / (2 * frequency)
+    секунд устаревшей цены в секунду. Сумма по всем товарам при
+    фиксированном бюджете минимальна, когда frequency пропорциональна
+    sqrt(rate), поэтому бюджет делится пропорционально sqrt(rate).
+"""
+import math
+import bisect
+from datetime import datetime
+from typing import Iterable, Optional
+
+
+class AdaptiveCadence:
+    """
+    Адаптивная частота проверки цен.
+
+    Args:
+
+        budget: Число проверок товаров в час на все товары.
+        min_interval: Минимальный интервал проверки товара(сек).
+        max_interval: Максимальный интервал проверки товара(сек).
+        half_life: Период полураспада веса наблюдений(сек): изменения
+            цены старше него учитываются с весом меньше половины.
+
+    Notes:
+
+        Для каждого товара хранятся взвешенные число проверок n,
+        число проверок с изменившейся ценой x и время наблюдения,
+        все величины затухают экспоненциально. Проверка замечает не
+        больше одного изменения, поэтому отношение x ко времени
+        занижает частоту часто меняющихся товаров, используется оценка
+        -ln((n - x + 0.5) / (n + 0.5)) / (среднее время между
+        проверками). Оценка не опускается ниже одного изменения
+        за время наблюдения плюс half_life, поэтому товар без истории
+        проверяется как умеренно стабильный, а не с крайним интервалом.
+    """
+
+    def __init__(self, budget: float, min_interval: float,
+                 max_interval: float, half_life: float) -> None:
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("Ожидается 0 < min_interval <= max_interval")
+        self.budget = budget
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.half_life = half_life
+        self._tau = half_life / math.log(2)
+        # id товара -> [время последней проверки, проверки с изменением,
+        # время наблюдения(сек), проверки].
+        self._state: dict[int, list] = {}
+        self._scale: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def seed(self, stats: dict[int, tuple[int, int, datetime]],
+             now: datetime, interval: float) -> None:
+        """
+        Задаёт начальные оценки по истории цен.
+
+        Args:
+
+            stats: Словарь {id товара: (число изменений, число записей,
+                время первой записи)}, см. select_change_stats.
+            now: Текущее время.
+            interval: Интервал, с которым проверялись товары(сек).
+                Если записей меньше, чем проверок за это время(хранятся
+                только изменения), число проверок считается по нему.
+
+        Notes:
+
+            Изменения внутри отрезка истории учитываются без затухания.
+            Оценки товаров, уже наблюдаемых в этом процессе,
+            не перезаписываются.
+        """
+        for product_id, (changes, rows, first) in stats.items():
+            if product_id in self._state:
+                continue
+            exposure = max(0.0, (now - first).total_seconds())
+            checks = max(rows - 1, exposure / interval, float(changes))
+            self._state[product_id] = [now, float(changes), exposure,
+                                       checks]
+
+    def observe(self, product_id: int, changed: bool,
+                timestamp: datetime) -> None:
+        """
+        Учитывает проверку цены товара.
+
+        Args:
+
+            product_id: id товара.
+            changed: Цена отличается от предыдущей проверки.
+            timestamp: Время получения цены.
+        """
+        state = self._state.get(product_id)
+        if state is None:
+            # Первая проверка: не с чем сравнить цену.
+            self._state[product_id] = [timestamp, 0.0, 0.0, 0.0]
+            return
+        elapsed = max(0.0, (timestamp - state[0]).total_seconds())
+        decay = math.exp(-elapsed / self._tau)
+        state[0] = timestamp
+        state[1] = state[1] * decay + changed
+        state[2] = state[2] * decay + elapsed
+        state[3] = state[3] * decay + 1
+
+    def forget(self, present: set[int]) -> None:
+        """Удаляет оценки товаров, снятых с мониторинга."""
+        for product_id in set(self._state) - present:
+            del self._state[product_id]
+
+    def rate(self, product_id: int) -> float:
+        """Возвращает оценку числа изменений цены товара в секунду."""
+        state = self._state.get(product_id)
+        if state is None:
+            return 1 / self.half_life
+        _, changes, exposure, checks = state
+        floor = 1 / (exposure + self.half_life)
+        if not exposure or not checks:
+            return floor
+        unchanged = (checks - changes + 0.5) / (checks + 0.5)
+        return max(floor, -math.log(unchanged) * checks / exposure)
+
+    def _frequency(self, weight: float, scale: float) -> float:
+        return min(max(scale * weight, 1 / self.max_interval),
+                   1 / self.min_interval)
+
+    def rebalance(self, product_ids: Iterable[int]) -> float:
+        """
+        Пересчитывает распределение бюджета между товарами.
+
+        Args:
+
+            product_ids: id товаров на мониторинге, в том числе
+                ещё не проверенных(для них действует априорная оценка).
+
+        Returns:
+
+            Возвращает запланированное число проверок в час
+            (меньше budget, если все товары упёрлись в min_interval,
+            больше - если в max_interval).
+
+        Notes:
+
+            Частота товара - scale * sqrt(rate), ограниченная
+            интервалами. Сумма частот растёт с scale, scale находится
+            точно: по отсортированным весам перебираются отрезки между
+            точками, где товары упираются в границы.
+        """
+        weights = sorted(math.sqrt(self.rate(product_id))
+                         for product_id in product_ids)
+        if not weights:
+            self._scale = None
+            return 0.0
+        target = self.budget / 3600
+        low, high = 1 / self.max_interval, 1 / self.min_interval
+        if target <= len(weights) * low:
+            self._scale = 0.0
+        elif target >= len(weights) * high:
+            self._scale = high / weights[0]
+        else:
+            self._scale = self._solve(weights, target, low, high)
+        return 3600 * sum(self._frequency(weight, self._scale)
+                          for weight in weights)
+
+    @staticmethod
+    def _solve(weights: list[float], target: float,
+               low: float, high: float) -> float:
+        """
+        Находит scale, при котором сумма ограниченных частот
+        равна target(weights отсортированы по возрастанию).
+        """
+        suffix = [0.0] * (len(weights) + 1)
+        for index in range(len(weights) - 1, -1, -1):
+            suffix[index] = suffix[index + 1] + weights[index]
+
+        def total(scale: float) -> float:
+            # Товары с весом ниже low / scale получают low,
+            # с весом выше high / scale - high, остальные scale * вес.
+            lower = bisect.bisect_left(weights, low / scale)
+            upper = bisect.bisect_right(weights, high / scale)
+            return (lower * low + (len(weights) - upper) * high +
+                    scale * (suffix[lower] - suffix[upper]))
+
+        # Между соседними точками излома сумма линейна по scale.
+        points = sorted({low / weight for weight in weights} |
+                        {high / weight for weight in weights})
+        previous, previous_total = points[0], total(points[0])
+        for point in points[1:]:
+            point_total = total(point)
+            if point_total >= target:
+                return previous + ((target - previous_total) *
+                                   (point - previous) /
+                                   (point_total - previous_total))
+            previous, previous_total = point, point_total
+        return previous
+
+    def interval(self, product_id: int) -> Optional[float]:
+        """
+        Возвращает интервал до следующей проверки товара(сек).
+
+        Returns:
+
+            Возвращает None до первого rebalance, тогда используется
+            фиксированный интервал планировщика.
+        """
+        if self._scale is None:
+            return None
+        weight = math.sqrt(self.rate(product_id))
+        return 1 / self._frequency(weight, self._scale)
@@ -0,0 +1,40 @@
+"""
+Модуль разбора JSON ответов API МВИДЕО.
+
+Func:
+
+    loads: Разбирает JSON из байтов ответа без промежуточной строки.
+        Использует orjson, если он установлен, иначе стандартный json.
+
+Notes:
+
+    JSON_BACKEND содержит имя используемой библиотеки.
+    Ошибки разбора обеих библиотек - наследники ValueError.
+"""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Функция разбора JSON.
+
+    Args:
+
+        data: Тело ответа(байты в UTF-8).
+
+    Returns:
+
+        Возвращает разобранные данные.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
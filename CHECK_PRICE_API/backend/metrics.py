@@ -0,0 +1,351 @@
+"""
+Модуль метрик сервиса мониторинга в формате Prometheus.
+
+Classes:
+
+    Counter: Монотонно растущий счётчик.
+    Gauge: Текущее значение(может уменьшаться).
+    Histogram: Распределение значений по корзинам.
+    Registry: Набор метрик, выводит их в текстовом формате Prometheus,
+        снимает и объединяет значения метрик нескольких процессов.
+
+Func:
+
+    start_metrics_server: Запускает встроенный HTTP сервер
+        с маршрутом /metrics.
+
+Notes:
+
+    Метрики сервиса объявлены в конце модуля и импортируются
+    по месту измерения.
+"""
+import copy
+import time
+import math
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from aiohttp import web
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    """Базовый класс метрики с метками."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: tuple = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _samples(self) -> Iterator[tuple[str, str, float]]:
+        for key, value in sorted(self._values.items()):
+            yield "", _format_labels(self.labelnames, key), value
+
+    def _merge(self, values: list) -> object:
+        """Объединяет значения одной серии из нескольких процессов."""
+        return sum(values)
+
+    def render(self) -> list[str]:
+        """Возвращает строки метрики в текстовом формате Prometheus."""
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self._samples():
+            lines.append(f"{self.name}{suffix}{labels} "
+                         f"{_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    Текущее значение.
+
+    Args:
+
+        aggregate: Способ объединения значений нескольких процессов:
+            "sum", "max" или "min".
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: tuple = (), aggregate: str = "sum") -> None:
+        super().__init__(name, documentation, labelnames)
+        self.aggregate = {"sum": sum, "max": max, "min": min}[aggregate]
+
+    def _merge(self, values: list) -> object:
+        return self.aggregate(values)
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels) -> Iterator[None]:
+        """Увеличивает значение на время выполнения блока."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """
+    Распределение значений по корзинам.
+
+    Args:
+
+        buckets: Верхние границы корзин.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: tuple = (),
+                 buckets: tuple = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        state = self._values.setdefault(
+            key, {"buckets": [0] * len(self.buckets), "sum": 0.0,
+                  "count": 0})
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                state["buckets"][index] += 1
+        state["sum"] += value
+        state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Измеряет длительность выполнения блока."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> Iterator[tuple[str, str, float]]:
+        for key, state in sorted(self._values.items()):
+            for bound, count in zip(self.buckets, state["buckets"]):
+                yield ("_bucket",
+                       _format_labels(self.labelnames, key,
+                                      f'le="{_format_value(bound)}"'),
+                       count)
+            labels = _format_labels(self.labelnames, key)
+            yield "_sum", labels, state["sum"]
+            yield "_count", labels, state["count"]
+
+    def _merge(self, values: list) -> object:
+        return {"buckets": [sum(counts) for counts in
+                            zip(*(value["buckets"] for value in values))],
+                "sum": sum(value["sum"] for value in values),
+                "count": sum(value["count"] for value in values)}
+
+
+class Registry:
+    """Набор метрик сервиса."""
+
+    def __init__(self) -> None:
+        self.metrics: list[_Metric] = []
+        self.collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Добавляет функцию, обновляющую метрики перед выводом."""
+        self.collectors.append(collector)
+
+    def clear(self) -> None:
+        """Сбрасывает значения всех метрик."""
+        for metric in self.metrics:
+            metric._values.clear()
+
+    def snapshot(self) -> dict[str, dict]:
+        """
+        Возвращает копию значений метрик для передачи в другой процесс.
+
+        Returns:
+
+            Возвращает словарь {имя метрики: {метки: значение}},
+            метрики без значений не попадают в снимок.
+        """
+        for collector in self.collectors:
+            collector()
+        return {metric.name: copy.deepcopy(metric._values)
+                for metric in self.metrics if metric._values}
+
+    def merge(self, snapshots: list[dict[str, dict]]) -> None:
+        """
+        Заменяет значения метрик объединёнными значениями снимков.
+
+        Args:
+
+            snapshots: Снимки(snapshot) метрик нескольких процессов.
+                Счётчики и гистограммы складываются, текущие значения
+                объединяются способом aggregate. Метрики, которых нет
+                ни в одном снимке, не изменяются.
+        """
+        for metric in self.metrics:
+            series: dict[tuple, list] = {}
+            for snapshot in snapshots:
+                for key, value in snapshot.get(metric.name, {}).items():
+                    series.setdefault(key, []).append(value)
+            if series:
+                metric._values = {key: metric._merge(values)
+                                  for key, values in series.items()}
+
+    def render(self) -> str:
+        """Возвращает все метрики в текстовом формате Prometheus."""
+        for collector in self.collectors:
+            collector()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+async def _metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=REGISTRY.render(),
+                        content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def start_metrics_server(port: int,
+                               host: str = "0.0.0.0") -> web.AppRunner:
+    """
+    Функция запуска HTTP сервера метрик.
+
+    Args:
+
+        port: Порт сервера.
+        host: Адрес сервера.
+
+    Returns:
+
+        Возвращает запущенный AppRunner, для остановки
+        вызовите его метод cleanup().
+    """
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+# Метрики сервиса мониторинга.
+FETCH_SECONDS = REGISTRY.register(Histogram(
+    "monitor_fetch_seconds",
+    "Длительность запроса к API МВИДЕО.", ("status",)))
+FETCH_IN_FLIGHT = REGISTRY.register(Gauge(
+    "monitor_fetch_in_flight", "Число выполняющихся запросов к API МВИДЕО."))
+PARSE_SECONDS = REGISTRY.register(Histogram(
+    "monitor_parse_seconds",
+    "Длительность разбора ответа: decode - JSON, extract - поиск цен.",
+    ("stage",), buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1,
+                         0.5, 1)))
+DB_WRITE_SECONDS = REGISTRY.register(Histogram(
+    "monitor_db_write_seconds", "Длительность записи пачки цен в базу."))
+DB_ROWS_WRITTEN = REGISTRY.register(Counter(
+    "monitor_db_rows_written_total", "Число записанных в базу цен."))
+PRICE_EVENTS = REGISTRY.register(Counter(
+    "monitor_price_events_total", "Число записанных изменений цен."))
+ALERTS = REGISTRY.register(Counter(
+    "monitor_alerts_total",
+    "Число переходов правил оповещения: fired - сработало, "
+    "rearmed - взведено снова.", ("op",)))
+ALERT_RULES = REGISTRY.register(Gauge(
+    "monitor_alert_rules", "Число загруженных правил оповещения."))
+BATCH_SECONDS = REGISTRY.register(Histogram(
+    "monitor_batch_seconds", "Длительность обработки пачки товаров.",
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800, 3600)))
+SCHEDULE_LAG_SECONDS = REGISTRY.register(Gauge(
+    "monitor_schedule_lag_seconds",
+    "Отставание последней пачки от расписания.", aggregate="max"))
+PRODUCTS_DUE = REGISTRY.register(Counter(
+    "monitor_products_due_total",
+    "Число товаров, время проверки которых наступило."))
+PRODUCTS_PROCESSED = REGISTRY.register(Counter(
+    "monitor_products_processed_total",
+    "Число товаров, для которых получена цена."))
+ERRORS = REGISTRY.register(Counter(
+    "monitor_errors_total",
+    "Число ошибок по типам: auth, format, missing_price, throttled, "
+    "network, timeout, db, monitor.", ("type",)))
+BREAKER_OPEN = REGISTRY.register(Gauge(
+    "monitor_rate_limit_open",
+    "1, если запросы к хосту приостановлены ограничителем.", ("host",),
+    aggregate="max"))
+BREAKER_RATE_FACTOR = REGISTRY.register(Gauge(
+    "monitor_rate_limit_factor",
+    "Доля скорости запросов к хосту при восстановлении.", ("host",),
+    aggregate="min"))
+BREAKER_TRIPS = REGISTRY.register(Gauge(
+    "monitor_rate_limit_trips",
+    "Число пауз запросов к хосту с момента старта.", ("host",)))
+SPOOL_BYTES = REGISTRY.register(Gauge(
+    "monitor_spool_bytes",
+    "Размер файла цен, ожидающих записи в базу."))
+SPOOL_ROWS = REGISTRY.register(Counter(
+    "monitor_spool_rows_total",
+    "Число цен в файле spool: spooled - записано в файл, replayed - "
+    "перенесено в базу, lost - отброшено из-за размера файла.", ("op",)))
+CADENCE_PLANNED = REGISTRY.register(Gauge(
+    "monitor_cadence_planned_per_hour",
+    "Запланированное адаптивным расписанием число проверок в час."))
+WORKERS_ALIVE = REGISTRY.register(Gauge(
+    "monitor_workers_alive", "Число работающих процессов мониторинга."))
+WORKER_RESTARTS = REGISTRY.register(Counter(
+    "monitor_worker_restarts_total",
+    "Число перезапусков упавших процессов мониторинга."))
+
+
+def observe_error(error_type: str, amount: int = 1) -> None:
+    """Учитывает ошибку заданного типа."""
+    ERRORS.inc(amount, type=error_type)
@@ -0,0 +1,121 @@
+"""
+Модуль пула воркеров для параллельного обхода товаров.
+
+Classes:
+
+    SweepPool: Пул воркеров с ограничением общей конкурентности
+        и числа одновременных запросов к одному хосту.
+        Ошибки и зависания одного товара не останавливают
+        обработку остальных.
+"""
+import time
+import asyncio
+import logging
+from typing import Any, AsyncIterable, Awaitable, Callable, Iterable, Union
+from urllib.parse import urlparse
+
+
+logger = logging.getLogger(__name__)
+
+
+class SweepPool:
+    """
+    Пул воркеров для обхода товаров.
+
+    Args:
+
+        concurrency: Максимальное число одновременно обрабатываемых товаров.
+        per_host_limit: Максимальное число одновременных запросов
+            к одному хосту.
+        item_timeout: Максимальное время обработки одного товара(сек).
+
+    Notes:
+
+        По тайм-ауту обработчик отменяется(asyncio.CancelledError),
+        поэтому запись в базу данных внутри обработчика должна быть
+        защищена от отмены, как PriceTickWriter.flush(asyncio.shield).
+    """
+
+    def __init__(self, concurrency: int, per_host_limit: int,
+                 item_timeout: float) -> None:
+        self.concurrency = max(1, concurrency)
+        self.per_host_limit = max(1, per_host_limit)
+        self.item_timeout = item_timeout
+        self._host_limits: dict[str, asyncio.Semaphore] = {}
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        """Возвращает семафор для хоста из переданного URL."""
+        host = urlparse(url).hostname or ""
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_limits[host]
+
+    async def _process(self, item: Any,
+                       handler: Callable[[Any], Awaitable[bool]],
+                       url: str, stats: dict) -> None:
+        """Обрабатывает один элемент, изолируя его ошибки от остальных."""
+        try:
+            async with self._host_semaphore(url):
+                ok = await asyncio.wait_for(handler(item),
+                                            timeout=self.item_timeout)
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+            logger.debug(f"Превышено время обработки: {url}")
+        except Exception as ex:
+            stats["failed"] += 1
+            logger.debug(f"Ошибка обработки {url}: {ex}")
+        else:
+            stats["ok" if ok else "failed"] += 1
+
+    async def run(self, items: Union[Iterable[Any], AsyncIterable[Any]],
+                  handler: Callable[[Any], Awaitable[bool]],
+                  url_of: Callable[[Any], str]) -> dict:
+        """
+        Обходит элементы пулом воркеров.
+
+        Args:
+
+            items: Элементы для обработки(товары), в том числе
+                асинхронный итератор. Элементы читаются по мере
+                освобождения воркеров через ограниченную очередь.
+            handler: Корутина обработки одного элемента,
+                возвращает True в случае успеха.
+            url_of: Функция получения URL элемента,
+                по хосту которого ограничивается конкурентность.
+
+        Returns:
+
+            Возвращает статистику прохода: количество элементов,
+            успешных, ошибочных, зависших и длительность прохода(сек).
+        """
+        stats = {"total": 0, "ok": 0, "failed": 0, "timeouts": 0}
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        started = time.monotonic()
+
+        async def worker() -> None:
+            while True:
+                item = await queue.get()
+                try:
+                    await self._process(item, handler, url_of(item), stats)
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker())
+                   for _ in range(self.concurrency)]
+        try:
+            if isinstance(items, AsyncIterable):
+                async for item in items:
+                    stats["total"] += 1
+                    await queue.put(item)
+            else:
+                for item in items:
+                    stats["total"] += 1
+                    await queue.put(item)
+            await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        stats["duration"] = round(time.monotonic() - started, 3)
+        return stats
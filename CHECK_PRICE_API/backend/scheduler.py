@@ -0,0 +1,205 @@
+"""
+Модуль планировщика проверок цен.
+
+Classes:
+
+    DueScheduler: Очередь с приоритетом(куча) товаров, упорядоченная
+        по времени следующей проверки. Равномерно распределяет
+        проверки по интервалу со случайным смещением, подхватывает
+        новые и изменённые товары и забывает удалённые. С AdaptiveCadence
+        интервал каждого товара зависит от частоты изменения его цены.
+"""
+import heapq
+import random
+from datetime import datetime, timedelta
+from typing import AsyncIterable, Optional
+
+from backend.cadence import AdaptiveCadence
+
+
+class DueScheduler:
+    """
+    Планировщик проверок цен по времени.
+
+    Args:
+
+        interval: Интервал между проверками одного товара(сек).
+        jitter: Максимальное случайное смещение времени проверки(сек).
+        cadence: Адаптивная частота проверки, по умолчанию все товары
+            проверяются раз в interval секунд.
+    """
+
+    def __init__(self, interval: float, jitter: float,
+                 cadence: Optional[AdaptiveCadence] = None) -> None:
+        self.interval = interval
+        self.jitter = jitter
+        self.cadence = cadence
+        self._heap: list[tuple[datetime, int, str]] = []
+        self._known: dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._known)
+
+    def _push(self, due: datetime, product_id: int, url_price: str) -> None:
+        self._known[product_id] = url_price
+        heapq.heappush(self._heap, (due, product_id, url_price))
+
+    def _spread(self, now: datetime,
+                interval: Optional[float] = None) -> datetime:
+        """Возвращает случайное время внутри ближайшего интервала."""
+        return now + timedelta(
+            seconds=random.uniform(0, interval or self.interval))
+
+    async def sync(self, products: AsyncIterable[dict], now: datetime,
+                   initial: bool = False,
+                   ids: Optional[set[int]] = None) -> int:
+        """
+        Синхронизирует очередь с товарами из базы данных.
+
+        Args:
+
+            products: Асинхронный итератор словарей
+                с id, url_price и next_check_at.
+            now: Текущее время.
+            initial: Первая загрузка после старта сервиса.
+            ids: id изменившихся товаров, если products содержит
+                только их, по умолчанию products - все товары.
+
+        Returns:
+
+            Возвращает количество новых товаров в очереди.
+
+        Notes:
+
+            Сохранённое время проверки используется как есть, поэтому
+            после перезапуска обход продолжается с того же места.
+            Товары без времени проверки при первой загрузке
+            распределяются по интервалу, а добавленные позже
+            проверяются сразу. Товар с изменившимся URL цены
+            проверяется сразу по новому URL. Удалённые товары
+            (из ids, если они переданы) убираются из очереди.
+        """
+        present = set()
+        added = 0
+        changed = False
+        async for product in products:
+            product_id = int(product["id"])
+            url_price = str(product["url_price"])
+            present.add(product_id)
+            known = self._known.get(product_id)
+            if known == url_price:
+                continue
+            if known is not None:
+                self._push(now, product_id, url_price)
+                changed = True
+                continue
+            due = product.get("next_check_at")
+            if due is None:
+                due = self._spread(now) if initial else now
+            self._push(due, product_id, url_price)
+            added += 1
+        if changed:
+            # Убираем записи со старыми URL, иначе при возврате
+            # прежнего URL товар оказался бы в очереди дважды.
+            self._heap = [entry for entry in self._heap
+                          if self._known.get(entry[1]) == entry[2]]
+            heapq.heapify(self._heap)
+        checked = self._known if ids is None else ids
+        removed = [product_id for product_id in checked
+                   if product_id in self._known and product_id not in present]
+        for product_id in removed:
+            del self._known[product_id]
+        if self.cadence is not None and (ids is None or removed):
+            self.cadence.forget(set(self._known))
+        return added
+
+    def pop_due(self, now: datetime, limit: int) -> list[dict]:
+        """
+        Забирает из очереди товары, время проверки которых наступило.
+
+        Args:
+
+            now: Текущее время.
+            limit: Максимальное количество товаров.
+
+        Returns:
+
+            Возвращает список словарей с id, url_price и due
+            (запланированное время проверки).
+        """
+        batch = []
+        while self._heap and len(batch) < limit and self._heap[0][0] <= now:
+            due, product_id, url_price = heapq.heappop(self._heap)
+            if self._known.get(product_id) != url_price:
+                continue
+            batch.append({"id": product_id, "url_price": url_price,
+                          "due": due})
+        return batch
+
+    def reschedule(self, item: dict, now: datetime) -> Optional[datetime]:
+        """
+        Планирует следующую проверку товара.
+
+        Args:
+
+            item: Словарь товара, полученный из pop_due.
+            now: Текущее время.
+
+        Returns:
+
+            Возвращает время следующей проверки(см. next_due), либо None,
+            если товар был удалён с мониторинга.
+        """
+        if self._known.get(item["id"]) != item["url_price"]:
+            return None
+        interval = None
+        if self.cadence is not None:
+            interval = self.cadence.interval(item["id"])
+        due = self.next_due(item["due"], now=now, interval=interval)
+        heapq.heappush(self._heap, (due, item["id"], item["url_price"]))
+        return due
+
+    def next_due(self, due: datetime, now: datetime,
+                 interval: Optional[float] = None) -> datetime:
+        """
+        Возвращает время следующей проверки после запланированной due.
+
+        Args:
+
+            due: Запланированное время текущей проверки.
+            now: Текущее время.
+            interval: Интервал проверки товара(сек),
+                по умолчанию общий интервал планировщика.
+
+        Notes:
+
+            Следующая проверка отсчитывается от запланированного,
+            а не от фактического времени, поэтому длительность
+            обработки не сдвигает цикл. Если планировщик отстал
+            больше чем на интервал, товар распределяется
+            по ближайшему интервалу заново.
+        """
+        interval = interval or self.interval
+        jitter = min(self.jitter, interval / 2)
+        next_check = due + timedelta(
+            seconds=interval + random.uniform(-jitter, jitter))
+        if next_check <= now:
+            next_check = self._spread(now, interval)
+        return next_check
+
+    def rebalance(self, budget: float) -> float:
+        """
+        Распределяет бюджет проверок в час между товарами очереди
+        (см. AdaptiveCadence.rebalance).
+        """
+        self.cadence.budget = budget
+        return self.cadence.rebalance(self._known)
+
+    def seconds_until_next(self, now: datetime) -> Optional[float]:
+        """Возвращает число секунд до ближайшей проверки."""
+        while self._heap:
+            due, product_id, url_price = self._heap[0]
+            if self._known.get(product_id) == url_price:
+                return max(0.0, (due - now).total_seconds())
+            heapq.heappop(self._heap)
+        return None
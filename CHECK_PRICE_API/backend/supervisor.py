@@ -0,0 +1,158 @@
+"""
+Модуль запуска мониторинга в нескольких процессах.
+
+Classes:
+
+    WorkerSupervisor: Запускает процессы мониторинга, перезапускает
+        упавшие, собирает их метрики в общий набор(REGISTRY).
+
+Func:
+
+    publish_metrics: Периодически отправляет снимок метрик процесса
+        мониторинга в очередь супервизора.
+"""
+import time
+import queue
+import asyncio
+import logging
+import multiprocessing
+from typing import Callable, Optional
+
+from backend.metrics import REGISTRY, WORKERS_ALIVE, WORKER_RESTARTS
+
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед перезапуском упавшего процесса (в секундах).
+RESTART_DELAY = 5
+
+
+async def publish_metrics(index: int, metrics_queue: multiprocessing.Queue,
+                          interval: float) -> None:
+    """
+    Функция отправки метрик процесса мониторинга супервизору.
+
+    Args:
+
+        index: Номер процесса.
+        metrics_queue: Очередь метрик супервизора.
+        interval: Период отправки(сек).
+
+    Notes:
+
+        Отправляет накопленные с запуска процесса значения, поэтому
+        потеря одного снимка ничего не искажает. При отмене отправляет
+        последний снимок.
+    """
+    try:
+        while True:
+            metrics_queue.put((index, REGISTRY.snapshot()))
+            await asyncio.sleep(interval)
+    finally:
+        metrics_queue.put((index, REGISTRY.snapshot()))
+
+
+class WorkerSupervisor:
+    """
+    Супервизор процессов мониторинга.
+
+    Args:
+
+        count: Число процессов.
+        target: Функция процесса, вызывается с аргументами
+            (номер процесса, число процессов, очередь метрик).
+            Должна быть доступна по имени модуля(для запуска spawn).
+        stop_timeout: Время ожидания завершения процессов(сек),
+            после него процессы завершаются принудительно.
+    """
+
+    def __init__(self, count: int,
+                 target: Callable[[int, int, multiprocessing.Queue], None],
+                 stop_timeout: float = 30) -> None:
+        self.count = count
+        self.target = target
+        self.stop_timeout = stop_timeout
+        self.context = multiprocessing.get_context("spawn")
+        self.metrics_queue = self.context.Queue()
+        self.processes: list[Optional[multiprocessing.Process]] = (
+            [None] * count)
+        self.snapshots: dict[int, dict] = {}
+        REGISTRY.add_collector(self.collect)
+
+    def _spawn(self, index: int) -> None:
+        process = self.context.Process(
+            target=self.target,
+            args=(index, self.count, self.metrics_queue),
+            name=f"monitor-{index}")
+        process.start()
+        self.processes[index] = process
+        logger.info(f"Запущен процесс мониторинга {index}: "
+                    f"pid {process.pid}")
+
+    def _drain(self) -> None:
+        """Забирает из очереди снимки метрик процессов."""
+        while True:
+            try:
+                index, snapshot = self.metrics_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.snapshots[index] = snapshot
+
+    def collect(self) -> None:
+        """Объединяет последние снимки метрик процессов в REGISTRY."""
+        self._drain()
+        REGISTRY.merge(list(self.snapshots.values()))
+        WORKERS_ALIVE.set(sum(1 for process in self.processes
+                              if process is not None and
+                              process.is_alive()))
+
+    async def run(self) -> None:
+        """
+        Запускает процессы и следит за ними до отмены.
+
+        Notes:
+
+            Упавший процесс перезапускается через RESTART_DELAY секунд
+            с тем же номером, то есть с той же частью товаров.
+            При отмене процессы получают SIGTERM и записывают
+            остаток буфера цен.
+        """
+        for index in range(self.count):
+            self._spawn(index)
+        died: dict[int, float] = {}
+        try:
+            while True:
+                self._drain()
+                for index, process in enumerate(self.processes):
+                    if process.is_alive():
+                        continue
+                    if index not in died:
+                        logger.error(f"Процесс мониторинга {index} "
+                                     f"завершился, код: {process.exitcode}")
+                        died[index] = time.monotonic()
+                    elif time.monotonic() - died[index] >= RESTART_DELAY:
+                        del died[index]
+                        WORKER_RESTARTS.inc()
+                        self._spawn(index)
+                await asyncio.sleep(0.5)
+        finally:
+            await self.stop()
+
+    async def stop(self) -> None:
+        """Останавливает процессы мониторинга."""
+        alive = [process for process in self.processes
+                 if process is not None and process.is_alive()]
+        for process in alive:
+            process.terminate()
+        deadline = time.monotonic() + self.stop_timeout
+        while (any(process.is_alive() for process in alive) and
+               time.monotonic() < deadline):
+            self._drain()
+            await asyncio.sleep(0.1)
+        for process in alive:
+            if process.is_alive():
+                logger.error(f"Процесс {process.name} не завершился "
+                             f"за {self.stop_timeout} сек.")
+                process.kill()
+            process.join()
+        self._drain()
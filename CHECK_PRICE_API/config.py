@@ -8,3 +8,123 @@ DB_USER = os.environ.get("DB_USER")
 DB_PASS = os.environ.get("DB_PASS")
 DB_HOST = os.environ.get("DB_HOST")
 DB_NAME = os.environ.get("DB_NAME")
+
+# Параметры мониторинга цен.
+# Интервал между проходами по товарам (в секундах).
+MONITOR_INTERVAL = int(os.environ.get("MONITOR_INTERVAL", 3600))
+# Максимальное число одновременно обрабатываемых товаров.
+MONITOR_CONCURRENCY = int(os.environ.get("MONITOR_CONCURRENCY", 20))
+# Максимальное число одновременных запросов к одному хосту.
+MONITOR_PER_HOST_LIMIT = int(os.environ.get("MONITOR_PER_HOST_LIMIT", 10))
+# Максимальное время обработки одного товара (в секундах).
+MONITOR_ITEM_TIMEOUT = float(os.environ.get("MONITOR_ITEM_TIMEOUT", 30))
+
+# Параметры HTTP клиента для запросов к API МВИДЕО.
+# Общее число соединений в пуле.
+HTTP_POOL_LIMIT = int(os.environ.get("HTTP_POOL_LIMIT", 100))
+# Время кеширования DNS ответов (в секундах).
+HTTP_DNS_TTL = int(os.environ.get("HTTP_DNS_TTL", 300))
+# Время удержания неактивного соединения (в секундах).
+HTTP_KEEPALIVE = float(os.environ.get("HTTP_KEEPALIVE", 60))
+# Таймауты установки соединения и чтения ответа (в секундах).
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 15))
+
+# Параметры пакетной записи цен в базу данных.
+# Размер пачки, при котором буфер сбрасывается в базу.
+WRITE_BATCH_SIZE = int(os.environ.get("WRITE_BATCH_SIZE", 500))
+# Максимальное время ожидания записи в буфере (в секундах).
+WRITE_FLUSH_INTERVAL = float(os.environ.get("WRITE_FLUSH_INTERVAL", 5))
+
+# Параметры планировщика проверок.
+# Случайное смещение времени следующей проверки (в секундах).
+MONITOR_JITTER = float(os.environ.get("MONITOR_JITTER", 60))
+# Период обновления расписания по уведомлениям об изменении товаров
+# (в секундах).
+SCHEDULER_REFRESH = float(os.environ.get("SCHEDULER_REFRESH", 30))
+# Период полной сверки расписания со всеми товарами в базе
+# (в секундах).
+SCHEDULER_FULL_REFRESH = float(os.environ.get("SCHEDULER_FULL_REFRESH",
+                                              3600))
+# Максимальное число товаров, забираемых из очереди за один раз.
+SCHEDULER_BATCH = int(os.environ.get("SCHEDULER_BATCH", 200))
+
+# Режим хранения цен: "all" - запись каждой проверки,
+# "changes" - запись только изменившихся цен и контрольных записей.
+PRICE_STORE_MODE = os.environ.get("PRICE_STORE_MODE", "all")
+# Период контрольной записи неизменной цены (в секундах).
+PRICE_HEARTBEAT = float(os.environ.get("PRICE_HEARTBEAT", 86400))
+# Обновлять агрегаты цен по периодам(OHLC) при записи цен.
+PRICE_ROLLUPS = os.environ.get("PRICE_ROLLUPS", "1") == "1"
+
+# Параметры объединения запросов цен.
+# Максимальное число товаров в одном запросе цен.
+PRICE_BATCH_SIZE = int(os.environ.get("PRICE_BATCH_SIZE", 50))
+# Окно, в пределах которого проверки товаров объединяются (в секундах).
+PRICE_BATCH_WINDOW = float(os.environ.get("PRICE_BATCH_WINDOW", 60))
+
+# Параметры ограничения частоты запросов к API МВИДЕО.
+# Скорость запросов к одному хосту (в секунду) и размер всплеска.
+RATE_LIMIT_RPS = float(os.environ.get("RATE_LIMIT_RPS", 5))
+RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", 10))
+# Число попыток запроса и границы экспоненциальной задержки (в секундах).
+RETRY_ATTEMPTS = int(os.environ.get("RETRY_ATTEMPTS", 3))
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", 1))
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", 30))
+# Число подряд неудачных запросов, после которого запросы к хосту
+# приостанавливаются, и длительность паузы (в секундах).
+BREAKER_THRESHOLD = int(os.environ.get("BREAKER_THRESHOLD", 5))
+BREAKER_COOLDOWN = float(os.environ.get("BREAKER_COOLDOWN", 60))
+BREAKER_MAX_COOLDOWN = float(os.environ.get("BREAKER_MAX_COOLDOWN", 900))
+# Число успешных запросов для каждого шага восстановления скорости.
+BREAKER_RECOVERY_STEP = int(os.environ.get("BREAKER_RECOVERY_STEP", 10))
+# Сразу возвращать ошибку, а не ждать окончания паузы.
+BREAKER_FAIL_FAST = os.environ.get("BREAKER_FAIL_FAST", "0") == "1"
+
+# Режим распределения товаров: "scheduler" - один экземпляр мониторинга
+# с расписанием в памяти, "lease" - несколько экземпляров, каждый
+# арендует пачки товаров в базе данных (SELECT ... FOR UPDATE SKIP LOCKED).
+MONITOR_MODE = os.environ.get("MONITOR_MODE", "scheduler")
+# Срок аренды пачки товаров (в секундах), после него пачку
+# забирает другой экземпляр.
+LEASE_TTL = float(os.environ.get("LEASE_TTL", 300))
+
+# Размер страницы при постраничном чтении товаров из базы данных.
+PRODUCT_PAGE_SIZE = int(os.environ.get("PRODUCT_PAGE_SIZE", 1000))
+
+# Порт встроенного HTTP сервера метрик Prometheus (0 - выключен).
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9100))
+
+# Число процессов мониторинга (0 - по числу ядер процессора).
+# Каждый процесс проверяет свою часть товаров со своими пулом воркеров,
+# HTTP клиентом и подключением к базе данных, скорость запросов
+# RATE_LIMIT_RPS делится между процессами.
+MONITOR_WORKERS = int(os.environ.get("MONITOR_WORKERS", 1))
+# Период отправки метрик процессов мониторинга супервизору (в секундах).
+WORKER_METRICS_INTERVAL = float(
+    os.environ.get("WORKER_METRICS_INTERVAL", 5))
+
+# Файл для цен, которые не удалось записать в базу данных
+# ("" - не сохранять, цены остаются в памяти до восстановления базы).
+SPOOL_PATH = os.environ.get("SPOOL_PATH", "spool/prices.jsonl")
+# Максимальный размер файла (в байтах).
+SPOOL_MAX_BYTES = int(os.environ.get("SPOOL_MAX_BYTES", 256 * 1024 * 1024))
+# Максимальная пауза перед перезапуском упавшего мониторинга (в секундах).
+MONITOR_RESTART_MAX_DELAY = float(
+    os.environ.get("MONITOR_RESTART_MAX_DELAY", 60))
+
+# Частота проверки товаров: "fixed" - каждый товар раз в MONITOR_INTERVAL,
+# "adaptive" - чаще товары с часто меняющейся ценой, реже стабильные
+# (только для MONITOR_MODE="scheduler").
+CADENCE_MODE = os.environ.get("CADENCE_MODE", "fixed")
+# Бюджет проверок товаров в час на все процессы мониторинга
+# (0 - столько же, сколько в режиме "fixed": товары * 3600 / интервал).
+CADENCE_BUDGET = float(os.environ.get("CADENCE_BUDGET", 0))
+# Границы интервала проверки одного товара (в секундах).
+CADENCE_MIN_INTERVAL = float(os.environ.get("CADENCE_MIN_INTERVAL", 300))
+CADENCE_MAX_INTERVAL = float(
+    os.environ.get("CADENCE_MAX_INTERVAL", 86400))
+# Период полураспада веса наблюдённых изменений цены (в секундах).
+CADENCE_HALF_LIFE = float(os.environ.get("CADENCE_HALF_LIFE", 7 * 86400))
+# Период перераспределения бюджета между товарами (в секундах).
+CADENCE_REBALANCE = float(os.environ.get("CADENCE_REBALANCE", 600))
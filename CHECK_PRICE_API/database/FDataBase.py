@@ -6,7 +6,9 @@ Models:
     Product: Содержит основную инфу о товаре:
         id, название, описание, рейтинг,
         URL на API с основными данными,
-        URL на API с данными о цене.
+        URL на API с данными о цене,
+        время следующей проверки цены, аренда товара экземпляром
+        мониторинга.
         Так же связь с таблицей истории цен.
 
     PriceHistory: Содержит:
@@ -14,21 +16,58 @@ Models:
         цена на товар, время добавления цены, а так же связь
         с таблицей информации о продукте.
 
+    PriceEvent: Содержит события изменения цен: порядковый номер,
+        id товара, старую и новую цену и время получения новой цены.
+
+    AlertRule: Содержит правила оповещения о снижении цены товара:
+        вид правила, порог срабатывания и состояние(взведено или
+        сработало).
+
+    PriceRollup: Содержит агрегаты цен товара по периодам(час, день,
+        неделя, месяц): первую, максимальную, минимальную и последнюю
+        цену, сумму и число записей.
+
 Func:
 
     get_session: Создаёт асинхронную сессию,
         для работы с базой данных
 
-    select_all_item: Возвращает все товары,
-        находящиеся в базе(на мониторинге)
+    iter_schedule: Асинхронный итератор по товарам на мониторинге
+        (всем или переданным), постранично(по ключу id) читает только
+        id, URL цены и время следующей проверки.
+
+    update_next_check: Получает на вход: словарь {id товара: время
+        следующей проверки} и объект сессии, сохраняет эти времена.
+
+    select_last_prices: Возвращает последнюю сохранённую цену
+        и время её записи для каждого(или переданных) товара.
+
+    select_change_stats: Возвращает для каждого товара число изменений
+        цены и записей в истории с заданного времени и время первой
+        записи.
+
+    claim_due_products: Арендует для экземпляра мониторинга пачку
+        товаров, время проверки которых наступило, пропуская товары,
+        заблокированные или арендованные другими экземплярами.
+
+    release_products: Снимает аренду с товаров экземпляра
+        и сохраняет время их следующей проверки.
 
-    add_item_price: Получает на вход:
-        id продукта, цену, объект сессии,
-        возвращает актуальную цену на товар(float).
+    notify_products: Получает на вход: объект сессии, канал и id
+        товаров, отправляет уведомление(NOTIFY) об их изменении.
+
+    select_alert_rules: Возвращает правила оповещения всех(или
+        переданных) товаров.
+
+    update_alert_rules: Сохраняет срабатывание и повторное взведение
+        правил оповещения, уведомляет о сработавших правилах(NOTIFY).
 """
-from typing import AsyncGenerator
-from sqlalchemy import (Column, DateTime, ForeignKey,
-                        Integer, String, Float, select)
+import json
+from datetime import datetime, timedelta
+from typing import AsyncGenerator, AsyncIterator, Iterable, Optional
+from sqlalchemy import (BigInteger, Boolean, Column, DateTime, ForeignKey,
+                        Index, Integer, String, Float, select, update,
+                        bindparam, text)
 from sqlalchemy.ext.asyncio import (
     create_async_engine, AsyncSession)
 from sqlalchemy.orm import sessionmaker, relationship, DeclarativeBase
@@ -62,9 +101,14 @@ class Product(Base):
         rating: Рейтинг товара.
         url_info: Ссылка на API с общей информацией о товаре.
         url_price: Ссылка на API с информацией о цене товара.
+        next_check_at: Время следующей проверки цены товара.
+        lease_owner: Экземпляр мониторинга, арендовавший товар.
+        lease_expires_at: Время окончания аренды товара.
         price_history: Связь с таблицей истории цен на товар.
     """
     __tablename__ = "products"
+    __table_args__ = (Index("ix_products_urls", "url_info", "url_price",
+                            unique=True),)
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
@@ -72,6 +116,9 @@ class Product(Base):
     rating = Column(Float)
     url_info = Column(String, nullable=False)
     url_price = Column(String, nullable=False)
+    next_check_at = Column(DateTime, default=func.now())
+    lease_owner = Column(String)
+    lease_expires_at = Column(DateTime)
 
     price_history = relationship("PriceHistory",
                                  back_populates="product",
@@ -91,6 +138,9 @@ class PriceHistory(Base):
         product: Связь с таблицей общей информации о продукте.
     """
     __tablename__ = "price_history"
+    # Чтение истории товара по времени и постраничная выборка.
+    __table_args__ = (Index("ix_price_history_product_time",
+                            "product_id", "timestamp", "id"),)
 
     id = Column(Integer, primary_key=True)
     product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
@@ -100,63 +150,476 @@ class PriceHistory(Base):
     product = relationship("Product", back_populates="price_history")
 
 
+# Номер текущей транзакции(xid8) как BIGINT.
+PRICE_EVENTS_TXID = "pg_current_xact_id()::text::bigint"
+
+
+class PriceEvent(Base):
+    """
+    Таблица событий изменения цен(outbox для подписчиков).
+
+    Args:
+
+        seq: Порядковый номер события.
+        txid: Номер транзакции, записавшей событие, вместе с seq
+            задаёт порядок чтения событий подписчиками.
+        product_id: id продукта.
+        old_price: Предыдущая цена продукта.
+        new_price: Новая цена продукта.
+        timestamp: Время получения новой цены.
+    """
+    __tablename__ = "price_events"
+    # Чтение событий по порядку завершения транзакций.
+    __table_args__ = (Index("ix_price_events_txid", "txid", "seq"),)
+
+    seq = Column(BigInteger, primary_key=True)
+    txid = Column(BigInteger, nullable=False,
+                  server_default=text(PRICE_EVENTS_TXID))
+    product_id = Column(Integer, nullable=False)
+    old_price = Column(Float, nullable=False)
+    new_price = Column(Float, nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+
+
+# Канал NOTIFY, в который отправляется уведомление о новых событиях.
+PRICE_EVENTS_CHANNEL = "price_events"
+
+# Канал NOTIFY, в который отправляются id товаров с новыми ценами
+# (через запятую), по нему HTTP API сбрасывает кэш ответов.
+PRICE_TICKS_CHANNEL = "price_ticks"
+# Канал NOTIFY, в который HTTP API отправляет id добавленных, изменённых
+# и удалённых товаров, по нему мониторинг обновляет расписание.
+PRODUCTS_CHANNEL = "products_changed"
+# Максимальный размер уведомления(ограничение PostgreSQL - 8000 байт).
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+
+class AlertRule(Base):
+    """
+    Таблица правил оповещения о снижении цены.
+
+    Args:
+
+        id: id правила.
+        product_id: id продукта.
+        kind: Вид правила: "below" - цена ниже value,
+            "drop_pct" - цена снизилась на value процентов от цены
+            на момент создания правила.
+        value: Порог цены или процент снижения.
+        threshold: Цена, при которой срабатывает правило.
+        armed: Правило взведено: сработает, когда цена опустится
+            до threshold. После срабатывания снимается и взводится
+            снова, когда цена поднимется выше threshold.
+        fired_at: Время последнего срабатывания.
+        fired_price: Цена при последнем срабатывании.
+        created_at: Время создания правила.
+    """
+    __tablename__ = "alert_rules"
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer,
+                        ForeignKey('products.id', ondelete="CASCADE"),
+                        nullable=False, index=True)
+    kind = Column(String, nullable=False)
+    value = Column(Float, nullable=False)
+    threshold = Column(Float, nullable=False)
+    armed = Column(Boolean, nullable=False, default=True)
+    fired_at = Column(DateTime)
+    fired_price = Column(Float)
+    created_at = Column(DateTime, default=func.now())
+
+
+# Канал NOTIFY, в который отправляются сработавшие правила оповещения.
+PRICE_ALERTS_CHANNEL = "price_alerts"
+
+
+class PriceRollup(Base):
+    """
+    Таблица агрегатов цен товара по периодам(OHLC).
+
+    Args:
+
+        product_id: id продукта.
+        bucket: Размер периода из ROLLUP_BUCKETS.
+        bucket_start: Начало периода(date_trunc времени записи).
+        open: Первая цена периода.
+        high: Максимальная цена периода.
+        low: Минимальная цена периода.
+        close: Последняя цена периода.
+        open_at: Время первой цены периода.
+        close_at: Время последней цены периода.
+        price_sum: Сумма цен записей периода.
+        count: Число записей периода.
+    """
+    __tablename__ = "price_rollups"
+
+    product_id = Column(Integer,
+                        ForeignKey('products.id', ondelete="CASCADE"),
+                        primary_key=True)
+    bucket = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    open_at = Column(DateTime, nullable=False)
+    close_at = Column(DateTime, nullable=False)
+    price_sum = Column(Float, nullable=False)
+    count = Column(Integer, nullable=False)
+
+
+# Размеры периодов, по которым хранятся агрегаты цен.
+ROLLUP_BUCKETS = ("hour", "day", "week", "month")
+
+
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     """Функция получения асинхронной сессии."""
     async with AsyncSessionLocal() as session:
         yield session
 
 
-async def select_all_item(
-        session: AsyncSession) -> dict:
+async def iter_schedule(
+        session: AsyncSession, page_size: int,
+        shard: Optional[tuple[int, int]] = None,
+        ids: Optional[list[int]] = None) -> AsyncIterator[dict]:
     """
-    Функция получения товаров на мониторинге.
+    Функция постраничного получения расписания проверок товаров.
 
     Args:
 
         session: Асинхронная сессия для базы данных.
+        page_size: Число товаров на одной странице.
+        shard: Часть товаров (номер, число частей), товары делятся
+            по остатку от деления id, по умолчанию все товары.
+        ids: Читать только эти товары, по умолчанию все товары.
+
+    Yields:
+
+        Словари с id товара, URL на API с ценой и временем следующей
+        проверки(None, если не задано).
+
+    Notes:
+
+        Читает только нужные мониторингу колонки страницами по ключу id
+        (WHERE id > последний id ORDER BY id LIMIT page_size), поэтому
+        расход памяти не зависит от размера каталога, а описания
+        товаров не загружаются.
+    """
+    last_id = 0
+    while True:
+        query = (select(Product.id, Product.url_price, Product.next_check_at)
+                 .where(Product.id > last_id)
+                 .order_by(Product.id)
+                 .limit(page_size))
+        if shard is not None:
+            query = query.where(Product.id % shard[1] == shard[0])
+        if ids is not None:
+            query = query.where(Product.id.in_(ids))
+        result = await session.execute(query)
+        rows = result.all()
+        await session.commit()
+        for row in rows:
+            yield {"id": row.id, "url_price": row.url_price,
+                   "next_check_at": row.next_check_at}
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1].id
+
+
+async def update_next_check(due: dict[int, datetime],
+                            session: AsyncSession) -> None:
+    """
+    Функция сохранения времени следующей проверки товаров.
+
+    Args:
+
+        due: Словарь {id товара: время следующей проверки}.
+        session: Асинхронная сессия для базы данных.
+    """
+    if not due:
+        return
+    table = Product.__table__
+    await session.execute(
+        update(table)
+        .where(table.c.id == bindparam("product_id"))
+        .values(next_check_at=bindparam("due")),
+        [{"product_id": product_id, "due": when}
+         for product_id, when in due.items()])
+    await session.commit()
+
+
+async def select_last_prices(
+        session: AsyncSession,
+        ids: Optional[list[int]] = None,
+        shard: Optional[tuple[int, int]] = None
+) -> dict[int, tuple[float, datetime]]:
+    """
+    Функция получения последних сохранённых цен товаров.
+
+    Args:
+
+        session: Асинхронная сессия для базы данных.
+        ids: id товаров, по умолчанию все товары.
+        shard: Часть товаров (номер, число частей), как в iter_schedule.
 
     Returns:
 
-        Возвращает список(словарь) товаров, находящихся на мониторинге
+        Возвращает словарь {id товара: (цена, время записи)}.
     """
-    result = await session.scalars(select(Product))
-    if result is not None:
-        products = [{"id": res.id, "name": res.name,
-                     "description": res.description,
-                     "rating": round(res.rating, 1),
-                     "url_info": res.url_info,
-                     "url_price": res.url_price} for res in result]
-        return {"message": products, "status_code": 200}
-    else:
-        return {"message": "Отсутствуют товары на мониторинге!",
-                "status_code": 422}
+    query = (select(PriceHistory.product_id, PriceHistory.price,
+                    PriceHistory.timestamp)
+             .distinct(PriceHistory.product_id)
+             .order_by(PriceHistory.product_id,
+                       PriceHistory.timestamp.desc(),
+                       PriceHistory.id.desc()))
+    if ids is not None:
+        query = query.where(PriceHistory.product_id.in_(ids))
+    if shard is not None:
+        query = query.where(PriceHistory.product_id % shard[1] == shard[0])
+    result = await session.execute(query)
+    return {row.product_id: (row.price, row.timestamp) for row in result}
+
+
+async def select_change_stats(
+        session: AsyncSession, since: datetime,
+        shard: Optional[tuple[int, int]] = None
+) -> dict[int, tuple[int, int, datetime]]:
+    """
+    Функция получения частоты изменения цен товаров.
+
+    Args:
+
+        session: Асинхронная сессия для базы данных.
+        since: Начало учитываемого отрезка истории.
+        shard: Часть товаров (номер, число частей), как в iter_schedule.
 
+    Returns:
+
+        Возвращает словарь {id товара: (число изменений цены,
+        число записей, время первой записи с начала отрезка)}.
 
-async def add_item_price(product_id: int, price: float,
-                         session: AsyncSession) -> bool:
+    Notes:
+
+        Изменение - запись, цена которой отличается от предыдущей
+        записи того же товара, поэтому результат одинаков в обоих
+        режимах хранения цен(PRICE_STORE_MODE).
+    """
+    previous = func.lag(PriceHistory.price).over(
+        partition_by=PriceHistory.product_id,
+        order_by=(PriceHistory.timestamp, PriceHistory.id))
+    history = (select(PriceHistory.product_id, PriceHistory.price,
+                      PriceHistory.timestamp,
+                      previous.label("previous"))
+               .where(PriceHistory.timestamp >= since))
+    if shard is not None:
+        history = history.where(
+            PriceHistory.product_id % shard[1] == shard[0])
+    history = history.subquery()
+    query = (select(history.c.product_id,
+                    func.count().filter(
+                        history.c.price != history.c.previous)
+                    .label("changes"),
+                    func.count().label("rows"),
+                    func.min(history.c.timestamp).label("first"))
+             .group_by(history.c.product_id))
+    result = await session.execute(query)
+    return {row.product_id: (row.changes, row.rows, row.first)
+            for row in result}
+
+
+async def claim_due_products(owner: str, limit: int, lease_ttl: float,
+                             horizon: float,
+                             session: AsyncSession) -> list[dict]:
     """
-    Функция добавления цены на товар.
+    Функция аренды пачки товаров для проверки.
 
     Args:
 
-        product_id: id товара, к которому добавляется цена
-        price: Цена на товар.
+        owner: Идентификатор экземпляра мониторинга.
+        limit: Максимальное число товаров в пачке.
+        lease_ttl: Срок аренды(сек).
+        horizon: Товары, время проверки которых наступит в пределах
+            horizon секунд, тоже попадают в пачку.
         session: Асинхронная сессия для базы данных.
 
     Returns:
-        Добавляет цену к товару в базе данных,
-        возвращает сообщение об успехе или ошибке и статус кода.
-    """
-    result = PriceHistory(product_id=product_id, price=price)
-    if (
-        isinstance(result, PriceHistory) and
-        result.product_id and result.price
-    ):
-        session.add(result)
-        await session.commit()
-        return {"message": f"Цена {price} добавленa: {product_id}",
-                "status_code": 200}
-    else:
-        return {"message": "Проблемы с добавлением цены, "
-                "проверьте передаваемые даныне",
-                "status_code": 422}
+
+        Возвращает список словарей с id, url_price и due
+        (запланированное время проверки).
+
+    Notes:
+
+        Строки выбираются через FOR UPDATE SKIP LOCKED, поэтому
+        экземпляры не ждут друг друга и не получают одни и те же
+        товары. Истёкшая аренда упавшего экземпляра считается
+        свободной и забирается автоматически.
+    """
+    table = Product.__table__
+    now = func.localtimestamp()
+    due = (
+        select(table.c.id)
+        .where((table.c.next_check_at.is_(None)) |
+               (table.c.next_check_at <=
+                now + timedelta(seconds=horizon)))
+        .where((table.c.lease_expires_at.is_(None)) |
+               (table.c.lease_expires_at < now))
+        .order_by(table.c.next_check_at.asc().nulls_first())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery())
+    result = await session.execute(
+        update(table)
+        .where(table.c.id.in_(due))
+        .values(lease_owner=owner,
+                lease_expires_at=now + timedelta(seconds=lease_ttl))
+        .returning(table.c.id, table.c.url_price, table.c.next_check_at,
+                   now.label("now")))
+    rows = result.all()
+    await session.commit()
+    return [{"id": row.id, "url_price": row.url_price,
+             "due": row.next_check_at or row.now} for row in rows]
+
+
+async def release_products(owner: str, due: dict[int, datetime],
+                           session: AsyncSession) -> None:
+    """
+    Функция снятия аренды с товаров.
+
+    Args:
+
+        owner: Идентификатор экземпляра мониторинга.
+        due: Словарь {id товара: время следующей проверки}.
+        session: Асинхронная сессия для базы данных.
+
+    Notes:
+
+        Аренда, уже перешедшая к другому экземпляру, не изменяется.
+    """
+    if not due:
+        return
+    table = Product.__table__
+    await session.execute(
+        update(table)
+        .where(table.c.id == bindparam("product_id"))
+        .where(table.c.lease_owner == owner)
+        .values(next_check_at=bindparam("due"), lease_owner=None,
+                lease_expires_at=None),
+        [{"product_id": product_id, "due": when}
+         for product_id, when in due.items()])
+    await session.commit()
+
+
+async def notify_products(session: AsyncSession, channel: str,
+                          product_ids: Iterable[int]) -> None:
+    """
+    Функция уведомления об изменении товаров.
+
+    Args:
+
+        session: Асинхронная сессия для базы данных.
+        channel: Канал NOTIFY.
+        product_ids: id изменившихся товаров.
+
+    Notes:
+
+        id передаются через запятую, длинный список делится на
+        несколько уведомлений. Уведомления доставляются при COMMIT,
+        при откате транзакции не отправляются.
+    """
+    chunk: list[str] = []
+    size = 0
+    for product_id in sorted(set(product_ids)):
+        value = str(product_id)
+        if chunk and size + len(value) > NOTIFY_PAYLOAD_LIMIT:
+            await session.execute(select(func.pg_notify(channel,
+                                                        ",".join(chunk))))
+            chunk, size = [], 0
+        chunk.append(value)
+        size += len(value) + 1
+    if chunk:
+        await session.execute(select(func.pg_notify(channel,
+                                                    ",".join(chunk))))
+
+
+async def select_alert_rules(
+        session: AsyncSession,
+        ids: Optional[list[int]] = None,
+        shard: Optional[tuple[int, int]] = None) -> list[dict]:
+    """
+    Функция получения правил оповещения.
+
+    Args:
+
+        session: Асинхронная сессия для базы данных.
+        ids: id товаров, по умолчанию все товары.
+        shard: Часть товаров (номер, число частей), как в iter_schedule.
+
+    Returns:
+
+        Возвращает список словарей с id правила, id товара, видом
+        правила, порогом срабатывания и признаком взведения.
+    """
+    query = select(AlertRule.id, AlertRule.product_id, AlertRule.kind,
+                   AlertRule.threshold, AlertRule.armed)
+    if ids is not None:
+        query = query.where(AlertRule.product_id.in_(ids))
+    if shard is not None:
+        query = query.where(AlertRule.product_id % shard[1] == shard[0])
+    result = await session.execute(query)
+    return [dict(row._mapping) for row in result]
+
+
+async def update_alert_rules(changes: list[dict],
+                             session: AsyncSession) -> None:
+    """
+    Функция сохранения состояния правил оповещения.
+
+    Args:
+
+        changes: Изменения из AlertIndex.evaluate в порядке их
+            появления: сработавшие правила(armed=False, время и цена
+            срабатывания) и взведённые снова(armed=True).
+        session: Асинхронная сессия для базы данных.
+
+    Notes:
+
+        Из нескольких переходов одного правила сохраняется последний,
+        иначе после 90 -> 110 -> 90 в базе осталось бы взведённое
+        правило, а в памяти - сработавшее. Уведомление в канал
+        PRICE_ALERTS_CHANNEL отправляется только о правилах, последний
+        переход которых - срабатывание, оно доставляется при COMMIT.
+    """
+    if not changes:
+        return
+    last = {}
+    for change in changes:
+        last.pop(change["id"], None)
+        last[change["id"]] = change
+    changes = list(last.values())
+    table = AlertRule.__table__
+    fired = [change for change in changes if not change["armed"]]
+    rearmed = [change for change in changes if change["armed"]]
+    if fired:
+        await session.execute(
+            update(table)
+            .where(table.c.id == bindparam("rule_id"))
+            .values(armed=False, fired_at=bindparam("fired_at"),
+                    fired_price=bindparam("fired_price")),
+            [{"rule_id": change["id"], "fired_at": change["fired_at"],
+              "fired_price": change["fired_price"]} for change in fired])
+    if rearmed:
+        await session.execute(
+            update(table)
+            .where(table.c.id == bindparam("rule_id"))
+            .values(armed=True),
+            [{"rule_id": change["id"]} for change in rearmed])
+    for change in fired:
+        await session.execute(select(func.pg_notify(
+            PRICE_ALERTS_CHANNEL, json.dumps({
+                "rule_id": change["id"],
+                "product_id": change["product_id"],
+                "kind": change["kind"],
+                "threshold": change["threshold"],
+                "price": change["fired_price"],
+                "date": change["fired_at"].isoformat()}))))
+    await session.commit()
@@ -0,0 +1,133 @@
+"""
+Модуль проверки правил оповещения о снижении цены.
+
+Classes:
+
+    AlertIndex: Хранит правила оповещения каждого товара отсортированными
+        по порогу и для каждой новой цены находит сработавшие
+        и снова взведённые правила двоичным поиском.
+
+Notes:
+
+    Правило срабатывает, когда цена опускается ниже порога(threshold),
+    после этого снимается(armed=False) и не срабатывает повторно,
+    пока цена не поднимется до порога или выше. Поэтому на одно
+    снижение цены приходится одно оповещение, сколько бы раз
+    ни была получена та же цена.
+"""
+import math
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.FDataBase import select_alert_rules
+
+
+class AlertIndex:
+    """
+    Индекс правил оповещения по товарам.
+
+    Notes:
+
+        Для каждого товара хранятся два отсортированных списка
+        (порог, id правила): взведённые и снятые правила.
+        Проверка цены стоит O(log n) плюс число изменившихся правил.
+    """
+
+    def __init__(self) -> None:
+        self._armed: dict[int, list[tuple[float, int]]] = {}
+        self._disarmed: dict[int, list[tuple[float, int]]] = {}
+        self._kinds: dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._kinds)
+
+    async def load(self, session: AsyncSession,
+                   ids: Optional[list[int]] = None,
+                   shard: Optional[tuple[int, int]] = None) -> int:
+        """
+        Загружает правила оповещения из базы данных.
+
+        Args:
+
+            session: Асинхронная сессия для базы данных.
+            ids: id товаров, правила которых нужно обновить,
+                по умолчанию загружаются правила всех товаров.
+            shard: Часть товаров (номер, число частей), правила которых
+                нужно загрузить(см. iter_schedule).
+
+        Returns:
+
+            Возвращает количество загруженных правил.
+
+        Notes:
+
+            Перед загрузкой запишите накопленные переходы правил
+            (PriceTickWriter.flush_alerts), иначе из базы вернётся
+            прежнее состояние и правило сработает повторно.
+        """
+        rules = await select_alert_rules(session=session, ids=ids,
+                                         shard=shard)
+        if ids is None:
+            self._armed, self._disarmed, self._kinds = {}, {}, {}
+        else:
+            for product_id in ids:
+                for _, rule_id in (self._armed.pop(product_id, []) +
+                                   self._disarmed.pop(product_id, [])):
+                    self._kinds.pop(rule_id, None)
+        for rule in rules:
+            lists = self._armed if rule["armed"] else self._disarmed
+            lists.setdefault(rule["product_id"], []).append(
+                (rule["threshold"], rule["id"]))
+            self._kinds[rule["id"]] = rule["kind"]
+        for lists in (self._armed, self._disarmed):
+            for entries in lists.values():
+                entries.sort()
+        return len(rules)
+
+    def evaluate(self, product_id: int, price: float,
+                 timestamp: datetime) -> list[dict]:
+        """
+        Проверяет правила товара для новой цены.
+
+        Args:
+
+            product_id: id товара.
+            price: Полученная цена.
+            timestamp: Время получения цены.
+
+        Returns:
+
+            Возвращает переходы правил для update_alert_rules:
+            сработавшие(armed=False) и снова взведённые(armed=True).
+        """
+        if product_id not in self._armed and product_id not in self._disarmed:
+            return []
+        changes = []
+        # (price, inf) больше любой пары с порогом price, поэтому слева
+        # от позиции пороги <= price, справа - пороги > price.
+        key = (price, math.inf)
+        armed = self._armed.get(product_id)
+        disarmed = self._disarmed.setdefault(product_id, [])
+        if disarmed:
+            position = bisect_left(disarmed, key)
+            rearmed, disarmed[:position] = disarmed[:position], []
+            if rearmed:
+                armed = self._armed.setdefault(product_id, [])
+            for entry in rearmed:
+                insort(armed, entry)
+                changes.append({"id": entry[1], "armed": True})
+        if armed:
+            position = bisect_left(armed, key)
+            fired, armed[position:] = armed[position:], []
+            for threshold, rule_id in fired:
+                insort(disarmed, (threshold, rule_id))
+                changes.append({"id": rule_id, "armed": False,
+                                "product_id": product_id,
+                                "kind": self._kinds[rule_id],
+                                "threshold": threshold,
+                                "fired_at": timestamp,
+                                "fired_price": price})
+        return changes
@@ -0,0 +1,95 @@
+"""
+Модуль подписки на изменения товаров.
+
+Classes:
+
+    ProductChangeListener: Держит одно соединение с базой данных,
+        подписанное(LISTEN) на канал PRODUCTS_CHANNEL, и копит id
+        добавленных, изменённых и удалённых товаров до следующего
+        обновления расписания.
+"""
+import logging
+from typing import Optional
+
+import asyncpg
+
+from config import DB_USER, DB_PASS, DB_HOST, DB_NAME
+from database.FDataBase import PRODUCTS_CHANNEL
+
+
+logger = logging.getLogger(__name__)
+
+DATABASE_DSN = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}"
+
+
+class ProductChangeListener:
+    """
+    Подписка на уведомления об изменении товаров.
+
+    Notes:
+
+        Пока соединение закрыто, уведомления теряются, поэтому после
+        открытия и разрыва соединения take возвращает None: расписание
+        нужно сверить со всеми товарами. Изменения, сделанные в базе
+        без уведомления(например, SQL вручную), подхватывает только
+        полная сверка.
+    """
+
+    def __init__(self) -> None:
+        self._conn: Optional[asyncpg.Connection] = None
+        self._changed: set[int] = set()
+        self._lost = True
+
+    @property
+    def listening(self) -> bool:
+        """Соединение подписки открыто."""
+        return self._conn is not None and not self._conn.is_closed()
+
+    def _on_change(self, connection, pid, channel, payload) -> None:
+        try:
+            self._changed.update(int(value) for value in payload.split(",")
+                                 if value)
+        except ValueError:
+            logger.error(f"Неверное уведомление {channel}: {payload}")
+            self._lost = True
+
+    def _on_terminate(self, connection) -> None:
+        self._lost = True
+
+    async def listen(self) -> bool:
+        """Подписывается на канал, возвращает True при успехе."""
+        if self.listening:
+            return True
+        try:
+            self._conn = await asyncpg.connect(DATABASE_DSN)
+            await self._conn.add_listener(PRODUCTS_CHANNEL, self._on_change)
+            self._conn.add_termination_listener(self._on_terminate)
+        except Exception as ex:
+            logger.error(f"Ошибка подписки на изменения товаров: {ex}")
+            if self._conn is not None:
+                self._conn.terminate()
+            self._conn = None
+            return False
+        self._lost = True
+        return True
+
+    def take(self) -> Optional[set[int]]:
+        """
+        Забирает id товаров, изменившихся с прошлого вызова.
+
+        Returns:
+
+            Возвращает None, если уведомления могли быть потеряны
+            (соединение открылось, разорвано или закрыто).
+        """
+        changed, self._changed = self._changed, set()
+        if self._lost or not self.listening:
+            self._lost = not self.listening
+            return None
+        return changed
+
+    async def close(self) -> None:
+        """Закрывает соединение подписки."""
+        if self.listening:
+            await self._conn.close()
+        self._conn = None
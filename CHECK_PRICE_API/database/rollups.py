@@ -0,0 +1,227 @@
+"""
+Модуль агрегатов цен по периодам(OHLC).
+
+Func:
+
+    bucket_start: Возвращает начало периода, в который попадает время,
+        так же, как date_trunc в PostgreSQL.
+
+    upsert_rollups: Добавляет записанные цены в агрегаты одним запросом
+        на пачку записей.
+
+    backfill_rollups: Пересчитывает агрегаты по уже сохранённой
+        истории цен.
+
+Notes:
+
+    Агрегаты считаются по записям price_history, поэтому пересчёт
+    по истории даёт то же, что и накопление при записи цен. В режиме
+    хранения "changes" среднее считается по записанным ценам
+    (изменениям и контрольным записям), а не по каждой проверке.
+
+    Пересчёт запускается из каталога CHECK_PRICE_API:
+
+        python -m database.rollups [--since YYYY-MM-DD] [--chunk N]
+"""
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import case, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.FDataBase import (AsyncSessionLocal, Product, PriceRollup,
+                                ROLLUP_BUCKETS)
+
+
+logger = logging.getLogger(__name__)
+
+# Число строк агрегатов в одном запросе(ограничение числа
+# параметров запроса asyncpg).
+UPSERT_CHUNK = 2000
+
+
+def bucket_start(timestamp: datetime, bucket: str) -> datetime:
+    """
+    Функция получения начала периода.
+
+    Args:
+
+        timestamp: Время записи цены.
+        bucket: Размер периода из ROLLUP_BUCKETS.
+
+    Returns:
+
+        Возвращает начало периода: неделя начинается с понедельника,
+        как date_trunc('week', ...) в PostgreSQL.
+    """
+    start = timestamp.replace(minute=0, second=0, microsecond=0)
+    if bucket == "hour":
+        return start
+    start = start.replace(hour=0)
+    if bucket == "day":
+        return start
+    if bucket == "week":
+        return start - timedelta(days=start.weekday())
+    if bucket == "month":
+        return start.replace(day=1)
+    raise ValueError(f"Неизвестный размер периода: {bucket}")
+
+
+def _aggregate(rows: list[dict]) -> list[dict]:
+    """Сворачивает записи цен в строки агрегатов по всем периодам."""
+    rollups: dict[tuple, dict] = {}
+    for row in rows:
+        price, timestamp = row["price"], row["timestamp"]
+        for bucket in ROLLUP_BUCKETS:
+            key = (row["product_id"], bucket, bucket_start(timestamp, bucket))
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollups[key] = {
+                    "product_id": key[0], "bucket": bucket,
+                    "bucket_start": key[2], "open": price, "high": price,
+                    "low": price, "close": price, "open_at": timestamp,
+                    "close_at": timestamp, "price_sum": price, "count": 1}
+                continue
+            # Записи идут в порядке вставки, при равном времени
+            # первой остаётся запись с меньшим id, как при пересчёте.
+            if timestamp < rollup["open_at"]:
+                rollup["open"], rollup["open_at"] = price, timestamp
+            if timestamp >= rollup["close_at"]:
+                rollup["close"], rollup["close_at"] = price, timestamp
+            rollup["high"] = max(rollup["high"], price)
+            rollup["low"] = min(rollup["low"], price)
+            rollup["price_sum"] += price
+            rollup["count"] += 1
+    return list(rollups.values())
+
+
+async def upsert_rollups(session: AsyncSession, rows: list[dict]) -> int:
+    """
+    Функция добавления цен в агрегаты.
+
+    Args:
+
+        session: Асинхронная сессия для базы данных.
+        rows: Записанные цены(product_id, price, timestamp)
+            в порядке вставки.
+
+    Returns:
+
+        Возвращает количество изменённых строк агрегатов.
+
+    Notes:
+
+        Цены сначала сворачиваются в памяти, поэтому на пачку цен
+        приходится по одной строке на товар и период. Не делает
+        commit: вызывайте в транзакции записи цен.
+    """
+    rollups = _aggregate(rows)
+    table = PriceRollup.__table__
+    for index in range(0, len(rollups), UPSERT_CHUNK):
+        query = insert(table).values(rollups[index:index + UPSERT_CHUNK])
+        new = query.excluded
+        await session.execute(query.on_conflict_do_update(
+            index_elements=["product_id", "bucket", "bucket_start"],
+            set_={
+                "open": case((new.open_at < table.c.open_at, new.open),
+                             else_=table.c.open),
+                "open_at": func.least(table.c.open_at, new.open_at),
+                "close": case((new.close_at >= table.c.close_at, new.close),
+                              else_=table.c.close),
+                "close_at": func.greatest(table.c.close_at, new.close_at),
+                "high": func.greatest(table.c.high, new.high),
+                "low": func.least(table.c.low, new.low),
+                "price_sum": table.c.price_sum + new.price_sum,
+                "count": table.c.count + new.count}))
+    return len(rollups)
+
+
+# Пересчёт периода одного размера по истории цен пачки товаров.
+BACKFILL_QUERY = """
+INSERT INTO price_rollups (product_id, bucket, bucket_start, open, high,
+                           low, close, open_at, close_at, price_sum, count)
+SELECT product_id, CAST(:bucket AS text),
+       date_trunc(CAST(:bucket AS text), timestamp) AS start,
+       (array_agg(price ORDER BY timestamp, id))[1],
+       max(price), min(price),
+       (array_agg(price ORDER BY timestamp DESC, id DESC))[1],
+       min(timestamp), max(timestamp), sum(price), count(*)
+FROM price_history
+WHERE product_id >= :first AND product_id <= :last
+  AND timestamp IS NOT NULL AND timestamp >= :since
+GROUP BY product_id, start
+ON CONFLICT (product_id, bucket, bucket_start) DO UPDATE SET
+    open = excluded.open, high = excluded.high, low = excluded.low,
+    close = excluded.close, open_at = excluded.open_at,
+    close_at = excluded.close_at, price_sum = excluded.price_sum,
+    count = excluded.count
+"""
+
+
+async def backfill_rollups(since: Optional[datetime] = None,
+                           chunk: int = 1000,
+                           session_factory=AsyncSessionLocal) -> int:
+    """
+    Функция пересчёта агрегатов по истории цен.
+
+    Args:
+
+        since: Пересчитать периоды, в которые попадает это время
+            и более поздние, по умолчанию вся история.
+        chunk: Число товаров(по id) в одной транзакции.
+        session_factory: Фабрика асинхронных сессий для базы данных.
+
+    Returns:
+
+        Возвращает количество записанных строк агрегатов.
+
+    Notes:
+
+        Периоды пересчитываются целиком и перезаписываются, поэтому
+        пересчёт можно повторять. На время транзакции таблица
+        агрегатов блокируется от записи: мониторинг дожидается её
+        и добавляет свои цены уже к пересчитанным периодам, цены
+        не теряются и не учитываются дважды.
+    """
+    written = 0
+    async with session_factory() as session:
+        last_id = await session.scalar(select(func.max(Product.id)))
+    for first in range(1, (last_id or 0) + 1, chunk):
+        async with session_factory() as session:
+            await session.execute(text(
+                "LOCK TABLE price_rollups IN SHARE ROW EXCLUSIVE MODE"))
+            for bucket in ROLLUP_BUCKETS:
+                # Период пересчитывается только целиком.
+                start = (bucket_start(since, bucket) if since
+                         else datetime.min)
+                result = await session.execute(text(BACKFILL_QUERY), {
+                    "bucket": bucket, "first": first,
+                    "last": first + chunk - 1, "since": start})
+                written += result.rowcount
+            await session.commit()
+        logger.info(f"Пересчитаны агрегаты товаров {first}-"
+                    f"{first + chunk - 1}, строк: {written}")
+    return written
+
+
+async def main(since: Optional[datetime], chunk: int) -> None:
+    """Пересчитывает агрегаты и выводит число записанных строк."""
+    written = await backfill_rollups(since=since, chunk=chunk)
+    print(f"Записано строк агрегатов: {written}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Пересчёт агрегатов цен по истории")
+    parser.add_argument("--since", type=datetime.fromisoformat,
+                        default=None,
+                        help="пересчитать периоды с этой даты")
+    parser.add_argument("--chunk", type=int, default=1000,
+                        help="число товаров в одной транзакции")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(since=args.since, chunk=args.chunk))
@@ -0,0 +1,132 @@
+"""
+Модуль локального файла цен, не записанных в базу данных.
+
+Classes:
+
+    PriceSpool: Файл, в который дописываются цены, пока база данных
+        недоступна. После восстановления базы цены читаются пачками
+        и записываются в базу(PriceTickWriter.replay).
+
+Notes:
+
+    Цены хранятся построчно в JSON({"product_id", "price", "timestamp"}
+    и "old_price" для изменившихся цен).
+    Перед чтением файл переименовывается в <path>.replay, поэтому новые
+    цены дописываются в новый файл, а прерванное чтение продолжается
+    с начала .replay файла при следующей попытке.
+"""
+import os
+import json
+import logging
+from datetime import datetime
+from typing import Iterator
+
+
+logger = logging.getLogger(__name__)
+
+
+class PriceSpool:
+    """
+    Файл цен, ожидающих записи в базу данных.
+
+    Args:
+
+        path: Путь к файлу.
+        max_bytes: Максимальный общий размер файлов(байт), цены сверх
+            него отбрасываются.
+    """
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        self.path = path
+        self.replay_path = f"{path}.replay"
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def _file_size(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    @property
+    def size(self) -> int:
+        """Возвращает общий размер файлов(байт)."""
+        return (self._file_size(self.path) +
+                self._file_size(self.replay_path))
+
+    @property
+    def pending(self) -> bool:
+        """Возвращает True, если в файлах есть незаписанные цены."""
+        return self.size > 0
+
+    def append(self, rows: list[dict]) -> int:
+        """
+        Дописывает цены в файл.
+
+        Args:
+
+            rows: Цены(product_id, price, timestamp, old_price).
+
+        Returns:
+
+            Возвращает количество записанных цен: 0, если с ними
+            файл превысил бы max_bytes.
+        """
+        data = "".join(
+            json.dumps({**row,
+                        "timestamp": row["timestamp"].isoformat()}) + "\n"
+            for row in rows).encode()
+        if self.size + len(data) > self.max_bytes:
+            logger.error(f"Файл {self.path} достиг {self.max_bytes} байт, "
+                         f"цены отброшены: {len(rows)}")
+            return 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "ab") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        return len(rows)
+
+    def batches(self, batch_size: int) -> Iterator[list[dict]]:
+        """
+        Читает цены пачками.
+
+        Args:
+
+            batch_size: Число цен в пачке.
+
+        Yields:
+
+            Пачки цен без повторов(product_id, timestamp) внутри пачки.
+            После чтения всех пачек вызовите commit().
+        """
+        if (not os.path.exists(self.replay_path) and
+                os.path.exists(self.path)):
+            os.replace(self.path, self.replay_path)
+        if not os.path.exists(self.replay_path):
+            return
+        with open(self.replay_path, encoding="utf-8") as file:
+            batch: dict[tuple, dict] = {}
+            for line in file:
+                try:
+                    row = json.loads(line)
+                    row["timestamp"] = datetime.fromisoformat(
+                        row["timestamp"])
+                except (ValueError, KeyError):
+                    # Недописанная строка при аварийном завершении.
+                    logger.error(f"Пропущена строка {self.replay_path}: "
+                                 f"{line!r}")
+                    continue
+                batch[(row["product_id"], row["timestamp"])] = row
+                if len(batch) >= batch_size:
+                    yield list(batch.values())
+                    batch = {}
+            if batch:
+                yield list(batch.values())
+
+    def commit(self) -> None:
+        """Удаляет прочитанный файл после записи всех пачек в базу."""
+        if os.path.exists(self.replay_path):
+            os.remove(self.replay_path)
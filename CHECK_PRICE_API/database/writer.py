@@ -0,0 +1,490 @@
+"""
+Модуль пакетной записи цен в базу данных.
+
+Classes:
+
+    PriceChangeFilter: Хранит последнюю известную цену каждого товара
+        и решает, нужно ли записывать новую цену. В режиме "changes"
+        пропускает только изменившиеся цены и контрольные записи
+        раз в heartbeat секунд.
+
+    PriceTickWriter: Буфер записей истории цен. Собирает цены,
+        полученные во время прохода, и записывает их в базу одной
+        многострочной вставкой при достижении размера пачки
+        или по истечении интервала. При остановке сбрасывает
+        все накопленные записи. Пока база данных недоступна, пишет
+        цены в локальный файл(PriceSpool) и переносит их в базу
+        после её восстановления. Вместе с ценами в той же транзакции
+        записывает события изменения цен(PriceEvent) и уведомляет
+        о них подписчиков через NOTIFY. Каждую полученную цену
+        проверяет правилами оповещения(AlertIndex) и записывает
+        их срабатывания отдельной транзакцией, а изменения цены
+        передаёт в оценку частоты проверки(AdaptiveCadence).
+        Записанные цены в той же транзакции добавляет в агрегаты
+        по периодам(price_rollups).
+"""
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func, insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.cadence import AdaptiveCadence
+from backend.metrics import (ALERTS, ALERT_RULES, DB_ROWS_WRITTEN,
+                             DB_WRITE_SECONDS, PRICE_EVENTS, SPOOL_BYTES,
+                             SPOOL_ROWS, observe_error)
+from database.FDataBase import (AsyncSessionLocal, PRICE_EVENTS_CHANNEL,
+                                PRICE_TICKS_CHANNEL, PriceEvent,
+                                PriceHistory, Product, notify_products,
+                                select_last_prices, update_alert_rules)
+from database.alerts import AlertIndex
+from database.rollups import upsert_rollups
+from database.spool import PriceSpool
+
+
+logger = logging.getLogger(__name__)
+
+STORE_MODES = ("all", "changes")
+
+
+class PriceChangeFilter:
+    """
+    Фильтр записи неизменившихся цен.
+
+    Args:
+
+        mode: Режим хранения: "all" - записывать каждую цену,
+            "changes" - только изменения и контрольные записи.
+        heartbeat: Период контрольной записи неизменной цены(сек).
+    """
+
+    def __init__(self, mode: str, heartbeat: float) -> None:
+        if mode not in STORE_MODES:
+            raise ValueError(f"Неизвестный режим хранения цен: {mode}")
+        self.mode = mode
+        self.heartbeat = timedelta(seconds=heartbeat)
+        self._last: dict[int, tuple[float, datetime]] = {}
+
+    async def load(self, session: AsyncSession,
+                   ids: Optional[list[int]] = None,
+                   shard: Optional[tuple[int, int]] = None) -> int:
+        """
+        Загружает последние сохранённые цены товаров из базы данных.
+
+        Args:
+
+            session: Асинхронная сессия для базы данных.
+            ids: id товаров, цены которых нужно обновить,
+                по умолчанию загружаются цены всех товаров.
+            shard: Часть товаров (номер, число частей), цены которых
+                нужно загрузить(см. iter_schedule).
+
+        Returns:
+
+            Возвращает количество загруженных цен.
+        """
+        last = await select_last_prices(session=session, ids=ids,
+                                        shard=shard)
+        if ids is None:
+            self._last = last
+        else:
+            self._last.update(last)
+        return len(last)
+
+    def last_price(self, product_id: int) -> Optional[float]:
+        """Возвращает последнюю известную цену товара."""
+        last = self._last.get(product_id)
+        return last[0] if last else None
+
+    def observe(self, product_id: int, price: float,
+                timestamp: datetime) -> bool:
+        """
+        Учитывает новую цену товара.
+
+        Args:
+
+            product_id: id товара.
+            price: Полученная цена.
+            timestamp: Время получения цены.
+
+        Returns:
+
+            Возвращает True, если цену нужно записать в базу.
+        """
+        last = self._last.get(product_id)
+        if (
+            self.mode == "all" or last is None or last[0] != price or
+            timestamp - last[1] >= self.heartbeat
+        ):
+            self._last[product_id] = (price, timestamp)
+            return True
+        return False
+
+
+class PriceTickWriter:
+    """
+    Буферизированная запись цен на товары.
+
+    Args:
+
+        batch_size: Размер пачки, при котором буфер сбрасывается в базу.
+        flush_interval: Максимальное время ожидания записи в буфере(сек).
+        change_filter: Фильтр записи неизменившихся цен.
+        spool: Файл для цен, которые не удалось записать в базу.
+        alerts: Правила оповещения, которыми проверяется каждая цена.
+        cadence: Оценка частоты изменения цен для адаптивного
+            расписания, учитывает каждую цену(прошлую цену берёт
+            из change_filter).
+        rollups: Обновлять агрегаты цен по периодам при записи.
+        session_factory: Фабрика асинхронных сессий для базы данных.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float,
+                 change_filter: Optional[PriceChangeFilter] = None,
+                 spool: Optional[PriceSpool] = None,
+                 alerts: Optional[AlertIndex] = None,
+                 cadence: Optional[AdaptiveCadence] = None,
+                 rollups: bool = False,
+                 session_factory=AsyncSessionLocal) -> None:
+        self.batch_size = max(1, batch_size)
+        self.change_filter = change_filter
+        self.spool = spool
+        self.alerts = alerts
+        self.cadence = cadence
+        self.rollups = rollups
+        self.flush_interval = flush_interval
+        self.session_factory = session_factory
+        self._buffer: list[dict] = []
+        # Последний ещё не записанный переход каждого правила по id.
+        self._alert_changes: dict[int, dict] = {}
+        self._flush_lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._stats = {"flushes": 0, "rows_written": 0, "rows_dropped": 0,
+                       "rows_unchanged": 0, "failures": 0,
+                       "rows_spooled": 0, "rows_replayed": 0,
+                       "rows_lost": 0, "alerts_fired": 0,
+                       "last_flush_rows": 0, "last_flush_seconds": 0.0}
+
+    @property
+    def stats(self) -> dict:
+        """Возвращает статистику записи и размер текущего буфера."""
+        return {**self._stats, "pending": len(self._buffer),
+                "alerts_pending": len(self._alert_changes)}
+
+    async def start(self) -> None:
+        """Запускает периодический сброс буфера по времени."""
+        if self._timer is None:
+            self._timer = asyncio.create_task(self._flush_periodically())
+
+    async def add(self, product_id: int, price: float,
+                  timestamp: Optional[datetime] = None) -> bool:
+        """
+        Добавляет цену товара в буфер.
+
+        Args:
+
+            product_id: id товара, к которому добавляется цена.
+            price: Цена на товар.
+            timestamp: Время получения цены, по умолчанию текущее.
+
+        Returns:
+
+            Возвращает False, если цена не изменилась
+            и фильтр пропустил её запись.
+
+        Notes:
+
+            Если фильтр знает прошлую цену товара и она отличается
+            от новой, вместе с ценой записывается событие изменения
+            цены(ключ old_price записи).
+            Правила оповещения проверяются для каждой цены, в том числе
+            пропущенной фильтром.
+        """
+        timestamp = timestamp or datetime.now()
+        if self.alerts is not None:
+            for change in self.alerts.evaluate(product_id, price,
+                                               timestamp):
+                self._alert_changes.pop(change["id"], None)
+                self._alert_changes[change["id"]] = change
+        previous = None
+        if self.change_filter is not None:
+            previous = self.change_filter.last_price(product_id)
+            if self.cadence is not None:
+                self.cadence.observe(
+                    product_id=product_id, timestamp=timestamp,
+                    changed=previous is not None and previous != price)
+            if not self.change_filter.observe(product_id, price, timestamp):
+                self._stats["rows_unchanged"] += 1
+                return False
+        row = {"product_id": product_id, "price": price,
+               "timestamp": timestamp}
+        if previous is not None and previous != price:
+            row["old_price"] = previous
+        self._buffer.append(row)
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+        return True
+
+    async def flush(self) -> int:
+        """
+        Записывает накопленные цены в базу данных.
+
+        Returns:
+
+            Возвращает количество записанных строк. При ошибке базы
+            данных записи сохраняются в файл spool, а без него
+            возвращаются в буфер и ошибка пробрасывается.
+
+        Notes:
+
+            Пока в файле spool есть незаписанные цены, новые цены
+            тоже дописываются в него, чтобы проход по товарам
+            не ждал недоступную базу. В базу их переносит replay.
+            Запись защищена от отмены вызывающей задачи(тайм-аут
+            обработки товара в SweepPool, остановка таймера): отмена
+            не прерывает транзакцию и не теряет забранные из буфера
+            цены, запись завершается в фоне под _flush_lock.
+        """
+        return await asyncio.shield(self._flush())
+
+    async def _flush(self) -> int:
+        """Записывает накопленные цены в базу данных(см. flush)."""
+        async with self._flush_lock:
+            rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            if self.spool is not None and self.spool.pending:
+                self._to_spool(rows)
+                return 0
+            started = time.monotonic()
+            try:
+                with DB_WRITE_SECONDS.time():
+                    async with self.session_factory() as session:
+                        written = await self._insert(
+                            session, rows, rollups=self.rollups)
+            except Exception as ex:
+                self._stats["failures"] += 1
+                observe_error("db")
+                if self.spool is None:
+                    self._buffer = rows + self._buffer
+                    raise
+                logger.error(f"Ошибка записи цен в базу, цены сохранены "
+                             f"в {self.spool.path}: {ex}")
+                self._to_spool(rows)
+                return 0
+            DB_ROWS_WRITTEN.inc(written)
+            self._stats["flushes"] += 1
+            self._stats["rows_written"] += written
+            self._stats["rows_dropped"] += len(rows) - written
+            self._stats["last_flush_rows"] = written
+            self._stats["last_flush_seconds"] = round(
+                time.monotonic() - started, 4)
+            logger.debug(f"Записано цен: {written} из {len(rows)}")
+            return written
+
+    def _to_spool(self, rows: list[dict]) -> None:
+        """Дописывает цены в файл spool."""
+        spooled = self.spool.append(rows)
+        self._stats["rows_spooled"] += spooled
+        self._stats["rows_lost"] += len(rows) - spooled
+        SPOOL_ROWS.inc(spooled, op="spooled")
+        if spooled < len(rows):
+            SPOOL_ROWS.inc(len(rows) - spooled, op="lost")
+        SPOOL_BYTES.set(self.spool.size)
+
+    async def replay(self) -> int:
+        """
+        Переносит цены из файла spool в базу данных.
+
+        Returns:
+
+            Возвращает количество записанных строк. Цены, уже
+            записанные в базу(например, до прерывания прошлой попытки),
+            повторно не записываются. При ошибке базы данных перенос
+            прекращается и продолжится при следующем вызове.
+        """
+        if self.spool is None or not self.spool.pending:
+            return 0
+        written = 0
+        try:
+            for rows in self.spool.batches(self.batch_size):
+                with DB_WRITE_SECONDS.time():
+                    async with self.session_factory() as session:
+                        count = await self._insert(
+                            session, rows, dedupe=True,
+                            rollups=self.rollups)
+                written += count
+                DB_ROWS_WRITTEN.inc(count)
+                SPOOL_ROWS.inc(count, op="replayed")
+                self._stats["rows_replayed"] += count
+        except Exception as ex:
+            observe_error("db")
+            logger.debug(f"База данных недоступна, перенесено цен "
+                         f"из {self.spool.path}: {written}, ошибка: {ex}")
+            return written
+        finally:
+            SPOOL_BYTES.set(self.spool.size)
+        self.spool.commit()
+        SPOOL_BYTES.set(self.spool.size)
+        logger.info(f"Перенесено цен из {self.spool.path} в базу: "
+                    f"{written}")
+        return written
+
+    async def flush_alerts(self) -> int:
+        """
+        Записывает переходы правил оповещения в базу данных.
+
+        Returns:
+
+            Возвращает количество правил, последний переход которых -
+            срабатывание. При ошибке базы данных переходы остаются
+            в памяти до следующей попытки.
+
+        Notes:
+
+            Для каждого правила хранится только последний переход:
+            правило, сработавшее и снова взведённое между записями,
+            сохраняется взведённым и уведомления не даёт.
+            Переходы пишутся отдельной от цен транзакцией и не попадают
+            в файл spool: состояние правил хранится в AlertIndex,
+            поэтому оповещения задерживаются, но не теряются, пока
+            процесс работает. Как и flush, защищена от отмены
+            вызывающей задачи.
+        """
+        return await asyncio.shield(self._flush_alerts())
+
+    async def _flush_alerts(self) -> int:
+        """Записывает переходы правил оповещения(см. flush_alerts)."""
+        async with self._flush_lock:
+            pending, self._alert_changes = self._alert_changes, {}
+            if not pending:
+                return 0
+            changes = list(pending.values())
+            try:
+                async with self.session_factory() as session:
+                    await update_alert_rules(changes=changes,
+                                             session=session)
+            except Exception as ex:
+                observe_error("db")
+                logger.error(f"Ошибка записи оповещений в базу: {ex}")
+                # Переходы, полученные во время записи, новее.
+                pending.update(self._alert_changes)
+                self._alert_changes = pending
+                return 0
+        fired = sum(1 for change in changes if not change["armed"])
+        ALERTS.inc(fired, op="fired")
+        ALERTS.inc(len(changes) - fired, op="rearmed")
+        self._stats["alerts_fired"] += fired
+        if fired:
+            logger.info(f"Сработало правил оповещения: {fired}")
+        return fired
+
+    async def reload_alerts(self, session: AsyncSession,
+                            ids: Optional[list[int]] = None,
+                            shard: Optional[tuple[int, int]] = None) -> int:
+        """
+        Записывает накопленные переходы и перезагружает правила
+        оповещения из базы(параметры как у AlertIndex.load).
+
+        Returns:
+
+            Возвращает количество загруженных правил.
+
+        Notes:
+
+            Если переходы записать не удалось, правила не
+            перезагружаются, чтобы не сработать повторно.
+        """
+        if self.alerts is None:
+            return 0
+        await self.flush_alerts()
+        if self._alert_changes:
+            return 0
+        loaded = await self.alerts.load(session=session, ids=ids,
+                                        shard=shard)
+        ALERT_RULES.set(len(self.alerts))
+        return loaded
+
+    async def close(self) -> None:
+        """Останавливает периодический сброс и записывает остаток буфера."""
+        if self._timer is not None:
+            self._timer.cancel()
+            await asyncio.gather(self._timer, return_exceptions=True)
+            self._timer = None
+        try:
+            await self.flush()
+        finally:
+            await self.flush_alerts()
+
+    @staticmethod
+    async def _insert(session: AsyncSession, rows: list[dict],
+                      dedupe: bool = False, rollups: bool = False) -> int:
+        """
+        Вставляет пачку цен одним запросом.
+
+        Args:
+
+            dedupe: Не вставлять цены, уже записанные в базу
+                (тот же товар и время).
+            rollups: Добавить вставленные цены в агрегаты.
+
+        Notes:
+
+            Цены товаров, удалённых с мониторинга во время прохода,
+            отбрасываются, чтобы не нарушать внешний ключ
+            и не терять остальную пачку. События изменения цен
+            и агрегаты записываются в той же транзакции, что и цены,
+            id товаров с новыми ценами отправляются в PRICE_TICKS_CHANNEL.
+        """
+        ids = {row["product_id"] for row in rows}
+        existing = set(await session.scalars(
+            select(Product.id).where(Product.id.in_(ids))))
+        rows = [row for row in rows if row["product_id"] in existing]
+        if dedupe and rows:
+            written = set((await session.execute(
+                select(PriceHistory.product_id, PriceHistory.timestamp)
+                .where(tuple_(PriceHistory.product_id,
+                              PriceHistory.timestamp).in_(
+                    [(row["product_id"], row["timestamp"])
+                     for row in rows])))).tuples())
+            rows = [row for row in rows
+                    if (row["product_id"], row["timestamp"]) not in written]
+        if rows:
+            await session.execute(insert(PriceHistory), [
+                {"product_id": row["product_id"], "price": row["price"],
+                 "timestamp": row["timestamp"]} for row in rows])
+            events = [{"product_id": row["product_id"],
+                       "old_price": row["old_price"],
+                       "new_price": row["price"],
+                       "timestamp": row["timestamp"]}
+                      for row in rows if row.get("old_price") is not None]
+            if events:
+                await session.execute(insert(PriceEvent), events)
+                # Уведомление доставляется подписчикам при COMMIT.
+                await session.execute(select(func.pg_notify(
+                    PRICE_EVENTS_CHANNEL, str(len(events)))))
+            if rollups:
+                await upsert_rollups(session=session, rows=rows)
+            await notify_products(
+                session=session, channel=PRICE_TICKS_CHANNEL,
+                product_ids=(row["product_id"] for row in rows))
+            await session.commit()
+            PRICE_EVENTS.inc(len(events))
+        return len(rows)
+
+    async def _flush_periodically(self) -> None:
+        """
+        Сбрасывает буфер раз в flush_interval секунд, переносит
+        в базу цены из файла spool и записывает оповещения.
+        """
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as ex:
+                logger.error(f"Ошибка записи цен в базу: {ex}")
+            await self.replay()
+            await self.flush_alerts()
@@ -3,78 +3,620 @@
 
 Func:
 
-    monitoring_price: Функция мониторинга,
-        раз в час проверяет актуальную цену на товар,
-        добавляет её в базу данных.
-    main: Создаёт таски, для асинхронного выполнения кода.
+    check_product: Получает актуальную цену одного товара
+        и добавляет её в буфер записи цен.
+    check_batch: Получает актуальные цены пачки товаров одним запросом
+        и добавляет их в буфер записи цен.
+    sweep_batch: Проверяет пулом воркеров цены пачки товаров,
+        время проверки которых наступило.
+    make_pool: Создаёт пул воркеров с параметрами из конфигурации.
+    rebalance_cadence: Распределяет бюджет проверок в час между товарами
+        адаптивного расписания.
+    monitoring_price: Функция мониторинга, проверяет актуальную цену
+        каждого товара раз в час(или с адаптивной частотой)
+        по его собственному расписанию
+        пулом воркеров, добавляет её в базу данных пачками.
+    monitoring_leased: Функция мониторинга для нескольких экземпляров,
+        арендует в базе данных пачки товаров, проверяет их цены
+        и снимает аренду.
+    keep_monitoring: Перезапускает упавшую функцию мониторинга
+        с нарастающей паузой.
+    collect_rate_limit: Обновляет метрики ограничителя запросов.
+    run_monitor: Создаёт таски, для асинхронного выполнения кода
+        (в режиме MONITOR_MODE), при завершении(в том числе по SIGTERM)
+        записывает остаток буфера цен и закрывает общий HTTP клиент.
+    run_worker: Запускает мониторинг своей части товаров в отдельном
+        процессе, отправляет метрики супервизору.
+    supervise: Запускает MONITOR_WORKERS процессов мониторинга
+        и общий для них сервер метрик.
+    main: Запускает мониторинг в одном процессе вместе с сервером
+        метрик или в нескольких процессах(MONITOR_WORKERS).
 """
+import os
+import time
+import signal
+import socket
 import asyncio
 import logging
+import multiprocessing
+from typing import Optional
+from datetime import datetime, timedelta
+from functools import partial
 
-from database.FDataBase import (get_session,
-                                select_all_item,
-                                add_item_price)
-from backend.backend import get_html, get_price_item
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import (MONITOR_INTERVAL, MONITOR_CONCURRENCY,
+                    MONITOR_PER_HOST_LIMIT, MONITOR_ITEM_TIMEOUT,
+                    WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL,
+                    MONITOR_JITTER, SCHEDULER_REFRESH, SCHEDULER_BATCH,
+                    SCHEDULER_FULL_REFRESH,
+                    PRICE_STORE_MODE, PRICE_HEARTBEAT, PRICE_ROLLUPS,
+                    PRICE_BATCH_SIZE, PRICE_BATCH_WINDOW,
+                    MONITOR_MODE, LEASE_TTL, PRODUCT_PAGE_SIZE,
+                    METRICS_PORT, MONITOR_WORKERS,
+                    WORKER_METRICS_INTERVAL, SPOOL_PATH, SPOOL_MAX_BYTES,
+                    MONITOR_RESTART_MAX_DELAY, CADENCE_MODE,
+                    CADENCE_BUDGET, CADENCE_MIN_INTERVAL,
+                    CADENCE_MAX_INTERVAL, CADENCE_HALF_LIFE,
+                    CADENCE_REBALANCE)
+from database.FDataBase import (get_session, iter_schedule,
+                                update_next_check, claim_due_products,
+                                release_products, select_change_stats)
+from database.writer import PriceTickWriter, PriceChangeFilter
+from database.alerts import AlertIndex
+from database.spool import PriceSpool
+from database.events import ProductChangeListener
+from backend.backend import get_html, get_price_item, get_prices_items
+from backend.batching import group_price_urls
+from backend.cadence import AdaptiveCadence
+from backend.client import close_client
+from backend.metrics import (REGISTRY, BATCH_SECONDS, BREAKER_OPEN,
+                             BREAKER_RATE_FACTOR, BREAKER_TRIPS,
+                             CADENCE_PLANNED,
+                             PARSE_SECONDS, PRODUCTS_DUE,
+                             PRODUCTS_PROCESSED, SCHEDULE_LAG_SECONDS,
+                             observe_error, start_metrics_server)
+from backend.pool import SweepPool
+from backend.ratelimit import get_limiter, init_limiter
+from backend.scheduler import DueScheduler
+from backend.supervisor import WorkerSupervisor, publish_metrics
 
 
 logging.basicConfig(
     filename="CHECK_PRICE_API.log",
     level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format=('%(asctime)s - %(processName)s - %(name)s - '
+            '%(levelname)s - %(message)s')
 )
 logger = logging.getLogger(__name__)
 
 
-async def monitoring_price():
+async def check_product(product: dict, writer: PriceTickWriter) -> bool:
+    """
+    Функция проверки цены одного товара.
+
+    Args:
+
+        product: Словарь с данными о товаре(id, url_price).
+        writer: Буфер пакетной записи цен.
+
+    Returns:
+
+        Возвращает True, если цена получена и добавлена в буфер.
+    """
+    data_html = await get_html(url=str(product['url_price']))
+    if 'error' in data_html:
+        logger.debug(data_html["error"])
+        return False
+    with PARSE_SECONDS.time(stage="extract"):
+        data_price = await get_price_item(data_price=data_html)
+    if 'price' not in data_price:
+        observe_error("missing_price")
+        logger.debug(data_price["error"])
+        return False
+    PRODUCTS_PROCESSED.inc()
+    await writer.add(product_id=int(product['id']),
+                     price=float(data_price['price']))
+    return True
+
+
+async def check_batch(batch: dict, writer: PriceTickWriter) -> bool:
+    """
+    Функция проверки цен пачки товаров.
+
+    Args:
+
+        batch: Пачка товаров из group_price_urls.
+        writer: Буфер пакетной записи цен.
+
+    Returns:
+
+        Возвращает True, если цены получены для всех товаров пачки.
+    """
+    if None in batch["products"]:
+        return await check_product(product=batch["products"][None][0],
+                                   writer=writer)
+    data_html = await get_html(url=batch["url"])
+    if 'error' in data_html:
+        logger.debug(data_html["error"])
+        return False
+    with PARSE_SECONDS.time(stage="extract"):
+        data_prices = await get_prices_items(data_price=data_html)
+    if 'prices' not in data_prices:
+        observe_error("format")
+        logger.debug(data_prices["error"])
+        return False
+    prices = data_prices['prices']
+    missing = [code for code in batch["products"] if code not in prices]
+    if missing:
+        observe_error("missing_price", len(missing))
+        logger.debug(f"Нет цены для товаров магазина: {missing}")
+    for code, products in batch["products"].items():
+        if code not in prices:
+            continue
+        for product in products:
+            PRODUCTS_PROCESSED.inc()
+            await writer.add(product_id=int(product['id']),
+                             price=float(prices[code]))
+    return not missing
+
+
+async def sweep_batch(pool: SweepPool, batch: list[dict],
+                      writer: PriceTickWriter) -> dict:
+    """
+    Функция проверки цен пачки товаров.
+
+    Args:
+
+        pool: Пул воркеров.
+        batch: Список словарей товаров с ключами id, url_price и due.
+        writer: Буфер пакетной записи цен.
+
+    Returns:
+
+        Возвращает статистику прохода пула, число товаров
+        и отставание от расписания(сек).
+
+    Notes:
+
+        Пока запросы к магазину приостановлены ограничителем,
+        пачка не берётся в работу.
+    """
+    await get_limiter().wait_until_resumed()
+    lag = max(0.0, (datetime.now() - batch[0]["due"]).total_seconds())
+    stats = await pool.run(
+        items=group_price_urls(batch, batch_size=PRICE_BATCH_SIZE),
+        handler=partial(check_batch, writer=writer),
+        url_of=lambda group: group["url"])
+    stats["products"] = len(batch)
+    stats["lag"] = round(lag, 1)
+    PRODUCTS_DUE.inc(len(batch))
+    BATCH_SECONDS.observe(stats["duration"])
+    SCHEDULE_LAG_SECONDS.set(stats["lag"])
+    if stats["timeouts"]:
+        observe_error("timeout", stats["timeouts"])
+    logger.debug(f"Пачка обработана: {stats}, запись: {writer.stats}")
+    if lag > MONITOR_INTERVAL:
+        logger.warning(f"Отставание от расписания {stats['lag']} сек. "
+                       f"больше интервала {MONITOR_INTERVAL} сек.!")
+    return stats
+
+
+def make_pool() -> SweepPool:
+    """Создаёт пул воркеров с параметрами из конфигурации."""
+    return SweepPool(concurrency=MONITOR_CONCURRENCY,
+                     per_host_limit=MONITOR_PER_HOST_LIMIT,
+                     item_timeout=MONITOR_ITEM_TIMEOUT)
+
+
+def rebalance_cadence(scheduler: DueScheduler,
+                      shard: Optional[tuple[int, int]] = None) -> None:
+    """
+    Функция распределения бюджета проверок адаптивного расписания.
+
+    Args:
+
+        scheduler: Планировщик с адаптивной частотой проверки.
+        shard: Часть товаров (номер, число частей) процесса, бюджет
+            CADENCE_BUDGET делится между процессами поровну.
+    """
+    if CADENCE_BUDGET:
+        budget = CADENCE_BUDGET / (shard[1] if shard else 1)
+    else:
+        budget = len(scheduler) * 3600 / MONITOR_INTERVAL
+    planned = scheduler.rebalance(budget)
+    CADENCE_PLANNED.set(planned)
+    logger.info(f"Бюджет проверок в час: {budget:.0f}, "
+                f"запланировано: {planned:.0f}, товаров: {len(scheduler)}")
+
+
+async def refresh_schedule(scheduler: DueScheduler,
+                           listener: ProductChangeListener,
+                           session: AsyncSession,
+                           shard: Optional[tuple[int, int]],
+                           full: bool) -> tuple[int, bool]:
+    """
+    Функция обновления расписания проверок.
+
+    Args:
+
+        scheduler: Планировщик проверок.
+        listener: Подписка на изменения товаров.
+        session: Асинхронная сессия для базы данных.
+        shard: Часть товаров (номер, число частей) процесса.
+        full: Сверить расписание со всеми товарами.
+
+    Returns:
+
+        Возвращает количество новых товаров и признак полной сверки.
+
+    Notes:
+
+        Перечитывает из базы только товары из уведомлений, поэтому
+        обновление не зависит от размера каталога. Если уведомления
+        могли быть потеряны, расписание сверяется полностью.
+    """
+    await listener.listen()
+    changed = listener.take()
+    if full or changed is None:
+        added = await scheduler.sync(
+            iter_schedule(session=session, page_size=PRODUCT_PAGE_SIZE,
+                          shard=shard),
+            now=datetime.now())
+        return added, True
+    if not changed:
+        return 0, False
+    added = await scheduler.sync(
+        iter_schedule(session=session, page_size=PRODUCT_PAGE_SIZE,
+                      shard=shard, ids=sorted(changed)),
+        now=datetime.now(), ids=changed)
+    return added, False
+
+
+async def monitoring_price(writer: PriceTickWriter,
+                           shard: Optional[tuple[int, int]] = None):
     """
     Функция мониторинга цены на товары.
 
+    Args:
+
+        writer: Буфер пакетной записи цен.
+        shard: Часть товаров (номер, число частей) для процесса
+            мониторинга, по умолчанию все товары.
+
     Notes:
 
-        Получает асинхронную сессию aiohttp, в цикле while получает товары
-        из базы данных если они есть, добавляет актуальную цену к каждому
-        товару на мониторинге, далее функция засыпает на час, если товаров
-        в базе нет, возвращает строку, говорящую об их отсутствии.
+        Загружает последние цены товаров в фильтр записи, правила
+        оповещения и расписание проверок из базы данных в планировщик,
+        в цикле while забирает товары, время проверки которых наступает
+        в пределах PRICE_BATCH_WINDOW, проверяет их цены(sweep_batch),
+        сохраняет время следующей проверки и засыпает до ближайшей
+        проверки. Раз в SCHEDULER_REFRESH секунд перечитывает товары,
+        о добавлении, изменении или удалении которых пришло уведомление
+        (ProductChangeListener), и правила оповещения, а раз
+        в SCHEDULER_FULL_REFRESH секунд и после разрыва подписки
+        сверяет расписание со всеми товарами. Если база данных
+        недоступна, проверки продолжаются по расписанию в памяти.
+        В режиме CADENCE_MODE="adaptive" оценивает частоту изменения
+        цен по истории цен и раз в CADENCE_REBALANCE секунд
+        распределяет бюджет проверок между товарами.
     """
+    pool = make_pool()
+    scheduler = DueScheduler(interval=MONITOR_INTERVAL,
+                             jitter=MONITOR_JITTER, cadence=writer.cadence)
+    listener = ProductChangeListener()
+    try:
+        async for session in get_session():
+            if writer.change_filter is not None:
+                loaded = await writer.change_filter.load(session=session,
+                                                         shard=shard)
+                logger.info(f"Загружено последних цен: {loaded}")
+            loaded = await writer.reload_alerts(session=session, shard=shard)
+            logger.info(f"Загружено правил оповещения: {loaded}")
+            # Подписка до загрузки, чтобы не пропустить изменения товаров
+            # во время неё.
+            await listener.listen()
+            listener.take()
+            added = await scheduler.sync(
+                iter_schedule(session=session, page_size=PRODUCT_PAGE_SIZE,
+                              shard=shard),
+                now=datetime.now(), initial=True)
+            logger.info(f"Загружено товаров в расписание: {added}")
+            if writer.cadence is not None:
+                now = datetime.now()
+                writer.cadence.seed(await select_change_stats(
+                    session=session, shard=shard,
+                    since=now - timedelta(seconds=4 * CADENCE_HALF_LIFE)),
+                    now=now, interval=MONITOR_INTERVAL)
+                rebalance_cadence(scheduler=scheduler, shard=shard)
+            refreshed = rebalanced = synced = time.monotonic()
+            while True:
+                if (writer.cadence is not None and
+                        time.monotonic() - rebalanced >= CADENCE_REBALANCE):
+                    rebalanced = time.monotonic()
+                    rebalance_cadence(scheduler=scheduler, shard=shard)
+                if time.monotonic() - refreshed >= SCHEDULER_REFRESH:
+                    refreshed = time.monotonic()
+                    try:
+                        added, full = await refresh_schedule(
+                            scheduler=scheduler, listener=listener,
+                            session=session, shard=shard,
+                            full=refreshed - synced >= SCHEDULER_FULL_REFRESH)
+                        if full:
+                            synced = refreshed
+                        await writer.reload_alerts(session=session,
+                                                   shard=shard)
+                    except Exception as ex:
+                        # Проверки продолжаются по прежнему расписанию,
+                        # цены пишутся в spool до восстановления базы,
+                        # после чего расписание сверяется полностью.
+                        await session.rollback()
+                        observe_error("db")
+                        logger.error(f"Ошибка обновления расписания: {ex}")
+                        synced = refreshed - SCHEDULER_FULL_REFRESH
+                        added = 0
+                    if added:
+                        logger.debug(f"Новых товаров на мониторинге: {added}")
+
+                now = datetime.now()
+                batch = scheduler.pop_due(
+                    now=now + timedelta(seconds=PRICE_BATCH_WINDOW),
+                    limit=SCHEDULER_BATCH)
+                if not batch:
+                    wait = scheduler.seconds_until_next(now)
+                    if wait is None:
+                        logger.debug("Отсутствуют товары для мониторинга!")
+                        wait = SCHEDULER_REFRESH
+                    await asyncio.sleep(min(wait, SCHEDULER_REFRESH))
+                    continue
+
+                await sweep_batch(pool=pool, batch=batch, writer=writer)
+                now = datetime.now()
+                due = {}
+                for item in batch:
+                    next_check = scheduler.reschedule(item, now=now)
+                    if next_check is not None:
+                        due[item["id"]] = next_check
+                try:
+                    await update_next_check(due=due, session=session)
+                except Exception as ex:
+                    await session.rollback()
+                    logger.error(f"Ошибка сохранения расписания: {ex}")
+    finally:
+        await listener.close()
+
+
+async def monitoring_leased(writer: PriceTickWriter):
+    """
+    Функция мониторинга цены на товары несколькими экземплярами.
+
+    Args:
+
+        writer: Буфер пакетной записи цен.
+
+    Notes:
+
+        В цикле while арендует в базе данных пачку товаров, время
+        проверки которых наступает в пределах PRICE_BATCH_WINDOW,
+        обновляет их последние цены в фильтре записи и правила
+        оповещения(их могли изменить другие экземпляры), проверяет
+        цены(sweep_batch), записывает их в базу и снимает аренду,
+        сохраняя время следующей проверки.
+        Аренда упавшего экземпляра истекает через LEASE_TTL секунд,
+        после чего товары забирают другие экземпляры.
+    """
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    pool = make_pool()
+    scheduler = DueScheduler(interval=MONITOR_INTERVAL,
+                             jitter=MONITOR_JITTER)
+    logger.info(f"Мониторинг с арендой товаров, экземпляр: {owner}")
     async for session in get_session():
         while True:
-            products = await select_all_item(session=session)
-            if isinstance(products, dict):
-                products_list = products.get('message', [])
-            else:
-                logger.debug("Ошибка получения данных о товарах:", products)
-                await asyncio.sleep(300)
+            batch = await claim_due_products(owner=owner,
+                                             limit=SCHEDULER_BATCH,
+                                             lease_ttl=LEASE_TTL,
+                                             horizon=PRICE_BATCH_WINDOW,
+                                             session=session)
+            if not batch:
+                await asyncio.sleep(SCHEDULER_REFRESH)
                 continue
 
-            if not products_list:
-                logger.debug("Отсутствуют товары для мониторинга!")
-                await asyncio.sleep(300)
-            else:
-                if not all(isinstance(product,
-                                      dict) for product in products_list):
-                    logger.debug(
-                        "Неправильный формат данных для 1/1+ товаров!")
-                    await asyncio.sleep(300)
-                    continue
-                for product in products_list:
-                    url_price = str(product['url_price'])
-                    id_item = product['id']
-                    data_html = await get_html(url=url_price)
-                    data_price = await get_price_item(data_price=data_html)
-                    if 'price' not in data_price:
-                        logger.debug(data_price["error"])
-                    else:
-                        result = await add_item_price(product_id=int(id_item),
-                                                      price=float(
-                                                          data_price['price']),
-                                                      session=session)
-                        logger.debug(result["message"])
-                await asyncio.sleep(3600)
+            if writer.change_filter is not None:
+                await writer.change_filter.load(
+                    session=session, ids=[item["id"] for item in batch])
+            await writer.reload_alerts(session=session,
+                                       ids=[item["id"] for item in batch])
+            await sweep_batch(pool=pool, batch=batch, writer=writer)
+            try:
+                await writer.flush()
+            except Exception as ex:
+                logger.error(f"Ошибка записи цен в базу: {ex}")
+            now = datetime.now()
+            due = {item["id"]: scheduler.next_due(item["due"], now=now)
+                   for item in batch}
+            try:
+                await release_products(owner=owner, due=due,
+                                       session=session)
+            except Exception as ex:
+                await session.rollback()
+                logger.error(f"Ошибка снятия аренды: {ex}")
+
+
+MONITORS = {"scheduler": monitoring_price, "lease": monitoring_leased}
+
+
+async def keep_monitoring(monitor, writer: PriceTickWriter):
+    """
+    Функция перезапуска мониторинга.
+
+    Args:
+
+        monitor: Функция мониторинга из MONITORS.
+        writer: Буфер пакетной записи цен, переживает перезапуски.
+
+    Notes:
+
+        Ошибка мониторинга(например, потеря соединения с базой данных)
+        не останавливает сервис: функция перезапускается через 1, 2, 4...
+        секунд, но не больше MONITOR_RESTART_MAX_DELAY. Если мониторинг
+        проработал дольше MONITOR_RESTART_MAX_DELAY, пауза сбрасывается.
+    """
+    delay = 1
+    while True:
+        started = time.monotonic()
+        try:
+            await monitor(writer=writer)
+        except Exception as ex:
+            observe_error("monitor")
+            logger.error(f"Ошибка мониторинга: {ex!r}")
+        if time.monotonic() - started > MONITOR_RESTART_MAX_DELAY:
+            delay = 1
+        logger.info(f"Перезапуск мониторинга через {delay} сек.")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, MONITOR_RESTART_MAX_DELAY)
+
+
+def collect_rate_limit() -> None:
+    """Обновляет метрики ограничителя запросов перед выводом."""
+    for host, state in get_limiter().snapshot().items():
+        BREAKER_OPEN.set(int(state["state"] == "open"), host=host)
+        BREAKER_RATE_FACTOR.set(state["rate_factor"], host=host)
+        BREAKER_TRIPS.set(state["trips"], host=host)
+
+
+async def run_monitor(shard: Optional[tuple[int, int]] = None,
+                      metrics_queue: Optional[multiprocessing.Queue] = None):
+    """
+    Функция запуска мониторинга в текущем процессе.
+
+    Args:
+
+        shard: Часть товаров (номер, число частей), в режиме "lease"
+            товары делятся арендой и этот параметр не нужен.
+        metrics_queue: Очередь метрик супервизора, без неё
+            запускается собственный сервер метрик(METRICS_PORT).
+    """
+    change_filter = PriceChangeFilter(mode=PRICE_STORE_MODE,
+                                      heartbeat=PRICE_HEARTBEAT)
+    spool = None
+    if SPOOL_PATH:
+        if shard is None:
+            spool = PriceSpool(path=SPOOL_PATH, max_bytes=SPOOL_MAX_BYTES)
+        else:
+            spool = PriceSpool(path=f"{SPOOL_PATH}.{shard[0]}",
+                               max_bytes=SPOOL_MAX_BYTES // shard[1])
+    cadence = None
+    if CADENCE_MODE == "adaptive" and MONITOR_MODE == "scheduler":
+        cadence = AdaptiveCadence(budget=CADENCE_BUDGET,
+                                  min_interval=CADENCE_MIN_INTERVAL,
+                                  max_interval=CADENCE_MAX_INTERVAL,
+                                  half_life=CADENCE_HALF_LIFE)
+    elif CADENCE_MODE != "fixed":
+        logger.error(f"Режим частоты проверки {CADENCE_MODE} не доступен "
+                     f"для MONITOR_MODE={MONITOR_MODE}, используется "
+                     f"фиксированный интервал.")
+    writer = PriceTickWriter(batch_size=WRITE_BATCH_SIZE,
+                             flush_interval=WRITE_FLUSH_INTERVAL,
+                             change_filter=change_filter, spool=spool,
+                             alerts=AlertIndex(), cadence=cadence,
+                             rollups=PRICE_ROLLUPS)
+    await writer.start()
+    REGISTRY.add_collector(collect_rate_limit)
+    metrics_runner = None
+    publish_task = None
+    if metrics_queue is not None:
+        publish_task = asyncio.create_task(publish_metrics(
+            index=shard[0], metrics_queue=metrics_queue,
+            interval=WORKER_METRICS_INTERVAL))
+    elif METRICS_PORT:
+        metrics_runner = await start_metrics_server(port=METRICS_PORT)
+    monitor = MONITORS[MONITOR_MODE]
+    if MONITOR_MODE == "scheduler":
+        monitor = partial(monitor, shard=shard)
+    monitoring_task = asyncio.create_task(
+        keep_monitoring(monitor=monitor, writer=writer))
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, monitoring_task.cancel)
+    try:
+        await monitoring_task
+    except asyncio.CancelledError:
+        logger.info("Мониторинг остановлен.")
+    finally:
+        await writer.close()
+        await close_client()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if publish_task is not None:
+            publish_task.cancel()
+            await asyncio.gather(publish_task, return_exceptions=True)
+
+
+def run_worker(index: int, count: int,
+               metrics_queue: multiprocessing.Queue) -> None:
+    """
+    Функция процесса мониторинга.
+
+    Args:
+
+        index: Номер процесса, он же номер части товаров.
+        count: Число процессов.
+        metrics_queue: Очередь метрик супервизора.
+    """
+    init_limiter(share=1 / count)
+    asyncio.run(run_monitor(shard=(index, count),
+                            metrics_queue=metrics_queue))
+
+
+async def supervise(count: int):
+    """
+    Функция запуска мониторинга в нескольких процессах.
+
+    Args:
+
+        count: Число процессов мониторинга.
+
+    Notes:
+
+        Каждый процесс работает в своём цикле событий со своими
+        пулом воркеров, HTTP клиентом и подключением к базе данных.
+        В режиме "scheduler" процесс проверяет товары с id % count,
+        равным его номеру, в режиме "lease" процессы арендуют пачки
+        товаров. Метрики процессов объединяются и отдаются одним
+        сервером метрик.
+    """
+    supervisor = WorkerSupervisor(count=count, target=run_worker)
+    metrics_runner = None
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(port=METRICS_PORT)
+    supervisor_task = asyncio.create_task(supervisor.run())
+    stopping = []
+
+    def stop() -> None:
+        # Повторный сигнал не должен прерывать остановку процессов.
+        if not stopping:
+            stopping.append(True)
+            supervisor_task.cancel()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop)
+    logger.info(f"Запущено процессов мониторинга: {count}")
+    try:
+        await supervisor_task
+    except asyncio.CancelledError:
+        logger.info("Мониторинг остановлен.")
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
 
 async def main():
-    monitoring_task = asyncio.create_task(monitoring_price())
-    await monitoring_task
+    workers = MONITOR_WORKERS or os.cpu_count() or 1
+    if workers > 1:
+        await supervise(count=workers)
+    else:
+        await run_monitor()
 
 
 if __name__ == "__main__":
@@ -4,14 +4,31 @@
 Func:
 
     get_html: Получает на вход url (данные полученые от API магазина),
-        возвращает спарсенные данные(dict).
+        возвращает спарсенные данные(dict). JSON разбирается прямо
+        из байтов ответа(backend.fastjson).
 
     get_info_item: Получает на вход спарсенные данные(dict), возвращает:
         название товара, описание товара и рейтинг товара.
+
+    get_price_item: Получает на вход спарсенные данные о цене(dict),
+        возвращает цену товара.
+
+    get_product: Получает на вход URL информации и цены товара,
+        запрашивает их одновременно и возвращает название, описание,
+        рейтинг и цену товара.
 """
-import json
+import asyncio
+from typing import Optional
+from urllib.parse import urlsplit
+
 import aiohttp
 
+from backend.client import get_client
+from backend.fastjson import loads
+from backend.ratelimit import (CircuitOpenError, backoff_delay,
+                               get_limiter, is_retryable)
+from config import RETRY_ATTEMPTS
+
 
 class ParseHTMLError(Exception):
     """Вызывается при ошибочной ссылки/ошибках '401' или '403'."""
@@ -34,28 +51,58 @@ async def get_html(url: str) -> dict:
     Returns:
 
         Возвращает словарь с данными сайта(МВИДЕО).
+
+    Notes:
+
+        Использует общий HTTP клиент сервиса с пулом соединений,
+        заголовки и cookie уже настроены в клиенте. Запросы проходят
+        через ограничитель частоты хоста, при ответах 401/403/429/5xx
+        и сетевых ошибках повторяются с экспоненциальной задержкой.
     """
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Mobile "
-            "Safari/537.36"
-        ),
-        "Cookie": (
-            "MVID_CITY_ID=CityCZ_975; MVID_REGION_ID=1; "
-            "MVID_REGION_SHOP=S002; MVID_TIMEZONE_OFFSET=3;"
-        )
-    }
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers) as response:
-            if response.status in [401, 403]:
-                return {
-                    'error': f"Проблема авторизации, код: {response.status}"}
-            elif response.status == 200:
-                text = await response.text()
-                return {"message": json.loads(text), "status_code": 200}
-            else:
-                return {'error': "Неверный формат ссылки!"}
+    limiter = get_limiter()
+    host = limiter.host(urlsplit(url).hostname or "")
+    session = get_client().session
+    for attempt in range(RETRY_ATTEMPTS):
+        last_attempt = attempt == RETRY_ATTEMPTS - 1
+        try:
+            await host.acquire(fail_fast=limiter.fail_fast)
+        except CircuitOpenError as ex:
+            return {'error': str(ex)}
+        try:
+            async with session.get(url) as response:
+                status = response.status
+                if status == 200:
+                    body = await response.read()
+                    host.record_success()
+                    try:
+                        data = loads(body)
+                    except ValueError:
+                        return {'error': "Ответ магазина не является JSON!"}
+                    return {"message": data, "status_code": 200}
+                retry_after = _retry_after(response.headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+            host.record_failure(type(ex).__name__)
+            if last_attempt:
+                raise
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+        if not is_retryable(status):
+            host.record_success()
+            return {'error': "Неверный формат ссылки!"}
+        host.record_failure(str(status))
+        if not last_attempt:
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
+    if status in [401, 403]:
+        return {'error': f"Проблема авторизации, код: {status}"}
+    return {'error': f"Магазин ограничил запросы, код: {status}"}
+
+
+def _retry_after(headers) -> Optional[float]:
+    """Возвращает задержку из заголовка Retry-After в секундах."""
+    try:
+        return float(headers.get("Retry-After", ""))
+    except ValueError:
+        return None
 
 
 async def get_info_item(data_info: dict) -> dict:
@@ -73,14 +120,70 @@ async def get_info_item(data_info: dict) -> dict:
     if not isinstance(data_info, dict):
         return {'error': "Переданные данные, не являются словарем!",
                 "status_code": 422}
-    elif 'body' not in data_info:
+    body = data_info.get('body')
+    if not isinstance(body, dict):
         return {'error': "Отсутствует необходимый ключ 'body'.",
                 "status_code": 422}
-    elif 'name' not in data_info['body']:
+    elif 'name' not in body:
         return {'error': "Отсутствует необходимые ключи данных о товаре.",
                 "status_code": 422}
     else:
-        return {"name": data_info['body']['name'],
-                "description": data_info['body']['description'],
-                "rating": data_info['body']['rating']['star'],
+        return {"name": body['name'],
+                "description": body['description'],
+                "rating": body['rating']['star'],
                 "status_code": 200}
+
+
+async def get_price_item(data_price: dict) -> dict:
+    """
+    Функция поиска цены продукта.
+
+    Args:
+
+        data_price: Словарь с данными о цене(страница с API).
+
+    Returns:
+
+        Возвращает словарь с ценой товара.
+    """
+    try:
+        price = data_price["body"]["materialPrices"][0]["price"]
+    except (KeyError, IndexError, TypeError):
+        price = None
+    if not isinstance(price, dict) or "salePrice" not in price:
+        return {'error': "Отсутствует необходимые ключи данных о цене.",
+                "status_code": 422}
+    return {"price": price["salePrice"], "status_code": 200}
+
+
+async def get_product(url_info: str, url_price: str) -> dict:
+    """
+    Функция получения информации и цены товара.
+
+    Args:
+
+        url_info: URL от API МВИДЕО c общей ифно о товаре.
+        url_price: URL от API МВИДЕО c ифно о цене товара.
+
+    Returns:
+
+        Возвращает словарь с названием, описанием, рейтингом и ценой
+        товара, иначе сообщение об ошибке(error) и статус код.
+    """
+    data_info, data_price = await asyncio.gather(
+        get_html(url=url_info), get_html(url=url_price))
+    if not data_info:
+        return {"error": "Отсутствует ссылка на API с информацией о товаре!",
+                "status_code": 422}
+    elif "error" in data_info:
+        return {"error": data_info["error"], "status_code": 422}
+    elif "error" in data_price:
+        return {"error": f"Ссылка на цену: {data_price['error']}",
+                "status_code": 422}
+    data = await get_info_item(data_info=data_info['message'])
+    if data['status_code'] != 200:
+        return data
+    price = await get_price_item(data_price=data_price['message'])
+    if price['status_code'] != 200:
+        return price
+    return {**data, "price": price['price']}
@@ -0,0 +1,176 @@
+"""
+Модуль кэша ответов маршрутов.
+
+Classes:
+
+    ResponseCache: Хранит готовые тела ответов(JSON) с ETag,
+        ограничен числом записей(LRU) и временем жизни(TTL).
+        Ключи ответов содержат номер версии товара или списка
+        товаров, поэтому изменение товара делает его старые ответы
+        недоступными, не перебирая кэш.
+
+Func:
+
+    make_etag: Возвращает строгий ETag тела ответа.
+
+    etag_matches: Проверяет заголовок If-None-Match.
+
+    get_cache: Возвращает общий для сервиса кэш, подписанный
+        на уведомления о новых ценах и изменении товаров.
+"""
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL
+from database.FDataBase import PRICE_TICKS_CHANNEL, PRODUCTS_CHANNEL
+from database.events import get_notifier
+
+
+def make_etag(body: bytes) -> str:
+    """Функция получения строгого ETag по содержимому ответа."""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Функция проверки заголовка If-None-Match.
+
+    Args:
+
+        if_none_match: Значение заголовка(список ETag через запятую
+            или *).
+        etag: ETag текущего ответа.
+
+    Returns:
+
+        Возвращает True, если клиенту можно ответить 304.
+    """
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag
+                              for tag in tags)
+
+
+class ResponseCache:
+    """
+    Кэш ответов маршрутов.
+
+    Args:
+
+        max_entries: Максимальное число ответов, при превышении
+            удаляются давно не запрошенные. 0 - кэш выключен.
+        ttl: Время жизни ответа(сек).
+
+    Notes:
+
+        Версии меняются по уведомлениям: новые цены товара меняют
+        версию товара, добавление или удаление товара - версию товара
+        и списка товаров. Ответ, посчитанный во время изменения,
+        сохраняется под версией, взятой до запроса в базу, и больше
+        не отдаётся.
+    """
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, bytes, str]] = (
+            OrderedDict())
+        self._versions: dict[int, int] = {}
+        self.list_version = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "resets": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def version(self, product_id: int) -> int:
+        """Возвращает версию ответов товара."""
+        return self._versions.get(product_id, 0)
+
+    def get(self, key: Hashable) -> Optional[tuple[bytes, str]]:
+        """
+        Возвращает тело ответа и ETag по ключу.
+
+        Returns:
+
+            Возвращает None, если ответа нет или он устарел.
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[1], entry[2]
+
+    def put(self, key: Hashable, body: bytes, etag: str) -> None:
+        """Сохраняет тело ответа и ETag."""
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, body, etag)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, product_ids: list[int],
+                   products_changed: bool = False) -> None:
+        """
+        Делает недоступными ответы товаров.
+
+        Args:
+
+            product_ids: id изменившихся товаров.
+            products_changed: Товары добавлены или удалены, меняется
+                и список товаров.
+        """
+        for product_id in product_ids:
+            self._versions[product_id] = self.version(product_id) + 1
+        if products_changed:
+            self.list_version += 1
+
+    def on_ticks(self, payload: str) -> None:
+        """Обрабатывает уведомление о новых ценах товаров."""
+        self.invalidate(_parse_ids(payload))
+
+    def on_products(self, payload: str) -> None:
+        """Обрабатывает уведомление о добавлении или удалении товаров."""
+        self.invalidate(_parse_ids(payload), products_changed=True)
+
+    def clear(self) -> None:
+        """Удаляет все ответы."""
+        self._entries.clear()
+        self.stats["resets"] += 1
+
+
+def _parse_ids(payload: str) -> list[int]:
+    return [int(value) for value in payload.split(",") if value]
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_cache() -> ResponseCache:
+    """
+    Функция получения общего кэша ответов.
+
+    Notes:
+
+        Кэшем можно пользоваться, только пока открыто соединение
+        подписки(get_notifier().listen()), иначе изменения товаров
+        не будут замечены. При открытии и разрыве соединения
+        кэш очищается.
+    """
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache(max_entries=RESPONSE_CACHE_SIZE,
+                               ttl=RESPONSE_CACHE_TTL)
+        notifier = get_notifier()
+        notifier.add_handler(PRICE_TICKS_CHANNEL, _cache.on_ticks)
+        notifier.add_handler(PRODUCTS_CHANNEL, _cache.on_products)
+        notifier.add_reset_handler(_cache.clear)
+    return _cache
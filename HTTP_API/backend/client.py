@@ -0,0 +1,102 @@
+"""
+Модуль общего HTTP клиента для запросов к API МВИДЕО.
+
+Classes:
+
+    MvideoClient: Долгоживущая обертка над aiohttp.ClientSession
+        с пулом keep-alive соединений, кешем DNS, таймаутами
+        и преднастроенными заголовками и cookie.
+
+Func:
+
+    get_client: Возвращает общий для сервиса клиент,
+        при первом обращении открывает его.
+
+    close_client: Закрывает общий клиент при остановке сервиса.
+"""
+from typing import Optional
+
+import aiohttp
+
+from config import (HTTP_POOL_LIMIT, HTTP_DNS_TTL, HTTP_KEEPALIVE,
+                    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT,
+                    HTTP_PER_HOST_LIMIT)
+
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 "
+        "Mobile Safari/537.36"),
+    "Cookie": ("MVID_CITY_ID=CityCZ_975; "
+               "MVID_REGION_ID=1; MVID_REGION_SHOP=S002; "
+               "MVID_TIMEZONE_OFFSET=3;")
+}
+
+
+class MvideoClient:
+    """
+    Клиент для запросов к API МВИДЕО.
+
+    Args:
+
+        limit: Общее число соединений в пуле.
+        limit_per_host: Число соединений к одному хосту.
+        dns_ttl: Время кеширования DNS ответов(сек).
+        keepalive: Время удержания неактивного соединения(сек).
+        connect_timeout: Таймаут установки соединения(сек).
+        read_timeout: Таймаут чтения ответа(сек).
+    """
+
+    def __init__(self, limit: int = HTTP_POOL_LIMIT,
+                 limit_per_host: int = HTTP_PER_HOST_LIMIT,
+                 dns_ttl: int = HTTP_DNS_TTL,
+                 keepalive: float = HTTP_KEEPALIVE,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 read_timeout: float = HTTP_READ_TIMEOUT) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive = keepalive
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout,
+                                             sock_read=read_timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Возвращает открытую сессию, при необходимости открывает её."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  headers=HEADERS,
+                                                  timeout=self.timeout)
+        return self._session
+
+    async def close(self) -> None:
+        """Закрывает сессию и все соединения пула."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_client: Optional[MvideoClient] = None
+
+
+def get_client() -> MvideoClient:
+    """Функция получения общего HTTP клиента сервиса."""
+    global _client
+    if _client is None:
+        _client = MvideoClient()
+    return _client
+
+
+async def close_client() -> None:
+    """Функция закрытия общего HTTP клиента сервиса."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
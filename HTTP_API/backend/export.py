@@ -0,0 +1,141 @@
+"""
+Модуль выгрузки истории цен.
+
+Func:
+
+    iter_export: Читает историю цен пачками и по мере чтения
+        записывает каждую пачку в выбранном формате(NDJSON, CSV
+        или колонки columns).
+
+Notes:
+
+    EXPORT_FORMATS содержит для каждого формата тип содержимого
+    ответа и расширение файла.
+
+    Формат columns - двоичные колонки в порядке little-endian:
+
+        заголовок, 16 байт: COLUMNS_MAGIC(8 байт), версия uint32,
+            резерв uint32;
+        пачки, каждая: число записей n uint64, id товаров int32[n]
+            (дополненные нулями до кратной 8 байтам длины),
+            время int64[n] - микросекунды от 1970-01-01 без часового
+            пояса(как datetime64[us], NaT - минимальное int64),
+            цены float64[n];
+        конец выгрузки - пачка с n = 0.
+
+    Все колонки начинаются с кратного 8 байтам смещения, поэтому
+    читаются без копирования, в том числе из файла через mmap:
+    numpy.frombuffer(buffer, "<i4", n, offset) и т.д.
+"""
+import csv
+import io
+import sys
+import struct
+import logging
+from array import array
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from backend.fastjson import dumps
+from database.FDataBase import iter_history
+
+
+logger = logging.getLogger(__name__)
+
+# Формат выгрузки: (тип содержимого, расширение файла).
+EXPORT_FORMATS = {"ndjson": ("application/x-ndjson", "ndjson"),
+                  "csv": ("text/csv; charset=utf-8", "csv"),
+                  "columns": ("application/octet-stream", "pcol")}
+
+COLUMNS_MAGIC = b"PRICECOL"
+COLUMNS_VERSION = 1
+# Время без значения(NaT в NumPy).
+_NAT = -2 ** 63
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _ndjson(rows: list[tuple]) -> bytes:
+    return b"".join(dumps({"product_id": product_id, "price": price,
+                           "date": timestamp}) + b"\n"
+                    for product_id, price, timestamp in rows)
+
+
+def _csv(rows: list[tuple]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows((product_id, price,
+                      timestamp.isoformat() if timestamp else "")
+                     for product_id, price, timestamp in rows)
+    return buffer.getvalue().encode()
+
+
+def _micros(timestamp: Optional[datetime]) -> int:
+    if timestamp is None:
+        return _NAT
+    delta = timestamp - _EPOCH
+    return ((delta.days * 86400 + delta.seconds) * 1000000 +
+            delta.microseconds)
+
+
+def _columns(rows: list[tuple]) -> bytes:
+    product_ids = array("i", (row[0] for row in rows))
+    timestamps = array("q", (_micros(row[2]) for row in rows))
+    prices = array("d", (row[1] for row in rows))
+    if sys.byteorder == "big":
+        for column in (product_ids, timestamps, prices):
+            column.byteswap()
+    padding = b"\0" * (len(rows) % 2 * 4)
+    return b"".join((struct.pack("<Q", len(rows)), product_ids.tobytes(),
+                     padding, timestamps.tobytes(), prices.tobytes()))
+
+
+async def iter_export(export_format: str,
+                      product_ids: Optional[list[int]] = None,
+                      date_from: Optional[datetime] = None,
+                      date_to: Optional[datetime] = None,
+                      chunk_size: int = 5000) -> AsyncIterator[bytes]:
+    """
+    Функция выгрузки истории цен.
+
+    Args:
+
+        export_format: Формат из EXPORT_FORMATS.
+        product_ids: id товаров, по умолчанию все товары.
+        date_from: Начало периода(включительно).
+        date_to: Конец периода(не включительно).
+        chunk_size: Число записей, читаемых из базы за раз.
+
+    Yields:
+
+        Куски выгрузки в байтах, по одному на пачку записей,
+        для CSV и columns первым идёт заголовок, для columns
+        последней - пустая пачка.
+
+    Notes:
+
+        Следующая пачка читается, когда предыдущая отправлена
+        клиенту, поэтому память не зависит от объёма выгрузки.
+        Ошибка базы данных после начала ответа уже не меняет
+        статус код: выгрузка обрывается и ошибка пишется в лог.
+    """
+    encode = {"ndjson": _ndjson, "csv": _csv,
+              "columns": _columns}[export_format]
+    if export_format == "csv":
+        yield b"product_id,price,date\n"
+    elif export_format == "columns":
+        yield COLUMNS_MAGIC + struct.pack("<II", COLUMNS_VERSION, 0)
+    written = 0
+    try:
+        async for rows in iter_history(product_ids=product_ids,
+                                       date_from=date_from,
+                                       date_to=date_to,
+                                       chunk_size=chunk_size):
+            written += len(rows)
+            yield encode(rows)
+    except Exception as ex:
+        logger.error(f"Ошибка выгрузки истории цен после {written} "
+                     f"записей: {ex}")
+        raise
+    if export_format == "columns":
+        yield struct.pack("<Q", 0)
+    logger.info(f"Выгружено записей истории цен: {written}")
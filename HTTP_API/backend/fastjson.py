@@ -0,0 +1,67 @@
+"""
+Модуль разбора и записи JSON.
+
+Func:
+
+    loads: Разбирает JSON из байтов ответа без промежуточной строки.
+        Использует orjson, если он установлен, иначе стандартный json.
+
+    dumps: Записывает данные в JSON сразу в байты.
+
+Notes:
+
+    JSON_BACKEND содержит имя используемой библиотеки.
+    Ошибки разбора обеих библиотек - наследники ValueError.
+"""
+import json
+from datetime import datetime
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Функция разбора JSON.
+
+    Args:
+
+        data: Тело ответа(байты в UTF-8).
+
+    Returns:
+
+        Возвращает разобранные данные.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def dumps(data: Any) -> bytes:
+    """
+    Функция записи JSON.
+
+    Args:
+
+        data: Данные, datetime записывается в формате ISO 8601.
+
+    Returns:
+
+        Возвращает JSON в байтах UTF-8.
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"),
+                      default=_default).encode()
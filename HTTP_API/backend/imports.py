@@ -0,0 +1,482 @@
+"""
+Модуль пакетного добавления товаров.
+
+Classes:
+
+    ImportJob: Задача добавления списка товаров: очередь строк,
+        результаты по каждой строке и прогресс. Строки обрабатываются
+        воркерами по мере загрузки, добавленные товары записываются
+        в базу пачками.
+
+    ImportRegistry: Хранит задачи по id, ограничивает общее число
+        одновременных запросов к магазину и число хранимых задач.
+
+Func:
+
+    iter_upload: Разбирает загружаемый файл(JSON список, NDJSON или CSV)
+        по строкам или элементам по мере получения и валидирует
+        каждую строку.
+
+    get_imports: Возвращает общий для сервиса реестр задач.
+
+    close_imports: Останавливает задачи при остановке сервиса.
+"""
+import re
+import csv
+import json
+import codecs
+import uuid
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Optional
+
+from pydantic import ValidationError
+
+from backend.backend import get_product
+from config import (IMPORT_CONCURRENCY, IMPORT_BATCH_SIZE,
+                    IMPORT_MAX_ITEMS, IMPORT_MAX_JOBS)
+from database.FDataBase import (AsyncSessionLocal, add_items_info,
+                                select_item_by_urls)
+from models.model import UrlCheck
+
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_FORMATS = ("json", "ndjson", "csv")
+# Максимальный размер строки загрузки(байт) или элемента JSON списка
+# (символов).
+MAX_ITEM_SIZE = 64 * 1024
+# Символы, которыми может закончиться число внутри JSON списка.
+_DELIMITERS = (" ", "\t", "\r", "\n", ",", "]")
+# Недочитанное слово, число или \uXXXX от места ошибки до конца куска:
+# ошибка разбора может исчезнуть, когда придёт следующий кусок.
+_PARTIAL = re.compile(r"[\w+\-.]*")
+
+
+async def _lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Собирает строки из кусков тела запроса."""
+    tail = b""
+    async for chunk in stream:
+        tail += chunk
+        *lines, tail = tail.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+        if len(tail) > MAX_ITEM_SIZE:
+            raise ValueError(f"Строка длиннее {MAX_ITEM_SIZE} байт")
+    if tail:
+        yield tail.decode("utf-8-sig").rstrip("\r")
+
+
+async def _json_items(
+        stream: AsyncIterator[bytes]
+) -> AsyncIterator[tuple[int, Any, Optional[str]]]:
+    """
+    Разбирает JSON список по элементам по мере получения тела запроса.
+
+    Yields:
+
+        Номер элемента(с 1), элемент и текст ошибки разбора. После
+        ошибки разбора чтение прекращается: дальше JSON не разобрать.
+
+    Notes:
+
+        В памяти хранится только недочитанный элемент(не больше
+        MAX_ITEM_SIZE символов) и последний кусок тела.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8-sig")()
+    chunks = stream.__aiter__()
+    buffer, position, ended, more = "", 0, False, False
+    # start - ждём "[", first - первый элемент или "]",
+    # item - элемент после ",", next - "," или "]", done - конец списка.
+    state, number = "start", 0
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n":
+            position += 1
+        if more or position == len(buffer):
+            if ended:
+                break
+            if len(buffer) - position > MAX_ITEM_SIZE:
+                yield number + 1, None, (f"Элемент длиннее "
+                                         f"{MAX_ITEM_SIZE} символов")
+                return
+            try:
+                chunk = text.decode(await chunks.__anext__())
+            except StopAsyncIteration:
+                chunk, ended = text.decode(b"", final=True), True
+            buffer, position, more = buffer[position:] + chunk, 0, False
+            continue
+        char = buffer[position]
+        if state == "start":
+            if char != "[":
+                yield 1, None, "Ожидается список объектов"
+                return
+            state = "first"
+        elif state in ("first", "next") and char == "]":
+            state = "done"
+        elif state == "next":
+            if char != ",":
+                yield number, None, "Ошибка разбора JSON: ожидается , или ]"
+                return
+            state = "item"
+        elif state == "done":
+            yield number, None, "Ошибка разбора JSON: данные после списка"
+            return
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as ex:
+                if not ended and (
+                        ex.msg.startswith("Unterminated string") or
+                        _PARTIAL.fullmatch(buffer, ex.pos) is not None):
+                    # Элемент ещё не получен целиком. Ошибка в середине
+                    # куска не исправится новыми данными.
+                    more = True
+                    continue
+                yield number + 1, None, f"Ошибка разбора JSON: {ex.msg}"
+                return
+            if (not ended and isinstance(item, (int, float)) and
+                    buffer[end:end + 1] not in _DELIMITERS):
+                # Число в конце куска может продолжиться в следующем.
+                more = True
+                continue
+            number += 1
+            position, state = end, "next"
+            yield number, item, None
+            continue
+        position += 1
+    if state == "start":
+        yield 1, None, "Ожидается список объектов"
+    elif state != "done":
+        yield number + 1, None, "Ошибка разбора JSON: список не закончен"
+
+
+def _validate(data) -> UrlCheck:
+    if not isinstance(data, dict):
+        raise ValueError("Ожидается объект с url_info и url_price")
+    return UrlCheck(**data)
+
+
+async def iter_upload(
+        stream: AsyncIterator[bytes], upload_format: str
+) -> AsyncIterator[tuple[int, Optional[UrlCheck], Optional[str]]]:
+    """
+    Функция разбора загружаемого списка товаров.
+
+    Args:
+
+        stream: Тело запроса кусками байт.
+        upload_format: "json" - список объектов, "ndjson" - объект
+            на строке, "csv" - строка заголовка url_info,url_price
+            и по товару на строке.
+
+    Yields:
+
+        Номер строки(с 1, для JSON - номер элемента), проверенные URL
+        или None и текст ошибки проверки.
+
+    Notes:
+
+        Все форматы разбираются и проверяются по мере получения тела
+        запроса, JSON список - по элементам, поэтому память
+        не зависит от размера загрузки.
+    """
+    if upload_format == "json":
+        async for number, item, error in _json_items(stream):
+            if error is not None:
+                yield number, None, error
+                continue
+            try:
+                yield number, _validate(item), None
+            except (ValidationError, ValueError) as ex:
+                yield number, None, str(ex)
+        return
+
+    header = None
+    number = 0
+    async for line in _lines(stream):
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            if upload_format == "ndjson":
+                yield number, _validate(json.loads(line)), None
+                continue
+            row = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in row]
+                if not {"url_info", "url_price"} <= set(header):
+                    yield number, None, ("Нет заголовка с колонками "
+                                         "url_info,url_price")
+                    return
+                continue
+            yield number, _validate(dict(zip(header, row))), None
+        except (ValidationError, ValueError) as ex:
+            yield number, None, str(ex)
+
+
+class ImportJob:
+    """
+    Задача пакетного добавления товаров.
+
+    Args:
+
+        job_id: id задачи.
+        slots: Общий для задач семафор запросов к магазину.
+        concurrency: Число воркеров задачи.
+        batch_size: Размер пачки записи товаров в базу.
+        max_items: Максимальное число строк в задаче.
+    """
+
+    def __init__(self, job_id: str, slots: asyncio.Semaphore,
+                 concurrency: int, batch_size: int,
+                 max_items: int) -> None:
+        self.id = job_id
+        self.slots = slots
+        self.batch_size = max(1, batch_size)
+        self.max_items = max_items
+        self.status = "running"
+        self.created_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self.error: Optional[str] = None
+        self.items: list[dict] = []
+        self.counts = {"queued": 0, "added": 0, "exists": 0, "failed": 0}
+        self._seen: set[tuple[str, str]] = set()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pending: list[dict] = []
+        self._write_lock = asyncio.Lock()
+        self._workers = [asyncio.create_task(self._work())
+                         for _ in range(max(1, concurrency))]
+        self._task: Optional[asyncio.Task] = None
+
+    def _finish_item(self, item: dict, status: str,
+                     message: Optional[str] = None) -> None:
+        self.counts[item["status"]] -= 1
+        self.counts[status] += 1
+        item["status"] = status
+        if message is not None:
+            item["message"] = message
+
+    def add(self, number: int, url: Optional[UrlCheck],
+            error: Optional[str] = None) -> None:
+        """
+        Добавляет строку загрузки в задачу.
+
+        Args:
+
+            number: Номер строки загрузки.
+            url: Проверенные URL товара.
+            error: Ошибка проверки строки, если url не задан.
+        """
+        item = {"line": number, "status": "queued"}
+        self.counts["queued"] += 1
+        self.items.append(item)
+        if url is None:
+            self._finish_item(item, "failed", error)
+            return
+        item["url_info"] = str(url.url_info)
+        item["url_price"] = str(url.url_price)
+        key = (item["url_info"], item["url_price"])
+        if key in self._seen:
+            self._finish_item(item, "exists", "Повтор строки загрузки")
+        else:
+            self._seen.add(key)
+            self._queue.put_nowait(item)
+
+    async def read(self, rows: AsyncIterator) -> None:
+        """
+        Добавляет в задачу строки загрузки и запускает в фоне
+        ожидание их обработки.
+
+        Args:
+
+            rows: Строки из iter_upload.
+
+        Notes:
+
+            Воркеры начинают обрабатывать строки, пока загрузка ещё
+            читается.
+        """
+        try:
+            async for number, url, error in rows:
+                if len(self.items) >= self.max_items:
+                    self.error = (f"Превышено число строк: "
+                                  f"{self.max_items}, строки с {number} "
+                                  f"не прочитаны")
+                    break
+                self.add(number, url, error)
+        except Exception as ex:
+            logger.error(f"Ошибка загрузки задачи {self.id}: {ex}")
+            self.status = "failed"
+            self.error = f"Ошибка чтения загрузки: {ex}"
+        self._task = asyncio.create_task(self._finish())
+
+    async def _finish(self) -> None:
+        await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        await self._flush()
+        if self.status == "running":
+            self.status = "done"
+        self.finished_at = datetime.now()
+        logger.info(f"Задача добавления {self.id} завершена: {self.counts}")
+
+    async def cancel(self) -> None:
+        """Останавливает задачу."""
+        tasks = self._workers + ([self._task] if self._task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.finished_at is None:
+            self.status = "cancelled"
+            self.finished_at = datetime.now()
+
+    async def _work(self) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._process(item)
+            except Exception as ex:
+                self._finish_item(item, "failed", f"Ошибка: {ex!r}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, item: dict) -> None:
+        async with AsyncSessionLocal() as session:
+            product = await select_item_by_urls(
+                url_info=item["url_info"], url_price=item["url_price"],
+                session=session)
+        if product is not None:
+            item["product_id"] = product["id"]
+            self._finish_item(item, "exists")
+            return
+        async with self.slots:
+            data = await get_product(url_info=item["url_info"],
+                                     url_price=item["url_price"])
+        if data["status_code"] != 200:
+            self._finish_item(item, "failed", data["error"])
+            return
+        self._pending.append({**data, "item": item,
+                              "url_info": item["url_info"],
+                              "url_price": item["url_price"]})
+        # Пачка записывается, когда набралась или когда строки
+        # в очереди кончились, чтобы товары не ждали следующих строк.
+        if len(self._pending) >= self.batch_size or self._queue.empty():
+            await self._flush()
+
+    async def _flush(self) -> None:
+        """Записывает накопленные товары в базу одной пачкой."""
+        async with self._write_lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return
+            try:
+                async with AsyncSessionLocal() as session:
+                    added = await add_items_info(items=pending,
+                                                 session=session)
+            except Exception as ex:
+                logger.error(f"Ошибка записи товаров задачи {self.id}: "
+                             f"{ex}")
+                for data in pending:
+                    self._finish_item(data["item"], "failed",
+                                      "Ошибка записи в базу данных")
+                return
+            for data in pending:
+                product_id = added.get((data["url_info"],
+                                        data["url_price"]))
+                if product_id is None:
+                    self._finish_item(data["item"], "exists")
+                else:
+                    data["item"]["product_id"] = product_id
+                    self._finish_item(data["item"], "added")
+
+    def snapshot(self, offset: int = 0, limit: int = 100) -> dict:
+        """
+        Возвращает состояние задачи.
+
+        Args:
+
+            offset: Номер первого результата строки.
+            limit: Максимальное число результатов строк.
+
+        Returns:
+
+            Возвращает словарь со статусом, числом строк по состояниям
+            и результатами строк с offset.
+        """
+        return {"id": self.id, "status": self.status, "error": self.error,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+                "total": len(self.items),
+                "counts": dict(self.counts),
+                "items": [dict(item)
+                          for item in self.items[offset:offset + limit]]}
+
+
+class ImportRegistry:
+    """
+    Реестр задач пакетного добавления товаров.
+
+    Args:
+
+        concurrency: Общее число одновременных запросов товаров
+            к магазину по всем задачам.
+        batch_size: Размер пачки записи товаров в базу.
+        max_items: Максимальное число строк в задаче.
+        max_jobs: Число хранимых задач, старые завершённые задачи
+            удаляются.
+    """
+
+    def __init__(self, concurrency: int, batch_size: int,
+                 max_items: int, max_jobs: int) -> None:
+        self.concurrency = max(1, concurrency)
+        self.batch_size = batch_size
+        self.max_items = max_items
+        self.max_jobs = max_jobs
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.jobs: dict[str, ImportJob] = {}
+
+    def create(self) -> ImportJob:
+        """Создаёт задачу."""
+        finished = [job for job in self.jobs.values()
+                    if job.finished_at is not None]
+        for job in finished[:max(0, len(self.jobs) + 1 - self.max_jobs)]:
+            del self.jobs[job.id]
+        job = ImportJob(job_id=uuid.uuid4().hex, slots=self.slots,
+                        concurrency=self.concurrency,
+                        batch_size=self.batch_size,
+                        max_items=self.max_items)
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        """Возвращает задачу по id."""
+        return self.jobs.get(job_id)
+
+    async def close(self) -> None:
+        """Останавливает все задачи."""
+        await asyncio.gather(*(job.cancel() for job in self.jobs.values()))
+
+
+_imports: Optional[ImportRegistry] = None
+
+
+def get_imports() -> ImportRegistry:
+    """Функция получения общего реестра задач добавления товаров."""
+    global _imports
+    if _imports is None:
+        _imports = ImportRegistry(concurrency=IMPORT_CONCURRENCY,
+                                  batch_size=IMPORT_BATCH_SIZE,
+                                  max_items=IMPORT_MAX_ITEMS,
+                                  max_jobs=IMPORT_MAX_JOBS)
+    return _imports
+
+
+async def close_imports() -> None:
+    """Функция остановки задач добавления товаров."""
+    global _imports
+    if _imports is not None:
+        await _imports.close()
+        _imports = None
@@ -0,0 +1,260 @@
+"""
+Модуль ограничения частоты запросов к API МВИДЕО.
+
+Classes:
+
+    CircuitOpenError: Вызывается при запросе к хосту, запросы
+        к которому приостановлены.
+
+    TokenBucket: Ведро токенов, ограничивающее скорость запросов.
+
+    HostLimiter: Ограничитель одного хоста: ведро токенов, экспоненциальная
+        задержка со случайным смещением при ошибках 401/403/429/5xx
+        и предохранитель, приостанавливающий запросы после серии
+        ошибок и плавно восстанавливающий скорость.
+
+    RateLimiter: Набор ограничителей по хостам, экспортирует их состояние.
+
+Func:
+
+    get_limiter: Возвращает общий для сервиса ограничитель.
+"""
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional
+
+from config import (RATE_LIMIT_RPS, RATE_LIMIT_BURST,
+                    RETRY_BASE_DELAY, RETRY_MAX_DELAY,
+                    BREAKER_THRESHOLD, BREAKER_COOLDOWN,
+                    BREAKER_MAX_COOLDOWN, BREAKER_RECOVERY_STEP,
+                    BREAKER_FAIL_FAST)
+
+
+logger = logging.getLogger(__name__)
+
+# Коды ответа, говорящие об ограничении запросов или сбое магазина.
+THROTTLE_STATUSES = {401, 403, 429}
+
+CLOSED = "closed"
+OPEN = "open"
+RECOVERING = "recovering"
+
+# Начальная доля скорости после паузы, удваивается на каждом шаге.
+RECOVERY_START_FACTOR = 0.125
+
+
+class CircuitOpenError(Exception):
+    """Вызывается при запросе к хосту, запросы к которому приостановлены."""
+    pass
+
+
+def is_retryable(status: int) -> bool:
+    """Возвращает True для кодов ответа, которые стоит повторить."""
+    return status in THROTTLE_STATUSES or status >= 500
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Функция расчёта задержки перед повтором запроса.
+
+    Args:
+
+        attempt: Номер неудачной попытки, начиная с 0.
+        retry_after: Задержка из заголовка Retry-After(сек).
+
+    Returns:
+
+        Возвращает экспоненциальную задержку со случайным
+        смещением("full jitter"), не меньше retry_after.
+    """
+    delay = random.uniform(0, min(RETRY_MAX_DELAY,
+                                  RETRY_BASE_DELAY * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, RETRY_MAX_DELAY))
+    return delay
+
+
+class TokenBucket:
+    """
+    Ведро токенов.
+
+    Args:
+
+        rate: Скорость пополнения(токенов в секунду).
+        capacity: Вместимость ведра(размер всплеска).
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, factor: float) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens +
+                          (now - self._updated) * self.rate * factor)
+        self._updated = now
+
+    async def acquire(self, factor: float = 1.0) -> None:
+        """Забирает токен, при необходимости дожидаясь его появления."""
+        async with self._lock:
+            while True:
+                self._refill(factor)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / (self.rate * factor))
+
+
+class HostLimiter:
+    """
+    Ограничитель запросов к одному хосту.
+
+    Args:
+
+        host: Имя хоста.
+    """
+
+    def __init__(self, host: str) -> None:
+        self.host = host
+        self.bucket = TokenBucket(RATE_LIMIT_RPS, RATE_LIMIT_BURST)
+        self.state = CLOSED
+        self.factor = 1.0
+        self.cooldown = BREAKER_COOLDOWN
+        self.open_until = 0.0
+        self.consecutive_failures = 0
+        self.recovery_successes = 0
+        self.trips = 0
+        self.failures: dict[str, int] = {}
+        self.last_failure: Optional[dict] = None
+        self.last_trip: Optional[dict] = None
+
+    def retry_in(self) -> float:
+        """Возвращает число секунд до окончания паузы."""
+        return max(0.0, self.open_until - time.monotonic())
+
+    async def acquire(self, fail_fast: bool = False) -> None:
+        """
+        Дожидается разрешения на запрос к хосту.
+
+        Args:
+
+            fail_fast: Не ждать окончания паузы, а вызвать
+                CircuitOpenError.
+        """
+        while self.state == OPEN:
+            wait = self.retry_in()
+            if wait <= 0:
+                self._set_state(RECOVERING, "пауза окончена")
+                self.factor = RECOVERY_START_FACTOR
+                self.recovery_successes = 0
+                break
+            if fail_fast:
+                raise CircuitOpenError(
+                    f"Запросы к {self.host} приостановлены "
+                    f"ещё на {round(wait, 1)} сек.")
+            await asyncio.sleep(wait)
+        await self.bucket.acquire(self.factor)
+
+    def record_success(self) -> None:
+        """Учитывает успешный запрос, плавно восстанавливает скорость."""
+        self.consecutive_failures = 0
+        if self.state != RECOVERING:
+            return
+        self.recovery_successes += 1
+        if self.recovery_successes >= BREAKER_RECOVERY_STEP:
+            self.recovery_successes = 0
+            self.factor = min(1.0, self.factor * 2)
+            if self.factor >= 1.0:
+                self.cooldown = BREAKER_COOLDOWN
+                self._set_state(CLOSED, "скорость восстановлена")
+
+    def record_failure(self, reason: str) -> None:
+        """
+        Учитывает неудачный запрос.
+
+        Args:
+
+            reason: Причина: код ответа или тип сетевой ошибки.
+        """
+        self.consecutive_failures += 1
+        self.failures[reason] = self.failures.get(reason, 0) + 1
+        self.last_failure = {"reason": reason,
+                             "at": datetime.now().isoformat()}
+        if self.state == RECOVERING:
+            self.cooldown = min(BREAKER_MAX_COOLDOWN, self.cooldown * 2)
+            self._trip(reason)
+        elif (self.state == CLOSED and
+              self.consecutive_failures >= BREAKER_THRESHOLD):
+            self._trip(reason)
+
+    def _trip(self, reason: str) -> None:
+        self.trips += 1
+        self.open_until = time.monotonic() + self.cooldown
+        self.last_trip = {"reason": reason, "cooldown": self.cooldown,
+                          "at": datetime.now().isoformat()}
+        self._set_state(OPEN, f"ошибка {reason}, пауза {self.cooldown} сек.")
+
+    def _set_state(self, state: str, why: str) -> None:
+        logger.warning(f"Ограничитель {self.host}: {self.state} -> {state}"
+                       f" ({why})")
+        self.state = state
+
+    def snapshot(self) -> dict:
+        """Возвращает состояние ограничителя хоста."""
+        return {"state": self.state,
+                "rate_factor": self.factor,
+                "tokens": round(self.bucket.tokens, 2),
+                "retry_in": round(self.retry_in(), 1),
+                "consecutive_failures": self.consecutive_failures,
+                "trips": self.trips,
+                "failures": dict(self.failures),
+                "last_failure": self.last_failure,
+                "last_trip": self.last_trip}
+
+
+class RateLimiter:
+    """
+    Набор ограничителей запросов по хостам.
+
+    Args:
+
+        fail_fast: Сразу вызывать CircuitOpenError вместо ожидания паузы.
+    """
+
+    def __init__(self, fail_fast: bool = BREAKER_FAIL_FAST) -> None:
+        self.fail_fast = fail_fast
+        self.hosts: dict[str, HostLimiter] = {}
+
+    def host(self, host: str) -> HostLimiter:
+        """Возвращает ограничитель хоста, создаёт его при первом запросе."""
+        if host not in self.hosts:
+            self.hosts[host] = HostLimiter(host)
+        return self.hosts[host]
+
+    async def wait_until_resumed(self) -> None:
+        """Дожидается окончания пауз всех хостов."""
+        for limiter in list(self.hosts.values()):
+            if limiter.state == OPEN:
+                await asyncio.sleep(limiter.retry_in())
+
+    def snapshot(self) -> dict:
+        """Возвращает состояние ограничителей всех хостов."""
+        return {host: limiter.snapshot()
+                for host, limiter in self.hosts.items()}
+
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_limiter() -> RateLimiter:
+    """Функция получения общего ограничителя запросов сервиса."""
+    global _limiter
+    if _limiter is None:
+        _limiter = RateLimiter()
+    return _limiter
@@ -0,0 +1,58 @@
+"""
+Модуль объединения одинаковых одновременных запросов.
+
+Classes:
+
+    SingleFlight: Выполняет одну корутину на ключ: запросы с тем же
+        ключом, пришедшие, пока она выполняется, получают её результат.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Группа одновременных вызовов по ключу.
+
+    Notes:
+
+        Корутина выполняется отдельной задачей, поэтому отмена одного
+        из ожидающих запросов(клиент закрыл соединение) не отменяет
+        её для остальных.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Ошибка уже передана ожидающим, здесь только помечаем
+            # её полученной, чтобы asyncio не писал предупреждение.
+            task.exception()
+
+    async def do(self, key: Hashable,
+                 func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Возвращает результат func() для ключа.
+
+        Args:
+
+            key: Ключ запроса.
+            func: Функция, возвращающая корутину. Вызывается, только
+                если для ключа нет выполняющегося вызова.
+
+        Returns:
+
+            Возвращает результат корутины или пробрасывает её ошибку.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+        return await asyncio.shield(task)
@@ -11,3 +11,77 @@ DB_NAME = os.environ.get("DB_NAME")
 
 # Настройки приложения
 SECRET_KEY = os.environ.get("SECRET_KEY")
+
+# Параметры HTTP клиента для запросов к API МВИДЕО.
+# Общее число соединений в пуле и число соединений на один хост.
+HTTP_POOL_LIMIT = int(os.environ.get("HTTP_POOL_LIMIT", 50))
+HTTP_PER_HOST_LIMIT = int(os.environ.get("HTTP_PER_HOST_LIMIT", 10))
+# Время кеширования DNS ответов (в секундах).
+HTTP_DNS_TTL = int(os.environ.get("HTTP_DNS_TTL", 300))
+# Время удержания неактивного соединения (в секундах).
+HTTP_KEEPALIVE = float(os.environ.get("HTTP_KEEPALIVE", 60))
+# Таймауты установки соединения и чтения ответа (в секундах).
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 15))
+
+# Параметры ограничения частоты запросов к API МВИДЕО.
+# Скорость запросов к одному хосту (в секунду) и размер всплеска.
+RATE_LIMIT_RPS = float(os.environ.get("RATE_LIMIT_RPS", 5))
+RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", 10))
+# Число попыток запроса и границы экспоненциальной задержки (в секундах).
+RETRY_ATTEMPTS = int(os.environ.get("RETRY_ATTEMPTS", 3))
+RETRY_BASE_DELAY = float(os.environ.get("RETRY_BASE_DELAY", 1))
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", 5))
+# Число подряд неудачных запросов, после которого запросы к хосту
+# приостанавливаются, и длительность паузы (в секундах).
+BREAKER_THRESHOLD = int(os.environ.get("BREAKER_THRESHOLD", 5))
+BREAKER_COOLDOWN = float(os.environ.get("BREAKER_COOLDOWN", 60))
+BREAKER_MAX_COOLDOWN = float(os.environ.get("BREAKER_MAX_COOLDOWN", 900))
+# Число успешных запросов для каждого шага восстановления скорости.
+BREAKER_RECOVERY_STEP = int(os.environ.get("BREAKER_RECOVERY_STEP", 10))
+# Сразу возвращать ошибку, а не ждать окончания паузы.
+BREAKER_FAIL_FAST = os.environ.get("BREAKER_FAIL_FAST", "1") == "1"
+
+# Параметры подписки на события изменения цен.
+# Максимальное время ожидания новых событий одним запросом (в секундах).
+EVENTS_MAX_WAIT = float(os.environ.get("EVENTS_MAX_WAIT", 60))
+# Максимальное число событий в одном ответе.
+EVENTS_MAX_LIMIT = int(os.environ.get("EVENTS_MAX_LIMIT", 1000))
+
+# Параметры списка товаров на мониторинге.
+# Максимальное число товаров на странице(без limit список отдаётся
+# целиком).
+LIST_MAX_LIMIT = int(os.environ.get("LIST_MAX_LIMIT", 1000))
+
+# Параметры истории цен товара.
+# Максимальное число записей на странице(без limit история отдаётся
+# целиком).
+HISTORY_MAX_LIMIT = int(os.environ.get("HISTORY_MAX_LIMIT", 10000))
+
+# Параметры цен товара по периодам(OHLC).
+# Число периодов на странице, если limit не задан.
+OHLC_DEFAULT_LIMIT = int(os.environ.get("OHLC_DEFAULT_LIMIT", 500))
+# Максимальное число периодов на странице.
+OHLC_MAX_LIMIT = int(os.environ.get("OHLC_MAX_LIMIT", 2000))
+# Добавлять начальные цены товаров в агрегаты(должен совпадать
+# с PRICE_ROLLUPS мониторинга).
+PRICE_ROLLUPS = os.environ.get("PRICE_ROLLUPS", "1") == "1"
+
+# Параметры кэша ответов списка товаров и истории цен.
+# Максимальное число ответов в кэше, 0 - кэш выключен.
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 1000))
+# Время жизни ответа в кэше (в секундах).
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", 300))
+
+# Число записей истории цен, читаемых из базы за раз при выгрузке.
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 5000))
+
+# Параметры пакетного добавления товаров.
+# Общее число одновременно добавляемых товаров по всем задачам.
+IMPORT_CONCURRENCY = int(os.environ.get("IMPORT_CONCURRENCY", 10))
+# Размер пачки записи добавленных товаров в базу.
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", 100))
+# Максимальное число строк в одной загрузке.
+IMPORT_MAX_ITEMS = int(os.environ.get("IMPORT_MAX_ITEMS", 10000))
+# Число хранимых в памяти задач, старые завершённые задачи удаляются.
+IMPORT_MAX_JOBS = int(os.environ.get("IMPORT_MAX_JOBS", 100))
@@ -6,7 +6,9 @@ Models:
     Product: Содержит основную инфу о товаре:
         id, название, описание, рейтинг,
         URL на API с основными данными,
-        URL на API с данными о цене.
+        URL на API с данными о цене,
+        время следующей проверки цены, аренда товара экземпляром
+        мониторинга.
         Так же связь с таблицей истории цен.
 
     PriceHistory: Содержит:
@@ -14,20 +16,46 @@ Models:
         цена на товар, время добавления цены, а так же связь
         с таблицей информации о продукте.
 
+    PriceEvent: Содержит события изменения цен: порядковый номер,
+        id товара, старую и новую цену и время получения новой цены.
+
+    AlertRule: Содержит правила оповещения о снижении цены товара:
+        вид правила, порог срабатывания и состояние(взведено или
+        сработало).
+
+    PriceRollup: Содержит агрегаты цен товара по периодам(час, день,
+        неделя, месяц): первую, максимальную, минимальную и последнюю
+        цену, сумму и число записей.
+
 Func:
 
     get_session: Создаёт асинхронную сессию,
         для работы с базой данных
 
-    create_tables: Создаёт таблицы в базе данных.
+    create_tables: Создаёт таблицы в базе данных, применяет
+        миграции схемы(MIGRATIONS) к уже существующим таблицам
+        и строит индексы больших таблиц(CONCURRENT_INDEXES).
     delete_tables: Удаляет таблицы из базы данных.
 
+    notify_products: Получает на вход: объект сессии, канал и id
+        товаров, отправляет уведомление(NOTIFY) об их изменении.
+
     add_item_info: Получает на вход:
         название товара, описание товара, рейтинг товара,
         URL от API с общей информацией о товаре,
-        URL от API с информацией о цене товара, объект сессии,
-        сохраняет эти данные в базу, возвращает сообщение об
-        успехе или ошибке и статус код.
+        URL от API с информацией о цене товара, начальную цену,
+        объект сессии, сохраняет эти данные в базу, возвращает
+        сообщение об успехе или ошибке и статус код.
+
+    add_items_info: Получает на вход: список товаров(название,
+        описание, рейтинг, URL, цена) и объект сессии, добавляет их
+        одним запросом вместе с начальными ценами, пропуская товары,
+        уже находящиеся на мониторинге, возвращает id добавленных.
+
+    select_item_by_urls: Получает на вход: URL от API с общей
+        информацией о товаре, URL от API с информацией о цене товара
+        и объект сессии, возвращает id и название товара(dict), если
+        товар с этими URL уже на мониторинге, иначе None.
 
     delete_item: Получает на вход: id товара и объект сессии,
         удаляет товар из базы данных, возвращает сообщение об
@@ -37,22 +65,60 @@ Func:
         проверяет наличие товара в базе данных,
         возвращает булево значение True если товар есть в базе, иначе False.
 
-    select_history_price: Получает на вход: id товара и объект сессии,
-        возвращает историю цен на заданый товар и статус код(dict).
+    select_history_price: Получает на вход: id товара, признак сжатия,
+        период, позицию продолжения, размер страницы и объект сессии,
+        возвращает страницу упорядоченной по времени истории цен
+        на заданый товар, позицию следующей страницы и статус код(dict).
+
+    iter_history: Получает на вход: id товаров, период и размер
+        пачки, читает историю цен курсором на стороне базы данных
+        и отдаёт её пачками фиксированного размера.
+
+    select_all_item: Получает на вход: id последнего полученного товара,
+        размер страницы, список полей и объект сессии, возвращает
+        страницу товаров на мониторинге с запрошенными полями и id
+        для продолжения чтения(dict).
+
+    select_price_events: Получает на вход: позицию последнего
+        прочитанного события, число событий и объект сессии, возвращает
+        следующие события изменения цен в порядке завершения транзакций
+        и позицию для продолжения чтения(dict).
+
+    upsert_rollups: Получает на вход: объект сессии и записанные цены,
+        добавляет их в агрегаты цен по периодам(как мониторинг).
+
+    select_price_ohlc: Получает на вход: id товара, размер периода,
+        время начала и конца, число периодов и объект сессии,
+        возвращает цены товара по периодам(OHLC), собранные
+        из хранимых агрегатов, и начало следующей страницы(dict).
+
+    add_alert_rule: Получает на вход: id товара, вид правила, значение
+        и объект сессии, рассчитывает порог срабатывания и сохраняет
+        правило оповещения, возвращает его id и статус код(dict).
 
-    select_all_item: Получает на вход: объект сессии, возвращает
-        все товары, находящиеся в базе данных то есть на мониторинге(dict).
+    select_alert_rules: Получает на вход: id товара и объект сессии,
+        возвращает правила оповещения товара(или всех товаров)
+        и статус код(dict).
+
+    delete_alert_rule: Получает на вход: id правила и объект сессии,
+        удаляет правило оповещения, возвращает сообщение об
+        успехе или ошибке и статус код.
 """
-from typing import AsyncGenerator
+import base64
+from datetime import datetime, timedelta
+from typing import AsyncGenerator, AsyncIterator, Iterable, Optional
 from fastapi import Depends
-from sqlalchemy import (Column, DateTime, ForeignKey,
-                        Integer, String, Float, select)
+from sqlalchemy import (BigInteger, Boolean, Column, DateTime, ForeignKey,
+                        Index, Integer, String, Float, case, delete,
+                        select, text, tuple_)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import (
     create_async_engine, AsyncSession)
 from sqlalchemy.orm import sessionmaker, relationship, DeclarativeBase
 from sqlalchemy import func
 
-from config import (DB_USER, DB_PASS, DB_HOST, DB_NAME)
+from config import (DB_USER, DB_PASS, DB_HOST, DB_NAME, PRICE_ROLLUPS)
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}"
 engine = create_async_engine(DATABASE_URL)
@@ -79,9 +145,16 @@ class Product(Base):
         rating: Рейтинг товара.
         url_info: Ссылка на API с общей информацией о товаре.
         url_price: Ссылка на API с информацией о цене товара.
+        next_check_at: Время следующей проверки цены товара.
+        lease_owner: Экземпляр мониторинга, арендовавший товар.
+        lease_expires_at: Время окончания аренды товара.
         price_history: Связь с таблицей истории цен на товар.
     """
     __tablename__ = "products"
+    # Повторное добавление товара находится по индексу, без запроса
+    # к магазину.
+    __table_args__ = (Index("ix_products_urls", "url_info", "url_price",
+                            unique=True),)
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
@@ -89,6 +162,9 @@ class Product(Base):
     rating = Column(Float)
     url_info = Column(String, nullable=False)
     url_price = Column(String, nullable=False)
+    next_check_at = Column(DateTime, default=func.now())
+    lease_owner = Column(String)
+    lease_expires_at = Column(DateTime)
 
     price_history = relationship("PriceHistory",
                                  back_populates="product",
@@ -108,6 +184,9 @@ class PriceHistory(Base):
         product: Связь с таблицей общей информации о продукте.
     """
     __tablename__ = "price_history"
+    # Чтение истории товара по времени и постраничная выборка.
+    __table_args__ = (Index("ix_price_history_product_time",
+                            "product_id", "timestamp", "id"),)
 
     id = Column(Integer, primary_key=True)
     product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
@@ -117,10 +196,236 @@ class PriceHistory(Base):
     product = relationship("Product", back_populates="price_history")
 
 
+# Номер текущей транзакции(xid8) как BIGINT.
+PRICE_EVENTS_TXID = "pg_current_xact_id()::text::bigint"
+
+
+class PriceEvent(Base):
+    """
+    Таблица событий изменения цен(outbox для подписчиков).
+
+    Args:
+
+        seq: Порядковый номер события.
+        txid: Номер транзакции, записавшей событие, вместе с seq
+            задаёт порядок чтения событий подписчиками.
+        product_id: id продукта.
+        old_price: Предыдущая цена продукта.
+        new_price: Новая цена продукта.
+        timestamp: Время получения новой цены.
+    """
+    __tablename__ = "price_events"
+    # Чтение событий по порядку завершения транзакций.
+    __table_args__ = (Index("ix_price_events_txid", "txid", "seq"),)
+
+    seq = Column(BigInteger, primary_key=True)
+    txid = Column(BigInteger, nullable=False,
+                  server_default=text(PRICE_EVENTS_TXID))
+    product_id = Column(Integer, nullable=False)
+    old_price = Column(Float, nullable=False)
+    new_price = Column(Float, nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+
+
+# Канал NOTIFY, в который отправляется уведомление о новых событиях.
+PRICE_EVENTS_CHANNEL = "price_events"
+
+
+# Каналы NOTIFY, по которым HTTP API сбрасывает кэш ответов: новые
+# цены товаров и добавление или удаление товаров(id через запятую).
+# По PRODUCTS_CHANNEL мониторинг обновляет расписание проверок.
+PRICE_TICKS_CHANNEL = "price_ticks"
+PRODUCTS_CHANNEL = "products_changed"
+# Максимальный размер уведомления(ограничение PostgreSQL - 8000 байт).
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+
+class AlertRule(Base):
+    """
+    Таблица правил оповещения о снижении цены.
+
+    Args:
+
+        id: id правила.
+        product_id: id продукта.
+        kind: Вид правила: "below" - цена ниже value,
+            "drop_pct" - цена снизилась на value процентов от цены
+            на момент создания правила.
+        value: Порог цены или процент снижения.
+        threshold: Цена, при которой срабатывает правило.
+        armed: Правило взведено: сработает, когда цена опустится
+            до threshold. После срабатывания снимается и взводится
+            снова, когда цена поднимется выше threshold.
+        fired_at: Время последнего срабатывания.
+        fired_price: Цена при последнем срабатывании.
+        created_at: Время создания правила.
+    """
+    __tablename__ = "alert_rules"
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer,
+                        ForeignKey('products.id', ondelete="CASCADE"),
+                        nullable=False, index=True)
+    kind = Column(String, nullable=False)
+    value = Column(Float, nullable=False)
+    threshold = Column(Float, nullable=False)
+    armed = Column(Boolean, nullable=False, default=True)
+    fired_at = Column(DateTime)
+    fired_price = Column(Float)
+    created_at = Column(DateTime, default=func.now())
+
+
+# Канал NOTIFY, в который отправляются сработавшие правила оповещения.
+PRICE_ALERTS_CHANNEL = "price_alerts"
+
+
+class PriceRollup(Base):
+    """
+    Таблица агрегатов цен товара по периодам(OHLC).
+
+    Args:
+
+        product_id: id продукта.
+        bucket: Размер периода из ROLLUP_BUCKETS.
+        bucket_start: Начало периода(date_trunc времени записи).
+        open: Первая цена периода.
+        high: Максимальная цена периода.
+        low: Минимальная цена периода.
+        close: Последняя цена периода.
+        open_at: Время первой цены периода.
+        close_at: Время последней цены периода.
+        price_sum: Сумма цен записей периода.
+        count: Число записей периода.
+    """
+    __tablename__ = "price_rollups"
+
+    product_id = Column(Integer,
+                        ForeignKey('products.id', ondelete="CASCADE"),
+                        primary_key=True)
+    bucket = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    open_at = Column(DateTime, nullable=False)
+    close_at = Column(DateTime, nullable=False)
+    price_sum = Column(Float, nullable=False)
+    count = Column(Integer, nullable=False)
+
+
+# Размеры периодов, по которым хранятся агрегаты цен.
+ROLLUP_BUCKETS = ("hour", "day", "week", "month")
+# Число строк агрегатов в одном запросе(ограничение числа
+# параметров запроса asyncpg).
+ROLLUP_UPSERT_CHUNK = 2000
+
+
+# Идемпотентные миграции для таблиц, созданных прошлыми версиями сервиса.
+MIGRATIONS = [
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS next_check_at TIMESTAMP",
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS lease_owner VARCHAR",
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP",
+    # Без уникального индекса не работают проверка повторного
+    # добавления товара и массовая загрузка. Повторно добавленные
+    # товары прошлых версий объединяются в товар с меньшим id: к нему
+    # переносятся история цен, события, правила оповещения и агрегаты,
+    # лишние товары удаляются, мониторинг получает их id
+    # по PRODUCTS_CHANNEL и убирает из расписания.
+    f"""
+    DO $$
+    DECLARE merged text;
+    BEGIN
+        IF to_regclass('ix_products_urls') IS NOT NULL THEN
+            RETURN;
+        END IF;
+        CREATE TEMP TABLE products_merge ON COMMIT DROP AS
+            SELECT id, keep_id
+            FROM (SELECT id, min(id) OVER (PARTITION BY url_info,
+                                                        url_price) AS keep_id
+                  FROM products) AS groups
+            WHERE id <> keep_id;
+        UPDATE price_history AS h SET product_id = m.keep_id
+            FROM products_merge AS m WHERE h.product_id = m.id;
+        UPDATE price_events AS e SET product_id = m.keep_id
+            FROM products_merge AS m WHERE e.product_id = m.id;
+        UPDATE alert_rules AS r SET product_id = m.keep_id
+            FROM products_merge AS m WHERE r.product_id = m.id;
+        -- Слияние периодов то же, что в upsert_rollups, агрегаты
+        -- удаляемых товаров удаляются вместе с ними(ON DELETE CASCADE).
+        INSERT INTO price_rollups AS r
+            (product_id, bucket, bucket_start, open, high, low, close,
+             open_at, close_at, price_sum, count)
+        SELECT m.keep_id, d.bucket, d.bucket_start,
+               (array_agg(d.open ORDER BY d.open_at))[1],
+               max(d.high), min(d.low),
+               (array_agg(d.close ORDER BY d.close_at DESC))[1],
+               min(d.open_at), max(d.close_at),
+               sum(d.price_sum), sum(d.count)
+        FROM price_rollups AS d
+        JOIN products_merge AS m ON d.product_id = m.id
+        GROUP BY m.keep_id, d.bucket, d.bucket_start
+        ON CONFLICT (product_id, bucket, bucket_start) DO UPDATE SET
+            open = CASE WHEN excluded.open_at < r.open_at
+                        THEN excluded.open ELSE r.open END,
+            open_at = least(r.open_at, excluded.open_at),
+            close = CASE WHEN excluded.close_at >= r.close_at
+                         THEN excluded.close ELSE r.close END,
+            close_at = greatest(r.close_at, excluded.close_at),
+            high = greatest(r.high, excluded.high),
+            low = least(r.low, excluded.low),
+            price_sum = r.price_sum + excluded.price_sum,
+            count = r.count + excluded.count;
+        DELETE FROM products AS p
+            USING products_merge AS m WHERE p.id = m.id;
+        FOR merged IN
+            SELECT string_agg(id::text, ',')
+            FROM (SELECT id, (row_number() OVER (ORDER BY id) - 1) / 500
+                             AS part
+                  FROM products_merge) AS parts
+            GROUP BY part
+        LOOP
+            PERFORM pg_notify('{PRODUCTS_CHANNEL}', merged);
+        END LOOP;
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_products_urls
+            ON products (url_info, url_price);
+    END $$
+    """,
+    # События, записанные до появления txid, читаются первыми
+    # по seq(txid = 0).
+    "ALTER TABLE price_events ADD COLUMN IF NOT EXISTS txid BIGINT "
+    "NOT NULL DEFAULT 0",
+    f"ALTER TABLE price_events ALTER COLUMN txid "
+    f"SET DEFAULT {PRICE_EVENTS_TXID}",
+]
+# Индексы больших таблиц строятся без блокировки записи(CONCURRENTLY)
+# после миграций: такой запрос нельзя выполнить в транзакции.
+CONCURRENT_INDEXES = {
+    "ix_price_history_product_time":
+        "ON price_history (product_id, timestamp, id)",
+    "ix_price_events_txid": "ON price_events (txid, seq)",
+}
+
+
 async def create_tables() -> None:
-    """Функция создания таблиц."""
+    """Функция создания таблиц и применения миграций."""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        for migration in MIGRATIONS:
+            await conn.execute(text(migration))
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for name, definition in CONCURRENT_INDEXES.items():
+            # Прерванное построение оставляет нерабочий индекс,
+            # IF NOT EXISTS его бы пропустил.
+            invalid = await conn.scalar(text(
+                "SELECT NOT indisvalid FROM pg_index "
+                "WHERE indexrelid = to_regclass(:name)"), {"name": name})
+            if invalid:
+                await conn.execute(text(f"DROP INDEX CONCURRENTLY {name}"))
+            await conn.execute(text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                f"{definition}"))
 
 
 async def delete_tables() -> None:
@@ -135,9 +440,41 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
+async def notify_products(session: AsyncSession, channel: str,
+                          product_ids: Iterable[int]) -> None:
+    """
+    Функция уведомления об изменении товаров.
+
+    Args:
+
+        session: Асинхронная сессия для базы данных.
+        channel: Канал NOTIFY.
+        product_ids: id изменившихся товаров.
+
+    Notes:
+
+        id передаются через запятую, длинный список делится на
+        несколько уведомлений. Уведомления доставляются при COMMIT,
+        при откате транзакции не отправляются.
+    """
+    chunk: list[str] = []
+    size = 0
+    for product_id in sorted(set(product_ids)):
+        value = str(product_id)
+        if chunk and size + len(value) > NOTIFY_PAYLOAD_LIMIT:
+            await session.execute(select(func.pg_notify(channel,
+                                                        ",".join(chunk))))
+            chunk, size = [], 0
+        chunk.append(value)
+        size += len(value) + 1
+    if chunk:
+        await session.execute(select(func.pg_notify(channel,
+                                                    ",".join(chunk))))
+
+
 async def add_item_info(name: str, description: str,
                         rating: float, url_info: str,
-                        url_price: str,
+                        url_price: str, price: Optional[float] = None,
                         session: AsyncSession = Depends(get_session)) -> dict:
     """
     Функция добавления товара.
@@ -149,12 +486,20 @@ async def add_item_info(name: str, description: str,
         rating: Рейтинг товара.
         url_info: Ссылка на API с общей информацией о товаре.
         url_price: Ссылка на API с информацией о цене товара.
+        price: Цена, полученная при добавлении, сохраняется в историю
+            цен и агрегаты цен в той же транзакции.
         session: Асинхронная сессия для базы данных.
 
     Returns:
 
         Добавляет информацию о товаре в базе данных,
         возвращает сообщение об успехе или ошибке и статус код.
+
+    Notes:
+
+        Если товар с теми же URL добавлен одновременно(другим
+        процессом), срабатывает уникальный индекс и возвращается
+        сообщение о том, что товар уже на мониторинге.
     """
     result = Product(name=name, description=description,
                      rating=rating, url_info=url_info, url_price=url_price)
@@ -163,8 +508,25 @@ async def add_item_info(name: str, description: str,
         result.name and result.description and
         result.rating and result.url_info and result.url_price
     ):
+        timestamp = datetime.now()
+        if price is not None:
+            result.price_history.append(PriceHistory(price=price,
+                                                     timestamp=timestamp))
         session.add(result)
-        await session.commit()
+        try:
+            await session.flush()
+            if price is not None and PRICE_ROLLUPS:
+                await upsert_rollups(session=session, rows=[{
+                    "product_id": result.id, "price": price,
+                    "timestamp": timestamp}])
+            await notify_products(session=session,
+                                  channel=PRODUCTS_CHANNEL,
+                                  product_ids=[result.id])
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            return {"message": f"Товар {name} уже на мониторинге!",
+                    "status_code": 200}
         return {"message": f"Товар {name} добавлен!", "status_code": 200}
     else:
         return {"message": "Проблемы с добавлением товара, "
@@ -172,6 +534,79 @@ async def add_item_info(name: str, description: str,
                 "status_code": 422}
 
 
+async def add_items_info(
+        items: list[dict],
+        session: AsyncSession = Depends(get_session)
+) -> dict[tuple[str, str], int]:
+    """
+    Функция пакетного добавления товаров.
+
+    Args:
+
+        items: Товары: словари с name, description, rating, url_info,
+            url_price и price.
+        session: Асинхронная сессия для базы данных.
+
+    Returns:
+
+        Возвращает словарь {(url_info, url_price): id товара} только
+        для добавленных товаров. Товары, уже находящиеся на мониторинге
+        (в том числе добавленные одновременно), пропускаются по
+        уникальному индексу URL. Начальные цены добавляются в историю
+        и агрегаты цен в той же транзакции.
+    """
+    if not items:
+        return {}
+    result = await session.execute(
+        insert(Product)
+        .values([{"name": item["name"],
+                  "description": item["description"],
+                  "rating": item["rating"],
+                  "url_info": item["url_info"],
+                  "url_price": item["url_price"]} for item in items])
+        .on_conflict_do_nothing(index_elements=["url_info", "url_price"])
+        .returning(Product.id, Product.url_info, Product.url_price))
+    added = {(row.url_info, row.url_price): row.id for row in result}
+    timestamp = datetime.now()
+    prices = [{"product_id": added[(item["url_info"], item["url_price"])],
+               "price": item["price"], "timestamp": timestamp}
+              for item in items
+              if (item["url_info"], item["url_price"]) in added]
+    if prices:
+        await session.execute(insert(PriceHistory), prices)
+        if PRICE_ROLLUPS:
+            await upsert_rollups(session=session, rows=prices)
+        await notify_products(session=session, channel=PRODUCTS_CHANNEL,
+                              product_ids=added.values())
+    await session.commit()
+    return added
+
+
+async def select_item_by_urls(
+        url_info: str, url_price: str,
+        session: AsyncSession = Depends(get_session)) -> Optional[dict]:
+    """
+    Функция поиска товара по ссылкам на API.
+
+    Args:
+
+        url_info: Ссылка на API с общей информацией о товаре.
+        url_price: Ссылка на API с информацией о цене товара.
+        session: Асинхронная сессия для базы данных.
+
+    Returns:
+
+        Возвращает словарь с id и названием товара, иначе None.
+    """
+    result = await session.execute(
+        select(Product.id, Product.name)
+        .filter_by(url_info=url_info, url_price=url_price))
+    row = result.first()
+    if row is None:
+        return None
+    return {"id": row.id, "name": row.name}
+
+
 async def delete_item(product_id: int,
                       session: AsyncSession = Depends(get_session)) -> dict:
     """
@@ -193,6 +628,9 @@ async def delete_item(product_id: int,
         product = result.first()
         if product:
             await session.delete(product)
+            await notify_products(session=session,
+                                  channel=PRODUCTS_CHANNEL,
+                                  product_ids=[product_id])
             await session.commit()
             return {"message": f"Товар с id: {product_id} удалён!",
                     "status_code": 200}
@@ -221,8 +659,29 @@ async def select_item(product_id: int,
     return bool(result.first())
 
 
+def _encode_cursor(timestamp: datetime, record_id: int) -> str:
+    """Кодирует позицию записи истории в строку для next."""
+    raw = f"{timestamp.isoformat()}|{record_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Раскодирует позицию записи истории, ValueError при ошибке."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, record_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(record_id)
+    except (ValueError, UnicodeDecodeError) as ex:
+        raise ValueError(f"Неверный cursor: {cursor}") from ex
+
+
 async def select_history_price(
         product_id: int,
+        compact: bool = False,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
         session: AsyncSession = Depends(get_session)) -> dict:
     """
     Функция получения истории цен товара.
@@ -230,45 +689,516 @@ async def select_history_price(
     Args:
 
         product_id: id товара
+        compact: Убрать записи, повторяющие предыдущую цену.
+        date_from: Начало периода(включительно).
+        date_to: Конец периода(не включительно).
+        cursor: Позиция продолжения чтения(next из прошлого ответа).
+        limit: Максимальное число записей, по умолчанию все.
         session: Асинхронная сессия для базы данных.
 
     Returns:
 
         Возвращает историю цен на товар и время появления этих цен в базе,
+        позицию next для следующей страницы(None на последней),
         так же возвращает статус код, иначе возвращает
         сообщение об ошибке и статус кода.
+
+    Notes:
+
+        История упорядочена по времени и описывает ступенчатую функцию:
+        цена действует с момента записи до следующей записи. Монитор
+        может хранить только изменения цены и контрольные записи,
+        при compact=True контрольные записи не возвращаются.
+
+        Записи читаются по индексу (product_id, timestamp, id) с позиции
+        cursor, поэтому стоимость запроса зависит от размера страницы,
+        а не от длины истории. При compact=True limit ограничивает
+        прочитанные записи, и на странице их может быть меньше.
     """
-    result = await session.scalars(
-        select(PriceHistory).filter_by(product_id=product_id))
-    if result is not None:
-        history = [{"product_id": res.product_id,
-                    "price": res.price,
-                    "date": res.timestamp} for res in result]
-        return {"message": history, "status_code": 200}
-    else:
-        return {"message": f"Товар с id: {product_id} не найден!",
-                "status_code": 422}
+    query = select(PriceHistory).where(PriceHistory.product_id == product_id)
+    if date_from is not None:
+        query = query.where(PriceHistory.timestamp >= date_from)
+    if date_to is not None:
+        query = query.where(PriceHistory.timestamp < date_to)
+    previous = None
+    if cursor is not None:
+        try:
+            position = _decode_cursor(cursor)
+        except ValueError as ex:
+            return {"message": str(ex), "status_code": 422}
+        query = query.where(tuple_(PriceHistory.timestamp,
+                                   PriceHistory.id) > position)
+        if compact:
+            # Цена последней записи прошлой страницы.
+            previous = await session.scalar(
+                select(PriceHistory.price)
+                .where(PriceHistory.product_id == product_id,
+                       tuple_(PriceHistory.timestamp,
+                              PriceHistory.id) <= position)
+                .order_by(PriceHistory.timestamp.desc(),
+                          PriceHistory.id.desc()).limit(1))
+    query = query.order_by(PriceHistory.timestamp, PriceHistory.id)
+    if limit is not None:
+        # Лишняя строка показывает, есть ли следующая страница.
+        query = query.limit(limit + 1)
+    rows = list(await session.scalars(query))
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].timestamp, rows[-1].id)
+    history = []
+    for res in rows:
+        if compact and res.price == previous:
+            continue
+        previous = res.price
+        history.append({"product_id": res.product_id,
+                        "price": res.price,
+                        "date": res.timestamp})
+    return {"message": history, "next": next_cursor, "status_code": 200}
+
+
+async def iter_history(
+        product_ids: Optional[list[int]] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        chunk_size: int = 5000) -> AsyncIterator[list[tuple]]:
+    """
+    Функция чтения истории цен пачками.
+
+    Args:
+
+        product_ids: id товаров, по умолчанию все товары.
+        date_from: Начало периода(включительно).
+        date_to: Конец периода(не включительно).
+        chunk_size: Число записей в пачке.
+
+    Yields:
+
+        Пачки записей (id товара, цена, время) по возрастанию id
+        товара и времени.
+
+    Notes:
+
+        Записи читаются курсором на стороне базы данных по индексу
+        (product_id, timestamp, id), в памяти держится одна пачка.
+        Работает со своей сессией, так как читается, пока ответ
+        отправляется клиенту.
+    """
+    query = select(PriceHistory.product_id, PriceHistory.price,
+                   PriceHistory.timestamp)
+    if product_ids:
+        query = query.where(PriceHistory.product_id.in_(product_ids))
+    if date_from is not None:
+        query = query.where(PriceHistory.timestamp >= date_from)
+    if date_to is not None:
+        query = query.where(PriceHistory.timestamp < date_to)
+    query = (query.order_by(PriceHistory.product_id, PriceHistory.timestamp,
+                            PriceHistory.id)
+             .execution_options(yield_per=chunk_size))
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(query)
+        async for rows in result.partitions():
+            yield [tuple(row) for row in rows]
+
+
+# Поля товара, которые можно запросить в списке мониторинга.
+PRODUCT_FIELDS = ("id", "name", "description", "rating")
 
 
 async def select_all_item(
+        after_id: int = 0, limit: Optional[int] = None,
+        fields: tuple[str, ...] = PRODUCT_FIELDS,
         session: AsyncSession = Depends(get_session)) -> dict:
     """
     Функция получения товаров на мониторинге.
 
     Args:
 
+        after_id: id последнего полученного товара(0 - с начала).
+        limit: Максимальное число товаров, по умолчанию все.
+        fields: Поля товара из PRODUCT_FIELDS, id возвращается всегда.
         session: Асинхронная сессия для базы данных.
 
     Returns:
 
-        Возвращает список(словарь) товаров, находящихся на мониторинге
+        Возвращает список(словарь) товаров, находящихся на мониторинге,
+        по возрастанию id и id(next), с которого продолжать чтение,
+        или None, если товаров больше нет.
+
+    Notes:
+
+        Страница читается по первичному ключу(id > after_id), поэтому
+        стоимость запроса не зависит от номера страницы. Из базы
+        читаются только запрошенные поля.
     """
-    result = await session.scalars(select(Product))
-    if result is not None:
-        products = [{"id": res.id, "name": res.name,
-                     "description": res.description,
-                     "rating": round(res.rating, 1)} for res in result]
-        return {"message": products, "status_code": 200}
-    else:
-        return {"message": "Отсутствуют товары на мониторинге!",
+    names = ["id"] + [name for name in fields if name != "id"]
+    query = (select(*(getattr(Product, name) for name in names))
+             .where(Product.id > after_id).order_by(Product.id))
+    if limit is not None:
+        # Лишняя строка показывает, есть ли следующая страница.
+        query = query.limit(limit + 1)
+    rows = (await session.execute(query)).all()
+    next_id = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_id = rows[-1].id
+    products = []
+    for row in rows:
+        product = dict(row._mapping)
+        if "rating" in product:
+            product["rating"] = round(product["rating"], 1)
+        products.append(product)
+    return {"message": products, "next": next_id, "status_code": 200}
+
+
+def _encode_event_cursor(txid: int, seq: int) -> str:
+    """Кодирует позицию события в строку для next."""
+    return f"{txid}.{seq}"
+
+
+def _decode_event_cursor(cursor: str) -> tuple[int, int]:
+    """
+    Раскодирует позицию события, ValueError при ошибке.
+
+    Notes:
+
+        Число без точки - номер события из ответов до появления txid,
+        все такие события записаны с txid = 0.
+    """
+    txid, _, seq = cursor.rpartition(".")
+    txid, seq = int(txid or 0), int(seq)
+    if txid < 0 or seq < 0:
+        raise ValueError(f"Неверный cursor: {cursor}")
+    return txid, seq
+
+
+async def select_price_events(
+        after: str, limit: int,
+        session: AsyncSession = Depends(get_session)) -> dict:
+    """
+    Функция получения событий изменения цен.
+
+    Args:
+
+        after: Позиция последнего прочитанного события(next
+            из прошлого ответа, "0" - с начала).
+        limit: Максимальное число событий.
+        session: Асинхронная сессия для базы данных.
+
+    Returns:
+
+        Возвращает события после позиции after в порядке завершения
+        записавших их транзакций и позицию(next), с которой продолжать
+        чтение, либо сообщение об ошибке и статус код 422.
+
+    Notes:
+
+        Отдаются только события транзакций с номером меньше xmin
+        текущего снимка: все такие транзакции уже завершены, и новых
+        событий с меньшей позицией не появится. Поэтому события
+        нескольких процессов и экземпляров мониторинга, записанные
+        параллельно, не пропускаются: каждое событие отдаётся ровно
+        один раз, если клиент продолжает чтение с next. Порядок seq
+        внутри ответа не обязан возрастать. Долгая транзакция
+        в базе данных задерживает события, записанные после её
+        начала, до своего завершения.
+    """
+    try:
+        txid, seq = _decode_event_cursor(after)
+    except ValueError:
+        return {"message": f"Неверный after: {after}",
                 "status_code": 422}
+    result = await session.scalars(
+        select(PriceEvent)
+        .where(tuple_(PriceEvent.txid, PriceEvent.seq) > (txid, seq),
+               PriceEvent.txid < text(
+                   "pg_snapshot_xmin(pg_current_snapshot())::text::bigint"))
+        .order_by(PriceEvent.txid, PriceEvent.seq).limit(limit))
+    events, last = [], None
+    for event in result:
+        last = event
+        events.append({"seq": event.seq,
+                       "product_id": event.product_id,
+                       "old_price": event.old_price,
+                       "new_price": event.new_price,
+                       "date": event.timestamp})
+    return {"message": {"events": events,
+                        "next": (_encode_event_cursor(last.txid, last.seq)
+                                 if last is not None else
+                                 _encode_event_cursor(txid, seq))},
+            "status_code": 200}
+
+
+# Единицы размера периода OHLC: (размер хранимых агрегатов,
+# число хранимых периодов в одной единице).
+OHLC_UNITS = {"h": ("hour", 1), "d": ("day", 1), "w": ("week", 1),
+              "mo": ("month", 1), "y": ("month", 12)}
+# Понедельник, от которого отсчитываются недели.
+_EPOCH = datetime(1970, 1, 5)
+
+
+def _rollup_start(timestamp: datetime, bucket: str) -> datetime:
+    """Начало хранимого периода, как date_trunc в PostgreSQL."""
+    start = timestamp.replace(minute=0, second=0, microsecond=0)
+    if bucket == "hour":
+        return start
+    start = start.replace(hour=0)
+    if bucket == "week":
+        return start - timedelta(days=start.weekday())
+    if bucket == "month":
+        return start.replace(day=1)
+    return start
+
+
+def _aggregate_rollups(rows: list[dict]) -> list[dict]:
+    """Сворачивает записи цен в строки агрегатов по всем периодам."""
+    rollups: dict[tuple, dict] = {}
+    for row in rows:
+        price, timestamp = row["price"], row["timestamp"]
+        for bucket in ROLLUP_BUCKETS:
+            key = (row["product_id"], bucket,
+                   _rollup_start(timestamp, bucket))
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollups[key] = {
+                    "product_id": key[0], "bucket": bucket,
+                    "bucket_start": key[2], "open": price, "high": price,
+                    "low": price, "close": price, "open_at": timestamp,
+                    "close_at": timestamp, "price_sum": price, "count": 1}
+                continue
+            if timestamp < rollup["open_at"]:
+                rollup["open"], rollup["open_at"] = price, timestamp
+            if timestamp >= rollup["close_at"]:
+                rollup["close"], rollup["close_at"] = price, timestamp
+            rollup["high"] = max(rollup["high"], price)
+            rollup["low"] = min(rollup["low"], price)
+            rollup["price_sum"] += price
+            rollup["count"] += 1
+    return list(rollups.values())
+
+
+async def upsert_rollups(session: AsyncSession, rows: list[dict]) -> int:
+    """
+    Функция добавления цен в агрегаты.
+
+    Args:
+
+        session: Асинхронная сессия для базы данных.
+        rows: Записанные цены(product_id, price, timestamp)
+            в порядке вставки.
+
+    Returns:
+
+        Возвращает количество изменённых строк агрегатов.
+
+    Notes:
+
+        Тот же запрос, что и upsert_rollups мониторинга
+        (CHECK_PRICE_API/database/rollups.py), поэтому агрегаты
+        не зависят от того, каким сервисом записана цена. Не делает
+        commit: вызывайте в транзакции записи цен.
+    """
+    rollups = _aggregate_rollups(rows)
+    table = PriceRollup.__table__
+    for index in range(0, len(rollups), ROLLUP_UPSERT_CHUNK):
+        query = insert(table).values(
+            rollups[index:index + ROLLUP_UPSERT_CHUNK])
+        new = query.excluded
+        await session.execute(query.on_conflict_do_update(
+            index_elements=["product_id", "bucket", "bucket_start"],
+            set_={
+                "open": case((new.open_at < table.c.open_at, new.open),
+                             else_=table.c.open),
+                "open_at": func.least(table.c.open_at, new.open_at),
+                "close": case((new.close_at >= table.c.close_at, new.close),
+                              else_=table.c.close),
+                "close_at": func.greatest(table.c.close_at, new.close_at),
+                "high": func.greatest(table.c.high, new.high),
+                "low": func.least(table.c.low, new.low),
+                "price_sum": table.c.price_sum + new.price_sum,
+                "count": table.c.count + new.count}))
+    return len(rollups)
+
+
+def _group_start(start: datetime, unit: str, size: int) -> datetime:
+    """Начало запрошенного периода, в который попадает start."""
+    if unit in ("mo", "y"):
+        months = size * OHLC_UNITS[unit][1]
+        index = (start.year * 12 + start.month - 1) // months * months
+        return datetime(index // 12, index % 12 + 1, 1)
+    step = {"h": timedelta(hours=size), "d": timedelta(days=size),
+            "w": timedelta(weeks=size)}[unit]
+    return _EPOCH + (start - _EPOCH) // step * step
+
+
+async def select_price_ohlc(
+        product_id: int, unit: str, size: int,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        limit: int = 500,
+        session: AsyncSession = Depends(get_session)) -> dict:
+    """
+    Функция получения цен товара по периодам(OHLC).
+
+    Args:
+
+        product_id: id товара.
+        unit: Единица периода из OHLC_UNITS(h, d, w, mo, y).
+        size: Число единиц в периоде.
+        date_from: Начало(выравнивается на начало периода).
+        date_to: Конец(не включительно), по времени начала
+            хранимых периодов.
+        limit: Максимальное число периодов.
+        session: Асинхронная сессия для базы данных.
+
+    Returns:
+
+        Возвращает периоды по возрастанию начала: первую, максимальную,
+        минимальную, последнюю и среднюю цену и число записей,
+        и начало следующего периода next(передайте его в date_from)
+        или None, если периодов больше нет.
+
+    Notes:
+
+        Периоды собираются из хранимых агрегатов(price_rollups)
+        ближайшего размера, поэтому читается не больше
+        limit * size строк(для лет - limit * 12 * size), сколько бы
+        записей ни было в истории.
+    """
+    bucket, per_unit = OHLC_UNITS[unit]
+    per_group = size * per_unit
+    query = select(PriceRollup).where(PriceRollup.product_id == product_id,
+                                      PriceRollup.bucket == bucket)
+    if date_from is not None:
+        start = _group_start(_rollup_start(date_from, bucket), unit, size)
+        query = query.where(PriceRollup.bucket_start >= start)
+    if date_to is not None:
+        query = query.where(PriceRollup.bucket_start < date_to)
+    rows = await session.scalars(
+        query.order_by(PriceRollup.bucket_start)
+        .limit(limit * per_group + 1))
+    groups: list[dict] = []
+    for row in rows:
+        start = _group_start(row.bucket_start, unit, size)
+        if groups and groups[-1]["start"] == start:
+            group = groups[-1]
+            group["high"] = max(group["high"], row.high)
+            group["low"] = min(group["low"], row.low)
+            group["close"] = row.close
+            group["sum"] += row.price_sum
+            group["count"] += row.count
+        else:
+            groups.append({"start": start, "open": row.open,
+                           "high": row.high, "low": row.low,
+                           "close": row.close, "sum": row.price_sum,
+                           "count": row.count})
+    # В группе не больше per_group строк, поэтому при лишней строке
+    # групп больше limit и первые limit прочитаны целиком.
+    next_start = None
+    if len(groups) > limit:
+        next_start = groups[limit]["start"]
+        groups = groups[:limit]
+    for group in groups:
+        group["avg"] = round(group.pop("sum") / group["count"], 2)
+    return {"message": groups, "next": next_start, "status_code": 200}
+
+
+async def add_alert_rule(
+        product_id: int, kind: str, value: float,
+        session: AsyncSession = Depends(get_session)) -> dict:
+    """
+    Функция добавления правила оповещения.
+
+    Args:
+
+        product_id: id товара.
+        kind: Вид правила("below" или "drop_pct").
+        value: Порог цены или процент снижения.
+        session: Асинхронная сессия для базы данных.
+
+    Returns:
+
+        Возвращает id правила и порог срабатывания, иначе
+        сообщение об ошибке и статус код.
+
+    Notes:
+
+        Для "drop_pct" порог считается от последней известной цены
+        товара, поэтому правило можно добавить только после первой
+        проверки цены мониторингом.
+    """
+    threshold = value
+    if kind == "drop_pct":
+        price = await session.scalar(
+            select(PriceHistory.price).filter_by(product_id=product_id)
+            .order_by(PriceHistory.timestamp.desc(),
+                      PriceHistory.id.desc()).limit(1))
+        if price is None:
+            return {"message": f"Цена товара с id: {product_id} "
+                    "ещё не получена!",
+                    "status_code": 422}
+        threshold = round(price * (1 - value / 100), 2)
+    rule = AlertRule(product_id=product_id, kind=kind, value=value,
+                     threshold=threshold, armed=True)
+    session.add(rule)
+    await session.commit()
+    return {"message": {"id": rule.id, "threshold": threshold},
+            "status_code": 200}
+
+
+async def select_alert_rules(
+        product_id: Optional[int] = None,
+        session: AsyncSession = Depends(get_session)) -> dict:
+    """
+    Функция получения правил оповещения.
+
+    Args:
+
+        product_id: id товара, по умолчанию правила всех товаров.
+        session: Асинхронная сессия для базы данных.
+
+    Returns:
+
+        Возвращает список правил(вид, значение, порог, состояние,
+        время и цена последнего срабатывания) и статус код.
+    """
+    query = select(AlertRule).order_by(AlertRule.id)
+    if product_id is not None:
+        query = query.filter_by(product_id=product_id)
+    result = await session.scalars(query)
+    rules = [{"id": rule.id, "product_id": rule.product_id,
+              "kind": rule.kind, "value": rule.value,
+              "threshold": rule.threshold, "armed": rule.armed,
+              "fired_at": rule.fired_at, "fired_price": rule.fired_price}
+             for rule in result]
+    return {"message": rules, "status_code": 200}
+
+
+async def delete_alert_rule(
+        rule_id: int,
+        session: AsyncSession = Depends(get_session)) -> dict:
+    """
+    Функция удаления правила оповещения.
+
+    Args:
+
+        rule_id: id правила.
+        session: Асинхронная сессия для базы данных.
+
+    Returns:
+
+        Возвращает сообщение об успехе или ошибке и статус код.
+
+    Notes:
+
+        Мониторинг перестаёт проверять правило при следующей
+        загрузке правил(SCHEDULER_REFRESH).
+    """
+    result = await session.execute(
+        delete(AlertRule).where(AlertRule.id == rule_id))
+    await session.commit()
+    if result.rowcount:
+        return {"message": f"Правило с id: {rule_id} удалено!",
+                "status_code": 200}
+    return {"message": f"Правило с id: {rule_id} не найдено!",
+            "status_code": 422}
@@ -0,0 +1,176 @@
+"""
+Модуль подписки на события изменения цен.
+
+Classes:
+
+    PriceEventNotifier: Держит одно соединение с базой данных,
+        подписанное(LISTEN) на канал событий изменения цен,
+        и будит ожидающие запросы при каждом уведомлении.
+        На том же соединении получает уведомления о новых ценах
+        и изменении товаров и передаёт их обработчикам(кэшу ответов).
+
+Func:
+
+    get_notifier: Возвращает общий для сервиса объект подписки.
+
+    close_notifier: Закрывает соединение подписки при остановке сервиса.
+"""
+import asyncio
+import logging
+from typing import Callable, Optional
+
+import asyncpg
+
+from config import DB_USER, DB_PASS, DB_HOST, DB_NAME
+from database.FDataBase import (PRICE_EVENTS_CHANNEL, PRICE_TICKS_CHANNEL,
+                                PRODUCTS_CHANNEL)
+
+
+logger = logging.getLogger(__name__)
+
+DATABASE_DSN = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}"
+
+
+class PriceEventNotifier:
+    """
+    Подписка на уведомления о новых событиях изменения цен.
+
+    Notes:
+
+        Соединение открывается при первом запросе и переоткрывается
+        после разрыва. Если подписаться не удалось, ожидание просто
+        длится до таймаута, и клиент повторяет запрос.
+
+        Пока соединение было закрыто, уведомления терялись, поэтому
+        при его открытии и разрыве вызываются обработчики сброса
+        (add_reset_handler).
+    """
+
+    def __init__(self) -> None:
+        self._conn: Optional[asyncpg.Connection] = None
+        self._lock = asyncio.Lock()
+        self._event = asyncio.Event()
+        self._handlers: dict[str, list[Callable[[str], None]]] = {}
+        self._reset_handlers: list[Callable[[], None]] = []
+
+    def add_handler(self, channel: str,
+                    handler: Callable[[str], None]) -> None:
+        """
+        Добавляет обработчик уведомлений канала.
+
+        Args:
+
+            channel: PRICE_TICKS_CHANNEL или PRODUCTS_CHANNEL.
+            handler: Функция, получающая текст уведомления.
+        """
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def add_reset_handler(self, handler: Callable[[], None]) -> None:
+        """Добавляет обработчик открытия и разрыва соединения."""
+        self._reset_handlers.append(handler)
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    def _on_change(self, connection, pid, channel, payload) -> None:
+        for handler in self._handlers.get(channel, []):
+            handler(payload)
+
+    def _reset(self, connection=None) -> None:
+        for handler in self._reset_handlers:
+            handler()
+
+    @property
+    def listening(self) -> bool:
+        """Соединение подписки открыто."""
+        return self._conn is not None and not self._conn.is_closed()
+
+    async def listen(self) -> bool:
+        """Подписывается на каналы, возвращает True при успехе."""
+        if self.listening:
+            return True
+        async with self._lock:
+            if self.listening:
+                return True
+            try:
+                self._conn = await asyncpg.connect(DATABASE_DSN)
+                await self._conn.add_listener(PRICE_EVENTS_CHANNEL,
+                                              self._on_notify)
+                for channel in (PRICE_TICKS_CHANNEL, PRODUCTS_CHANNEL):
+                    await self._conn.add_listener(channel, self._on_change)
+                self._conn.add_termination_listener(self._reset)
+            except Exception as ex:
+                logger.error(f"Ошибка подписки на события цен: {ex}")
+                if self._conn is not None:
+                    self._conn.terminate()
+                self._conn = None
+                return False
+            self._reset()
+            return True
+
+    async def waiter(self) -> Optional[asyncio.Event]:
+        """
+        Возвращает событие, которое сработает при следующем уведомлении.
+
+        Returns:
+
+            Возвращает None, если подписаться на канал не удалось.
+
+        Notes:
+
+            Берите его до чтения событий из базы данных, тогда
+            уведомление, пришедшее между чтением и ожиданием,
+            не будет пропущено.
+        """
+        if not await self.listen():
+            return None
+        return self._event
+
+    async def wait(self, waiter: Optional[asyncio.Event],
+                   timeout: float) -> bool:
+        """
+        Ожидает уведомление о новых событиях.
+
+        Args:
+
+            waiter: Событие, полученное из waiter().
+            timeout: Максимальное время ожидания(сек).
+
+        Returns:
+
+            Возвращает True, если уведомление пришло до таймаута.
+        """
+        if waiter is None:
+            await asyncio.sleep(timeout)
+            return False
+        try:
+            await asyncio.wait_for(waiter.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def close(self) -> None:
+        """Закрывает соединение подписки."""
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+
+
+_notifier: Optional[PriceEventNotifier] = None
+
+
+def get_notifier() -> PriceEventNotifier:
+    """Функция получения общей подписки на события цен."""
+    global _notifier
+    if _notifier is None:
+        _notifier = PriceEventNotifier()
+    return _notifier
+
+
+async def close_notifier() -> None:
+    """Функция закрытия общей подписки на события цен."""
+    global _notifier
+    if _notifier is not None:
+        await _notifier.close()
+        _notifier = None
@@ -3,21 +3,41 @@
 
 Func:
 
+    lifespan: Управляет ресурсами приложения на время его работы,
+        при остановке останавливает задачи добавления товаров,
+        закрывает общий HTTP клиент и подписку на события цен.
     main: Создаёт таблицы в базе данных.
 """
 import asyncio
 import uvicorn
 import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 
 from database.FDataBase import create_tables
+from database.events import close_notifier
+from backend.imports import close_imports
 from routers.router import app_parsing
+from backend.client import get_client, close_client
 from config import SECRET_KEY
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Открывает общий HTTP клиент при старте и закрывает при остановке."""
+    get_client()
+    try:
+        yield
+    finally:
+        await close_imports()
+        await close_client()
+        await close_notifier()
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(app_parsing)
 app.add_middleware(SessionMiddleware,
                    secret_key=SECRET_KEY,
@@ -49,7 +69,9 @@ async def main() -> None:
     try:
         await create_tables()
     except Exception as ex:
-        logger.debug(ex)
+        # Сервис не запускается на схеме, с которой он не работает.
+        logger.error(f"Ошибка создания таблиц и миграций: {ex}")
+        raise
 
 
 if __name__ == "__main__":
@@ -9,8 +9,15 @@ Shemas:
 
     ProductId:
         product_id: id продукта.
+
+    AlertRuleIn:
+        product_id: id продукта.
+        kind: Вид правила оповещения("below" или "drop_pct").
+        value: Порог цены или процент снижения.
 """
-from pydantic import BaseModel, HttpUrl
+from typing import Literal
+
+from pydantic import BaseModel, Field, HttpUrl, model_validator
 
 
 class UrlCheck(BaseModel):
@@ -35,3 +42,26 @@ class ProductId(BaseModel):
         product_id: id товара в базе данных.
     """
     product_id: int
+
+
+class AlertRuleIn(BaseModel):
+    """
+    Модель для валидации правила оповещения о снижении цены.
+
+    Args:
+
+        product_id: id товара в базе данных.
+        kind: "below" - оповестить, когда цена опустится ниже value,
+            "drop_pct" - когда цена снизится на value процентов
+            от текущей.
+        value: Порог цены или процент снижения(0 < value < 100).
+    """
+    product_id: int
+    kind: Literal["below", "drop_pct"]
+    value: float = Field(gt=0)
+
+    @model_validator(mode="after")
+    def check_percent(self) -> "AlertRuleIn":
+        if self.kind == "drop_pct" and self.value >= 100:
+            raise ValueError("Процент снижения должен быть меньше 100")
+        return self
@@ -5,34 +5,145 @@ Func:
 
     add_product: Маршрут добавления товара. Получает на вход:
         валидированные URL и объект сессии, парсит их,
-        добавляет спарсенную информацию в базу данных,
+        добавляет спарсенную информацию и цену в базу данных,
         возвращает сообщение об успехе или об ошибке и статус код.
+        Одновременные запросы с одинаковыми URL выполняются одним
+        запросом к магазину.
 
     delete_product: Маршрут удаление товара. Получает на вход:
         id товара и объект сессии, удаляет товар,
         возвращает сообщение об успехе или об ошибке и статус код.
 
     get_list_monitoring: Маршрут получения товаров, находящихся на мониторинге.
-        Получает на вход: объект сессии, возвращает(dict) со списком товаров
-        и статус кодом, иначе ошибку и статус код.
+        Получает на вход: id последнего полученного товара, размер
+        страницы, список полей и объект сессии, возвращает(dict)
+        страницу товаров, id для следующей страницы и статус код,
+        иначе ошибку и статус код. Ответ кэшируется и отдаётся
+        со строгим ETag.
 
     get_history_price_item: Маршрут получения истории цен, на заданый товар.
-        Получает на вход: id товара и объект сессии, возвращает всю историю цен
-        на товар, в том числе и время добавления цены, а так же и статус код.
+        Получает на вход: id товара, признак сжатия, период, позицию
+        продолжения, размер страницы и объект сессии, возвращает
+        страницу истории цен на товар, в том числе и время
+        добавления цены, позицию следующей страницы и статус код.
+        Ответ кэшируется и отдаётся со строгим ETag.
+
+    get_price_ohlc: Маршрут получения цен товара по периодам(час,
+        день, неделя, месяц, год или их кратные): первой,
+        максимальной, минимальной, последней и средней цены,
+        собранных из хранимых агрегатов.
+
+    export_history: Маршрут выгрузки истории цен. Получает на вход:
+        формат(NDJSON, CSV или двоичные колонки), id товаров и период,
+        отдаёт историю цен потоком, читая её из базы пачками.
+
+    get_rate_limit_state: Маршрут получения состояния ограничителя
+        запросов к МВИДЕО: пауз, ошибок и их причин по хостам.
+
+    get_price_events: Маршрут подписки на события изменения цен.
+        Получает на вход: номер последнего прочитанного события,
+        число событий и время ожидания, возвращает следующие события
+        и номер для продолжения чтения, при отсутствии событий ждёт
+        их появления(long polling).
+
+    import_products: Маршрут пакетного добавления товаров. Получает
+        на вход: список URL товаров(JSON, NDJSON или CSV), проверяет
+        строки по мере чтения и возвращает id задачи, товары
+        добавляются в фоне.
+
+    get_import: Маршрут получения прогресса задачи пакетного
+        добавления и результатов по строкам.
+
+    add_alert: Маршрут добавления правила оповещения о снижении цены.
+        Получает на вход: валидированное правило и объект сессии,
+        возвращает id правила и порог срабатывания.
+
+    get_alerts: Маршрут получения правил оповещения товара(или всех
+        товаров) с их состоянием и последним срабатыванием.
+
+    delete_alert: Маршрут удаления правила оповещения. Получает на вход:
+        id правила и объект сессии, возвращает сообщение об успехе
+        или об ошибке и статус код.
 """
 import logging
-from fastapi import APIRouter, Depends
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.FDataBase import (add_item_info, delete_item,
+from database.FDataBase import (AsyncSessionLocal, select_item_by_urls,
+                                add_item_info, delete_item,
                                 select_history_price, select_item,
-                                get_session, select_all_item)
-from backend.backend import get_html, get_info_item
-from models.model import UrlCheck, ProductId
+                                get_session, select_all_item,
+                                PRODUCT_FIELDS, select_price_ohlc,
+                                select_price_events, add_alert_rule,
+                                select_alert_rules, delete_alert_rule)
+from database.events import get_notifier
+from backend.backend import get_product
+from backend.imports import UPLOAD_FORMATS, get_imports, iter_upload
+from backend.export import EXPORT_FORMATS, iter_export
+from backend.cache import etag_matches, get_cache, make_etag
+from backend.fastjson import dumps
+from backend.singleflight import SingleFlight
+from backend.ratelimit import get_limiter
+from models.model import UrlCheck, ProductId, AlertRuleIn
+from config import (EVENTS_MAX_WAIT, EVENTS_MAX_LIMIT,
+                    LIST_MAX_LIMIT,
+                    HISTORY_MAX_LIMIT,
+                    OHLC_DEFAULT_LIMIT, OHLC_MAX_LIMIT, EXPORT_CHUNK_SIZE)
 
 
 logger = logging.getLogger(__name__)
 app_parsing = APIRouter(prefix="/parsing")
+# Добавления товаров, выполняющиеся сейчас, по паре URL.
+_adding = SingleFlight()
+
+
+async def _fetch_and_add(url_info: str, url_price: str) -> dict:
+    """
+    Функция получения данных и цены товара и его добавления.
+
+    Args:
+
+        url_info: URL от API МВИДЕО c общей ифно о товаре.
+        url_price: URL от API МВИДЕО c ифно о цене товара.
+
+    Returns:
+
+        Возвращает сообщение об успехе или ошибке и статус код.
+
+    Notes:
+
+        Информация и цена запрашиваются одновременно. Работает
+        со своими сессиями, так как результат получают все
+        объединённые запросы, и не держит соединение с базой
+        во время запросов к магазину.
+    """
+    async with AsyncSessionLocal() as session:
+        product = await select_item_by_urls(url_info=url_info,
+                                            url_price=url_price,
+                                            session=session)
+    if product is not None:
+        return {"message": f"Товар {product['name']} уже на мониторинге!",
+                "status_code": 200}
+    data = await get_product(url_info=url_info, url_price=url_price)
+    if data['status_code'] != 200:
+        logger.debug(f"Ошибка при получении данных: {data['error']}")
+        return {"message": f"Ошибка в работе сервиса, {data['error']}",
+                "status_code": 422}
+    async with AsyncSessionLocal() as session:
+        resault = await add_item_info(name=data['name'],
+                                      description=data['description'],
+                                      rating=data['rating'],
+                                      url_info=url_info,
+                                      url_price=url_price,
+                                      price=data['price'],
+                                      session=session)
+    return {"message": resault['message'],
+            'status_code': resault['status_code']}
 
 
 @app_parsing.post("/add_product")
@@ -48,32 +159,25 @@ async def add_product(url: UrlCheck,
 
     returns:
 
-        Добавляет товар в базу данных,
+        Добавляет товар в базу данных вместе с текущей ценой,
         для последующего мониторинга.
-    """
-    data_info = await get_html(url=str(url.url_info))
 
-    if not data_info:
-        return {"message": "Отсутствует ссылка на API с информацией о товаре!",
-                "status_code": 422}
-    elif "error" in data_info:
-        return {"error": data_info["error"],
-                "status_code": 422}
-    else:
-        data = await get_info_item(data_info=data_info['message'])
-        if data['status_code'] == 200:
-            resault = await add_item_info(name=data['name'],
-                                          description=data['description'],
-                                          rating=data['rating'],
-                                          url_info=str(url.url_info),
-                                          url_price=str(url.url_price),
-                                          session=session)
-            return {"message": resault['message'],
-                    'status_code': resault['status_code']}
-        else:
-            logger.debug(f"Ошибка при получении данных: {str(data['error'])}")
-            return {"message": f"Ошибка в работе сервиса, {data['error']}",
-                    "status_code": 422}
+    Notes:
+
+        Товар, уже находящийся на мониторинге, находится по индексу
+        URL без запроса к магазину.
+    """
+    url_info, url_price = str(url.url_info), str(url.url_price)
+    product = await select_item_by_urls(url_info=url_info,
+                                        url_price=url_price,
+                                        session=session)
+    if product is not None:
+        return {"message": f"Товар {product['name']} уже на мониторинге!",
+                "status_code": 200}
+    # Соединение сессии запроса не держим, пока идёт запрос к магазину.
+    await session.close()
+    return await _adding.do((url_info, url_price),
+                            lambda: _fetch_and_add(url_info, url_price))
 
 
 @app_parsing.delete("/delete_product/{item_id}")
@@ -100,48 +204,437 @@ async def delete_product(item_id: int,
         return {"message": "Товар не найден в базе данных."}
 
 
+async def _cached(request: Request, key: tuple,
+                  build: Callable[[], Awaitable[dict]]) -> Response:
+    """
+    Функция получения ответа маршрута из кэша.
+
+    Args:
+
+        request: Запрос, из него берётся заголовок If-None-Match.
+        key: Ключ ответа в кэше, содержит версию данных.
+        build: Функция, собирающая ответ, если его нет в кэше.
+
+    Returns:
+
+        Возвращает JSON ответ со строгим ETag или 304 без тела,
+        если ETag совпал с If-None-Match.
+
+    Notes:
+
+        Кэш используется, только пока открыта подписка
+        на уведомления об изменениях, иначе ответ собирается заново.
+        Кэшируются только успешные ответы(status_code 200).
+    """
+    cache = get_cache()
+    listening = await get_notifier().listen()
+    entry = cache.get(key) if listening else None
+    if entry is None:
+        result = await build()
+        body = dumps(jsonable_encoder(result))
+        etag = make_etag(body)
+        if listening and result.get("status_code") == 200:
+            cache.put(key, body, etag)
+    else:
+        body, etag = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json",
+                    headers=headers)
+
+
 @app_parsing.get("/get_list_monitoring")
 async def get_list_monitoring(
+    request: Request,
+    after_id: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=LIST_MAX_LIMIT),
+    fields: Optional[str] = None,
     session: AsyncSession = Depends(get_session)
-) -> dict:
+) -> Response:
     """
     Функция получения товаров, находящихся на мониторинге.
 
+    Args:
+
+        after_id: id последнего полученного товара(next из прошлого
+            ответа), 0 - читать с начала.
+        limit: Максимальное число товаров в ответе, по умолчанию
+            все товары одним ответом(как до появления страниц).
+        fields: Поля товара через запятую(id, name, description,
+            rating), по умолчанию все.
+
     Returns:
 
         Возвращает словарь со списком товаров,
-        находящихся в данный момент на мониторинге.
+        находящихся в данный момент на мониторинге,
+        и id next для следующего запроса(None на последней странице).
+
+    Notes:
+
+        Ответ берётся из кэша, пока товары не добавлялись
+        и не удалялись, и отдаётся со строгим ETag(304 без тела,
+        если он совпал с If-None-Match).
     """
-    resault = await select_all_item(session=session)
-    if resault['message'] == []:
-        return {"message": "Нет товаров на мониторинге!",
-                'status_code': resault['status_code']}
-    else:
-        return {"message": resault['message'],
-                'status_code': resault['status_code']}
+    async def build() -> dict:
+        selected = PRODUCT_FIELDS
+        if fields is not None:
+            selected = tuple(name.strip() for name in fields.split(",")
+                             if name.strip())
+            unknown = set(selected) - set(PRODUCT_FIELDS)
+            if unknown or not selected:
+                return {"message": f"Неизвестные поля: "
+                                   f"{', '.join(sorted(unknown))}, доступны: "
+                                   f"{', '.join(PRODUCT_FIELDS)}",
+                        "status_code": 422}
+        resault = await select_all_item(after_id=after_id, limit=limit,
+                                        fields=selected, session=session)
+        if resault['message'] == [] and not after_id:
+            return {"message": "Нет товаров на мониторинге!",
+                    'status_code': resault['status_code']}
+        else:
+            return {"message": resault['message'],
+                    "next": resault['next'],
+                    'status_code': resault['status_code']}
+
+    cache = get_cache()
+    return await _cached(
+        request, ("list", cache.list_version, after_id, limit, fields),
+        build)
 
 
 @app_parsing.get("/get_history_price_item/{item_id}")
 async def get_history_price_item(
+    request: Request,
     item_id: int,
+    compact: bool = False,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=HISTORY_MAX_LIMIT),
     session: AsyncSession = Depends(get_session)
-) -> dict:
+) -> Response:
     """
     Функция получения истории цен заданного товара.
 
     Args:
 
         item_id: id товара в базе данных.
+        compact: Вернуть только изменения цены, без контрольных записей.
+        date_from: Начало периода(включительно).
+        date_to: Конец периода(не включительно).
+        cursor: Позиция продолжения чтения(next из прошлого ответа).
+        limit: Максимальное число записей в ответе, по умолчанию
+            вся история(с cursor - до конца) одним ответом, как
+            до появления страниц.
+
+    Returns:
+
+        Возвращает словарь со списком истории цен на заданный товар
+        и позицией next для следующего запроса(None на последней
+        странице).
+
+    Notes:
+
+        Ответ берётся из кэша, пока у товара не появилось новых цен,
+        и отдаётся со строгим ETag(304 без тела, если он совпал
+        с If-None-Match).
+    """
+    async def build() -> dict:
+        product = ProductId(product_id=item_id)
+        if await select_item(product_id=product.product_id, session=session):
+            resault = await select_history_price(product_id=product.product_id,
+                                                 compact=compact,
+                                                 date_from=date_from,
+                                                 date_to=date_to,
+                                                 cursor=cursor, limit=limit,
+                                                 session=session)
+            return resault
+        else:
+            return {"message": "Товар не найден в базе данных."}
+
+    cache = get_cache()
+    return await _cached(
+        request, ("history", item_id, cache.version(item_id), compact,
+                  date_from, date_to, cursor, limit),
+        build)
+
+
+@app_parsing.get("/price_ohlc/{item_id}")
+async def get_price_ohlc(
+    item_id: int,
+    bucket: str = Query("1d", pattern=r"^[1-9][0-9]{0,3}(h|d|w|mo|y)$"),
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(OHLC_DEFAULT_LIMIT, ge=1, le=OHLC_MAX_LIMIT),
+    session: AsyncSession = Depends(get_session)
+) -> dict:
+    """
+    Функция получения цен заданного товара по периодам.
+
+    Args:
+
+        item_id: id товара в базе данных.
+        bucket: Размер периода: число и единица(h - час, d - день,
+            w - неделя, mo - месяц, y - год), например 6h, 1d, 1w.
+        date_from: Начало(выравнивается на начало периода).
+        date_to: Конец(не включительно).
+        limit: Максимальное число периодов в ответе.
 
     Returns:
 
-        Возвращает словарь со списком истории цен на заданный товар.
+        Возвращает словарь с периодами(начало, первая, максимальная,
+        минимальная, последняя и средняя цена, число записей)
+        и началом следующего периода next для параметра from
+        следующего запроса(None на последней странице).
     """
     product = ProductId(product_id=item_id)
     if await select_item(product_id=product.product_id, session=session):
-        resault = await select_history_price(product_id=product.product_id,
-                                             session=session)
-        return {"message": resault['message'],
-                'status_code': resault['status_code']}
+        unit = bucket.lstrip("0123456789")
+        return await select_price_ohlc(product_id=product.product_id,
+                                       unit=unit,
+                                       size=int(bucket[:-len(unit)]),
+                                       date_from=date_from,
+                                       date_to=date_to, limit=limit,
+                                       session=session)
     else:
         return {"message": "Товар не найден в базе данных."}
+
+
+@app_parsing.get("/export/history")
+async def export_history(
+    export_format: str = Query("ndjson", alias="format"),
+    product_id: Optional[list[int]] = Query(None),
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to")
+):
+    """
+    Функция выгрузки истории цен.
+
+    Args:
+
+        export_format: Формат выгрузки: ndjson, csv или columns
+            (двоичные колонки для NumPy, см. backend.export).
+        product_id: id товаров(параметр можно повторять),
+            по умолчанию все товары.
+        date_from: Начало периода(включительно).
+        date_to: Конец периода(не включительно).
+
+    Returns:
+
+        Возвращает историю цен(id товара, цена, время) по возрастанию
+        id товара и времени потоком, файлом выбранного формата.
+
+    Notes:
+
+        История читается из базы и отправляется пачками по
+        EXPORT_CHUNK_SIZE записей, весь ответ в памяти не собирается.
+    """
+    if export_format not in EXPORT_FORMATS:
+        return {"message": f"Неизвестный формат выгрузки, ожидается "
+                           f"{', '.join(EXPORT_FORMATS)}",
+                "status_code": 422}
+    media_type, extension = EXPORT_FORMATS[export_format]
+    return StreamingResponse(
+        iter_export(export_format=export_format, product_ids=product_id,
+                    date_from=date_from, date_to=date_to,
+                    chunk_size=EXPORT_CHUNK_SIZE),
+        media_type=media_type,
+        headers={"Content-Disposition":
+                 f'attachment; filename="price_history.{extension}"'})
+
+
+@app_parsing.get("/rate_limit_state")
+async def get_rate_limit_state() -> dict:
+    """
+    Функция получения состояния ограничителя запросов к МВИДЕО.
+
+    Returns:
+
+        Возвращает словарь с состоянием ограничителя по хостам:
+        режим, доля скорости, число пауз и причины ошибок.
+    """
+    return {"message": get_limiter().snapshot(), "status_code": 200}
+
+
+@app_parsing.get("/price_events")
+async def get_price_events(
+    after: str = Query("0"),
+    limit: int = Query(100, ge=1, le=EVENTS_MAX_LIMIT),
+    wait: float = Query(0, ge=0, le=EVENTS_MAX_WAIT),
+    session: AsyncSession = Depends(get_session)
+) -> dict:
+    """
+    Функция подписки на события изменения цен.
+
+    Args:
+
+        after: Позиция последнего прочитанного события(next из прошлого
+            ответа), "0" - читать с начала.
+        limit: Максимальное число событий в ответе.
+        wait: Сколько секунд ждать новых событий, если их пока нет.
+
+    Returns:
+
+        Возвращает словарь с событиями(номер, id товара, старая и новая
+        цена, время) и позицией next для следующего запроса.
+
+    Notes:
+
+        Пока цены не меняются, запрос с wait висит на уведомлении
+        NOTIFY от мониторинга и не нагружает базу данных.
+        Каждое событие отдаётся ровно один раз, если продолжать
+        чтение с next, в том числе при записи событий несколькими
+        процессами мониторинга(см. select_price_events).
+    """
+    notifier = get_notifier()
+    waiter = await notifier.waiter() if wait else None
+    resault = await select_price_events(after=after, limit=limit,
+                                        session=session)
+    if (resault['status_code'] != 200 or resault['message']['events'] or
+            not wait):
+        return resault
+    # Соединение сессии не держим на время ожидания.
+    await session.close()
+    if await notifier.wait(waiter, timeout=wait):
+        resault = await select_price_events(after=after, limit=limit,
+                                            session=session)
+    return resault
+
+
+# Форматы загрузки по заголовку Content-Type.
+CONTENT_TYPES = {"application/json": "json",
+                 "application/x-ndjson": "ndjson",
+                 "application/jsonl": "ndjson",
+                 "text/csv": "csv"}
+
+
+@app_parsing.post("/imports")
+async def import_products(request: Request,
+                          upload_format: Optional[str] = Query(
+                              None, alias="format")) -> dict:
+    """
+    Функция пакетного добавления товаров на мониторинг.
+
+    Args:
+
+        Тело запроса: список объектов {"url_info", "url_price"}(JSON),
+            по объекту на строке(NDJSON) или CSV с заголовком
+            url_info,url_price.
+        format: Формат тела("json", "ndjson", "csv"), по умолчанию
+            определяется по заголовку Content-Type.
+
+    Returns:
+
+        Возвращает словарь с id задачи и числом прочитанных строк.
+
+    Notes:
+
+        Строки проверяются(UrlCheck) и передаются воркерам по мере
+        чтения тела запроса, ответ возвращается после чтения тела,
+        не дожидаясь запросов к магазину. Прогресс и результаты
+        по строкам - GET /parsing/imports/{job_id}.
+    """
+    if upload_format is None:
+        content_type = request.headers.get("content-type", "")
+        upload_format = CONTENT_TYPES.get(
+            content_type.split(";")[0].strip().lower())
+    if upload_format not in UPLOAD_FORMATS:
+        return {"message": "Неизвестный формат загрузки, ожидается "
+                f"{', '.join(UPLOAD_FORMATS)}",
+                "status_code": 422}
+    job = get_imports().create()
+    await job.read(iter_upload(request.stream(), upload_format))
+    return {"message": job.snapshot(limit=0), "status_code": 200}
+
+
+@app_parsing.get("/imports/{job_id}")
+async def get_import(job_id: str,
+                     offset: int = Query(0, ge=0),
+                     limit: int = Query(100, ge=0, le=1000)) -> dict:
+    """
+    Функция получения состояния задачи пакетного добавления.
+
+    Args:
+
+        job_id: id задачи.
+        offset: Номер первого результата строки.
+        limit: Число результатов строк в ответе.
+
+    Returns:
+
+        Возвращает словарь со статусом задачи, числом строк
+        по состояниям(queued, added, exists, failed) и результатами
+        строк: номер, URL, состояние, id товара или ошибка.
+    """
+    job = get_imports().get(job_id)
+    if job is None:
+        return {"message": f"Задача {job_id} не найдена!",
+                "status_code": 422}
+    return {"message": job.snapshot(offset=offset, limit=limit),
+            "status_code": 200}
+
+
+@app_parsing.post("/alert_rules")
+async def add_alert(rule: AlertRuleIn,
+                    session: AsyncSession = Depends(get_session)) -> dict:
+    """
+    Функция добавления правила оповещения о снижении цены.
+
+    Args:
+
+        product_id: id товара в базе данных.
+        kind: "below" - цена ниже value, "drop_pct" - цена снизилась
+            на value процентов от текущей.
+        value: Порог цены или процент снижения.
+
+    Returns:
+
+        Возвращает словарь с id правила и порогом срабатывания.
+
+    Notes:
+
+        Сработавшие правила мониторинг отправляет в канал NOTIFY
+        price_alerts, правило срабатывает снова только после того,
+        как цена поднимется до порога.
+    """
+    if not await select_item(product_id=rule.product_id, session=session):
+        return {"message": "Товар не найден в базе данных."}
+    return await add_alert_rule(product_id=rule.product_id, kind=rule.kind,
+                                value=rule.value, session=session)
+
+
+@app_parsing.get("/alert_rules")
+async def get_alerts(
+    product_id: Optional[int] = None,
+    session: AsyncSession = Depends(get_session)
+) -> dict:
+    """
+    Функция получения правил оповещения.
+
+    Args:
+
+        product_id: id товара в базе данных, по умолчанию все правила.
+
+    Returns:
+
+        Возвращает словарь со списком правил и их состоянием.
+    """
+    return await select_alert_rules(product_id=product_id, session=session)
+
+
+@app_parsing.delete("/alert_rules/{rule_id}")
+async def delete_alert(rule_id: int,
+                       session: AsyncSession = Depends(get_session)) -> dict:
+    """
+    Функция удаления правила оповещения.
+
+    Args:
+
+        rule_id: id правила.
+
+    Returns:
+
+        Возвращает сообщение об успехе или ошибке и статус код.
+    """
+    return await delete_alert_rule(rule_id=rule_id, session=session)